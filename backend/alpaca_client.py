@@ -2,19 +2,51 @@
 Alpaca API client for fetching options data
 """
 from alpaca.data.historical import StockHistoricalDataClient
-from alpaca.data.requests import OptionChainRequest, OptionSnapshotRequest, OptionBarsRequest
+from alpaca.data.requests import OptionChainRequest, OptionSnapshotRequest, OptionBarsRequest, StockBarsRequest
 from alpaca.trading.client import TradingClient
-from backend.config import ALPACA_API_KEY, ALPACA_SECRET_KEY, ALPACA_BASE_URL, SYMBOL
+from backend.config import (
+    ALPACA_API_KEY, ALPACA_SECRET_KEY, ALPACA_BASE_URL, SYMBOL, BARS_CHUNK_SIZE,
+    SNAPSHOT_CHUNK_SIZE, CHAIN_MAX_DAYS_TO_EXPIRATION, CHAIN_MONEYNESS_WINDOW,
+    CHAIN_OPTION_TYPE, INTRADAY_WINDOW_MINUTES
+)
+from backend.metrics import metrics
+from backend.option_chain import MARKET_TIMEZONE, OptionChain, market_close, timestamps_to_seconds
+from backend.rate_limiter import TokenBucketRateLimiter, call_with_rate_limit
+from backend.response_cache import ResponseCache, is_closed_day
+from backend.underlying_history import UnderlyingHistory, timeframe_seconds
 import logging
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+import math
+import numpy as np
+from datetime import date, datetime, time, timedelta, timezone
+from typing import List, Dict, Optional, Tuple
 from alpaca.data.timeframe import TimeFrame
 
 logger = logging.getLogger(__name__)
 
+# Items per page the SDK requests; it follows next_page_token internally,
+# so one call can send several HTTP requests
+OPTION_CHAIN_PAGE_LIMIT = 1000
+BARS_PAGE_LIMIT = 10000
+
+# Options on SPY trade from 09:30 to 16:15 New York time
+INTRADAY_SESSION = (time(9, 30), time(16, 15))
+
 class AlpacaOptionsClient:
-    def __init__(self):
-        """Initialize Alpaca clients"""
+    def __init__(
+        self,
+        rate_limiter: Optional[TokenBucketRateLimiter] = None,
+        cache: Optional[ResponseCache] = None
+    ):
+        """
+        Initialize Alpaca clients
+        
+        Args:
+            rate_limiter: Optional limiter shared by every API call made through
+                this client (and any other client given the same limiter),
+                charged one token per HTTP page
+            cache: Optional record/replay cache in front of get_option_contracts
+                and get_historical_option_bars_batch
+        """
         self.data_client = StockHistoricalDataClient(
             api_key=ALPACA_API_KEY,
             secret_key=ALPACA_SECRET_KEY
@@ -25,99 +57,186 @@ class AlpacaOptionsClient:
             paper=True
         )
         self.symbol = SYMBOL
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+    
+    def _request(self, func, *args, **kwargs):
+        """Make an API call through the shared rate limiter, backing off on 429s"""
+        try:
+            return call_with_rate_limit(self.rate_limiter, func, *args, **kwargs)
+        except Exception:
+            metrics.increment('fetch_errors', request=getattr(func, '__name__', 'unknown'))
+            raise
+    
+    def _charge_pages(self, items: int, page_limit: int):
+        """Charge the rate limiter for the pages after the first of a paginated SDK call"""
+        if self.rate_limiter is not None and items > page_limit:
+            self.rate_limiter.charge(math.ceil(items / page_limit) - 1)
     
-    def get_option_contracts(self, expiration_date: Optional[str] = None) -> List[Dict]:
+    def get_option_contracts(
+        self,
+        expiration_date: Optional[str] = None,
+        expiration_date_gte: Optional[str] = None,
+        expiration_date_lte: Optional[str] = None,
+        strike_price_gte: Optional[float] = None,
+        strike_price_lte: Optional[float] = None,
+        option_type: Optional[str] = None
+    ) -> OptionChain:
         """
         Fetch option contracts for the symbol
         
+        Filters are applied server-side, so only matching contracts are
+        downloaded. The SDK follows next_page_token until the whole
+        (filtered) chain has been returned. With a cache, a repeated request
+        is answered from it; lists of contracts that have all expired are
+        kept for good, others for the cache's TTL.
+        
         Args:
             expiration_date: Optional expiration date filter (YYYY-MM-DD)
+            expiration_date_gte: Optional earliest expiration date (YYYY-MM-DD)
+            expiration_date_lte: Optional latest expiration date (YYYY-MM-DD)
+            strike_price_gte: Optional lowest strike price
+            strike_price_lte: Optional highest strike price
+            option_type: Optional 'call' or 'put'
         
         Returns:
-            List of option contract dictionaries
+            OptionChain with option_symbol, symbol (the underlying),
+            expiration_date, strike_price and option_type columns
         """
         try:
-            request_params = OptionChainRequest(
-                underlying_symbol=self.symbol,
-                expiration_date=expiration_date
-            )
-            
-            chain = self.data_client.get_option_chain(request_params)
-            contracts = chain if chain else []
-            
-            contracts_list = []
-            # Handle both list and dict responses
-            if isinstance(contracts, dict):
-                # If it's a dict, extract contracts from it
-                contracts = list(contracts.values()) if contracts else []
-            
-            for contract in contracts:
-                # Handle different contract object structures
-                if hasattr(contract, 'symbol'):
-                    contracts_list.append({
-                        'symbol': getattr(contract, 'symbol', ''),
-                        'underlying_symbol': getattr(contract, 'underlying_symbol', self.symbol),
-                        'expiration_date': contract.expiration_date.isoformat() if hasattr(contract, 'expiration_date') and contract.expiration_date else None,
-                        'strike_price': float(contract.strike_price) if hasattr(contract, 'strike_price') and contract.strike_price else None,
-                        'option_type': contract.option_type.value if hasattr(contract, 'option_type') and contract.option_type else None,
-                        'contract_type': contract.contract_type.value if hasattr(contract, 'contract_type') and contract.contract_type else None,
-                    })
-                elif isinstance(contract, dict):
-                    contracts_list.append({
-                        'symbol': contract.get('symbol', ''),
-                        'underlying_symbol': contract.get('underlying_symbol', self.symbol),
-                        'expiration_date': contract.get('expiration_date'),
-                        'strike_price': float(contract['strike_price']) if contract.get('strike_price') else None,
-                        'option_type': contract.get('option_type'),
-                        'contract_type': contract.get('contract_type'),
-                    })
+            filters = {
+                'expiration_date': expiration_date,
+                'expiration_date_gte': expiration_date_gte,
+                'expiration_date_lte': expiration_date_lte,
+                'strike_price_gte': strike_price_gte,
+                'strike_price_lte': strike_price_lte,
+                'type': option_type,
+            }
+            cache_params = {'underlying_symbol': self.symbol, **filters}
+            columns = self.cache.get('option_contracts', cache_params) if self.cache else None
+            if columns is None:
+                columns = self._fetch_option_contracts(filters)
+                if self.cache:
+                    last_expiration = expiration_date or expiration_date_lte
+                    self.cache.put(
+                        'option_contracts', cache_params, columns,
+                        immutable=bool(last_expiration) and is_closed_day(date.fromisoformat(last_expiration))
+                    )
             
-            logger.info(f"Fetched {len(contracts_list)} option contracts")
-            return contracts_list
+            chain = OptionChain({name: OptionChain.column_array(name, values) for name, values in columns.items()})
+            logger.info(f"Fetched {len(chain)} option contracts")
+            return chain
             
         except Exception as e:
             logger.error(f"Error fetching option contracts: {str(e)}")
-            return []
+            return OptionChain({})
     
-    def get_option_snapshot(self, contract_symbols: List[str]) -> Dict:
+    def _fetch_option_contracts(self, filters: Dict) -> Dict[str, List]:
+        """Request the contracts matching filters, as a list per column"""
+        if self.cache:
+            self.cache.ensure_can_fetch('option_contracts')
+        
+        request_params = OptionChainRequest(
+            underlying_symbol=self.symbol,
+            **{name: value for name, value in filters.items() if value is not None}
+        )
+        
+        chain = self._request(self.data_client.get_option_chain, request_params)
+        contracts = chain if chain else []
+        
+        # Handle both list and dict responses
+        if isinstance(contracts, dict):
+            # If it's a dict, extract contracts from it
+            contracts = list(contracts.values()) if contracts else []
+        self._charge_pages(len(contracts), OPTION_CHAIN_PAGE_LIMIT)
+        
+        # Collect each field into its column directly, no per-contract dict
+        columns = {name: [] for name in ('option_symbol', 'symbol', 'expiration_date', 'strike_price', 'option_type')}
+        for contract in contracts:
+            # Handle different contract object structures
+            if hasattr(contract, 'symbol'):
+                expiration = getattr(contract, 'expiration_date', None)
+                option_type = getattr(contract, 'option_type', None)
+                columns['option_symbol'].append(contract.symbol)
+                columns['symbol'].append(getattr(contract, 'underlying_symbol', self.symbol))
+                columns['expiration_date'].append(expiration.isoformat() if expiration else None)
+                columns['strike_price'].append(getattr(contract, 'strike_price', None))
+                columns['option_type'].append(option_type.value if option_type else None)
+            elif isinstance(contract, dict):
+                columns['option_symbol'].append(contract.get('symbol', ''))
+                columns['symbol'].append(contract.get('underlying_symbol', self.symbol))
+                columns['expiration_date'].append(contract.get('expiration_date'))
+                columns['strike_price'].append(contract.get('strike_price'))
+                columns['option_type'].append(contract.get('option_type'))
+        
+        return columns
+    
+    def get_option_snapshot(
+        self,
+        contract_symbols: List[str],
+        chunk_size: int = SNAPSHOT_CHUNK_SIZE
+    ) -> Dict:
         """
         Get current snapshot data for option contracts
         
+        Only the given contracts are requested, chunk_size symbols per request.
+        A failing chunk is logged and skipped.
+        
         Args:
             contract_symbols: List of option contract symbols
+            chunk_size: Number of symbols per request
         
         Returns:
             Dictionary of option snapshots
         """
-        try:
-            request_params = OptionSnapshotRequest(underlying_symbol=self.symbol)
-            snapshots = self.data_client.get_option_snapshot(request_params)
-            
-            snapshot_data = {}
-            if snapshots:
-                for symbol, snapshot in snapshots.items():
-                    snapshot_data[symbol] = {}
-                    
-                    if hasattr(snapshot, 'latest_trade') and snapshot.latest_trade:
-                        trade = snapshot.latest_trade
-                        snapshot_data[symbol]['last_price'] = float(trade.price) if trade.price else None
-                        snapshot_data[symbol]['timestamp'] = trade.timestamp.isoformat() if trade.timestamp else None
-                    
-                    if hasattr(snapshot, 'latest_quote') and snapshot.latest_quote:
-                        quote = snapshot.latest_quote
-                        snapshot_data[symbol]['bid_price'] = float(quote.bid_price) if quote.bid_price else None
-                        snapshot_data[symbol]['ask_price'] = float(quote.ask_price) if quote.ask_price else None
-            
-            return snapshot_data
-            
-        except Exception as e:
-            logger.error(f"Error fetching option snapshots: {str(e)}")
-            return {}
+        snapshot_data = {}
+        
+        for start in range(0, len(contract_symbols), chunk_size):
+            chunk = contract_symbols[start:start + chunk_size]
+            try:
+                request_params = OptionSnapshotRequest(symbol_or_symbols=chunk)
+                snapshots = self._request(self.data_client.get_option_snapshot, request_params)
+                
+                if snapshots:
+                    for symbol, snapshot in snapshots.items():
+                        snapshot_data[symbol] = self._snapshot_to_dict(snapshot)
+                
+            except Exception as e:
+                logger.error(f"Error fetching option snapshots for {len(chunk)} symbols starting at {chunk[0]}: {str(e)}")
+        
+        return snapshot_data
+    
+    @staticmethod
+    def _snapshot_to_dict(snapshot) -> Dict:
+        """Extract last trade and quote fields from an Alpaca option snapshot"""
+        data = {}
+        
+        if hasattr(snapshot, 'latest_trade') and snapshot.latest_trade:
+            trade = snapshot.latest_trade
+            data['last_price'] = float(trade.price) if trade.price else None
+            data['timestamp'] = trade.timestamp.isoformat() if trade.timestamp else None
+        
+        if hasattr(snapshot, 'latest_quote') and snapshot.latest_quote:
+            quote = snapshot.latest_quote
+            data['bid_price'] = float(quote.bid_price) if quote.bid_price else None
+            data['ask_price'] = float(quote.ask_price) if quote.ask_price else None
+        
+        return data
+    
+    @staticmethod
+    def time_to_maturity(expiration_date: Optional[str], as_of: datetime) -> Optional[float]:
+        """
+        Time from as_of to the 16:00 ET expiry of an expiration date (YYYY-MM-DD)
+        in fractional years, 0 once expired
+        """
+        if not expiration_date:
+            return None
+        return float(OptionChain.years_to_expiration([expiration_date], as_of)[0])
     
     def get_underlying_price(self) -> Optional[float]:
         """Get current price of the underlying asset"""
         try:
-            bars = self.data_client.get_latest_bar(self.symbol)
+            bars = self._request(self.data_client.get_latest_bar, self.symbol)
             if bars and hasattr(bars, 'close'):
                 return float(bars.close)
             return None
@@ -125,60 +244,116 @@ class AlpacaOptionsClient:
             logger.error(f"Error fetching underlying price: {str(e)}")
             return None
     
-    def get_all_options_data(self) -> List[Dict]:
+    def get_all_options_data(
+        self,
+        max_days_to_expiration: Optional[int] = CHAIN_MAX_DAYS_TO_EXPIRATION,
+        moneyness_window: Optional[float] = CHAIN_MONEYNESS_WINDOW,
+        option_type: Optional[str] = CHAIN_OPTION_TYPE
+    ) -> OptionChain:
         """
         Fetch all available options data with current market data
         
+        Args:
+            max_days_to_expiration: Only fetch contracts expiring within this many days
+            moneyness_window: Only fetch strikes within this fraction of spot
+                (0.2 = 80% to 120% of the underlying price)
+            option_type: Only fetch 'call' or 'put' contracts
+        
         Returns:
-            List of complete option data dictionaries
+            OptionChain of the contracts with quote, trade, underlying price
+            and time to maturity columns. Every contract has the same
+            timestamp, the time the quotes were captured, and time to
+            maturity is measured from it.
         """
-        # Get all option contracts
-        contracts = self.get_option_contracts()
+        # Get underlying price first, it defines the strike band
+        with metrics.stage('fetch_spot'):
+            underlying_price = self.get_underlying_price()
+        
+        # Get the option contracts we track
+        with metrics.stage('fetch_contracts'):
+            contracts = self.get_option_contracts(**self.chain_filters(
+                underlying_price, max_days_to_expiration, moneyness_window, option_type
+            ))
         
         if not contracts:
             logger.warning("No option contracts found")
-            return []
+            return contracts
         
-        # Get underlying price
-        underlying_price = self.get_underlying_price()
+        # Get snapshots for all contracts
+        contract_symbols = contracts['option_symbol'].tolist()
+        with metrics.stage('fetch_snapshots'):
+            snapshots = self.get_option_snapshot(contract_symbols)
         
-        # Get contract symbols
-        contract_symbols = [c['symbol'] for c in contracts]
+        chain = self.combine_chain(contracts, snapshots, underlying_price, datetime.now(timezone.utc))
+        logger.info(f"Collected data for {len(chain)} options")
+        return chain
+    
+    @staticmethod
+    def chain_filters(
+        underlying_price: Optional[float],
+        max_days_to_expiration: Optional[int],
+        moneyness_window: Optional[float],
+        option_type: Optional[str]
+    ) -> Dict:
+        """
+        get_option_contracts filters for the tracked part of the chain
         
-        # Get snapshots for all contracts
-        snapshots = self.get_option_snapshot(contract_symbols)
+        The strike band is only set when the underlying price is known.
+        """
+        filters = {'option_type': option_type}
+        if max_days_to_expiration is not None:
+            today = datetime.now().date()
+            filters['expiration_date_gte'] = today.isoformat()
+            filters['expiration_date_lte'] = (today + timedelta(days=max_days_to_expiration)).isoformat()
+        if moneyness_window is not None and underlying_price:
+            filters['strike_price_gte'] = round(underlying_price * (1 - moneyness_window), 2)
+            filters['strike_price_lte'] = round(underlying_price * (1 + moneyness_window), 2)
+        return filters
+    
+    @staticmethod
+    def combine_chain(
+        contracts: OptionChain,
+        snapshots: Dict[str, Dict],
+        underlying_price: Optional[float],
+        captured_at: datetime
+    ) -> OptionChain:
+        """
+        Join contracts with their snapshots into the chain returned by get_all_options_data
         
-        # Combine contract data with snapshot data
-        complete_data = []
-        for contract in contracts:
-            symbol = contract['symbol']
-            snapshot = snapshots.get(symbol, {})
-            
-            # Calculate time to maturity
-            time_to_maturity = None
-            if contract['expiration_date']:
-                exp_date = datetime.fromisoformat(contract['expiration_date'].split('T')[0])
-                days_to_exp = (exp_date - datetime.now()).days
-                time_to_maturity = days_to_exp / 365.0
-            
-            option_data = {
-                'symbol': contract['underlying_symbol'],
-                'option_symbol': symbol,
-                'option_type': contract['option_type'],
-                'strike_price': contract['strike_price'],
-                'expiration_date': contract['expiration_date'],
-                'bid_price': snapshot.get('bid_price'),
-                'ask_price': snapshot.get('ask_price'),
-                'last_price': snapshot.get('last_price'),
-                'underlying_price': underlying_price,
-                'time_to_maturity': time_to_maturity,
-                'implied_volatility': None,  # Will be calculated or fetched if available
-            }
-            
-            complete_data.append(option_data)
+        Args:
+            contracts: Contracts from get_option_contracts
+            snapshots: Option symbol -> snapshot dictionary, from get_option_snapshot
+            underlying_price: Spot price (None if unknown)
+            captured_at: Time the quotes were captured (timezone-aware)
+        """
+        contract_symbols = contracts['option_symbol'].tolist()
+        
+        def snapshot_column(name):
+            return OptionChain.column_array(name, (snapshots.get(s, {}).get(name) for s in contract_symbols))
         
-        logger.info(f"Collected data for {len(complete_data)} options")
-        return complete_data
+        return contracts.with_columns(
+            bid_price=snapshot_column('bid_price'),
+            ask_price=snapshot_column('ask_price'),
+            last_price=snapshot_column('last_price'),
+            underlying_price=np.full(len(contracts), underlying_price if underlying_price else np.nan),
+            time_to_maturity=contracts.time_to_maturity(captured_at),
+            implied_volatility=np.full(len(contracts), np.nan),  # Calculated when the chain is priced
+            timestamp=OptionChain.column_array('timestamp', [captured_at.isoformat()] * len(contracts)),
+        )
+    
+    @staticmethod
+    def _bar_to_dict(bar) -> Dict:
+        """Convert an Alpaca bar object to a plain dictionary"""
+        return {
+            'timestamp': bar.timestamp.isoformat() if bar.timestamp else None,
+            'open': float(bar.open) if bar.open else None,
+            'high': float(bar.high) if bar.high else None,
+            'low': float(bar.low) if bar.low else None,
+            'close': float(bar.close) if bar.close else None,
+            'volume': int(bar.volume) if bar.volume else None,
+            'trade_count': int(bar.trade_count) if hasattr(bar, 'trade_count') and bar.trade_count else None,
+            'vwap': float(bar.vwap) if hasattr(bar, 'vwap') and bar.vwap else None,
+        }
     
     def get_historical_option_bars(
         self,
@@ -199,110 +374,323 @@ class AlpacaOptionsClient:
         Returns:
             List of historical bar data dictionaries
         """
-        try:
-            request_params = OptionBarsRequest(
-                symbol_or_symbols=[option_symbol],
-                start=start_date,
-                end=end_date,
+        bars = self.get_historical_option_bars_batch(
+            [option_symbol], start_date, end_date, timeframe
+        )
+        return bars.get(option_symbol, [])
+    
+    def get_historical_option_bars_batch(
+        self,
+        option_symbols: List[str],
+        start_date: datetime,
+        end_date: datetime,
+        timeframe: TimeFrame = TimeFrame.Day,
+        chunk_size: int = BARS_CHUNK_SIZE,
+        raise_on_error: bool = False
+    ) -> Dict[str, List[Dict]]:
+        """
+        Fetch historical option bars for many contracts with multi-symbol requests
+        
+        Symbols are sent chunk_size at a time; the SDK follows next_page_token
+        within each request, so every page of every chunk is returned. With a
+        cache, bars are cached per contract (including contracts without
+        bars) and only contracts missing from it are requested. Bars of
+        ranges that ended on a closed day are kept for good.
+        
+        Args:
+            option_symbols: Option contract symbols to fetch
+            start_date: Start date for historical data
+            end_date: End date for historical data
+            timeframe: TimeFrame for bars (Day, Hour, Minute, etc.)
+            chunk_size: Number of symbols per request
+            raise_on_error: Re-raise request errors instead of logging and
+                skipping the failed chunk
+        
+        Returns:
+            Dictionary of option symbol -> list of historical bar data dictionaries
+        """
+        historical_data: Dict[str, List[Dict]] = {}
+        
+        def cache_params(symbol: str) -> Dict:
+            return {
+                'symbol': symbol,
+                'start': start_date.isoformat(),
+                'end': end_date.isoformat(),
+                'timeframe': str(getattr(timeframe, 'value', timeframe)),
+            }
+        
+        to_fetch = option_symbols
+        if self.cache:
+            cached = self.cache.get_many('option_bars', [cache_params(symbol) for symbol in option_symbols])
+            for i, symbol_bars in cached.items():
+                if symbol_bars:
+                    historical_data[option_symbols[i]] = symbol_bars
+            to_fetch = [symbol for i, symbol in enumerate(option_symbols) if i not in cached]
+        
+        for start in range(0, len(to_fetch), chunk_size):
+            chunk = to_fetch[start:start + chunk_size]
+            try:
+                if self.cache:
+                    self.cache.ensure_can_fetch('option_bars', len(chunk))
+                
+                request_params = OptionBarsRequest(
+                    symbol_or_symbols=chunk,
+                    start=start_date,
+                    end=end_date,
+                    timeframe=timeframe
+                )
+                
+                bars = self._request(self.data_client.get_option_bars, request_params)
+                
+                # BarSet keeps its per-symbol lists in .data
+                bars_by_symbol = getattr(bars, 'data', bars) or {}
+                self._charge_pages(sum(map(len, bars_by_symbol.values())), BARS_PAGE_LIMIT)
+                chunk_data: Dict[str, List[Dict]] = {}
+                for symbol, symbol_bars in bars_by_symbol.items():
+                    chunk_data.setdefault(symbol, []).extend(
+                        self._bar_to_dict(bar) for bar in symbol_bars
+                    )
+                historical_data.update(chunk_data)
+                
+                if self.cache:
+                    self.cache.put_many(
+                        'option_bars',
+                        [(cache_params(symbol), chunk_data.get(symbol, [])) for symbol in chunk],
+                        immutable=is_closed_day((end_date - timedelta(microseconds=1)).date())
+                    )
+                
+            except Exception as e:
+                logger.error(f"Error fetching historical bars for {len(chunk)} symbols starting at {chunk[0]}: {str(e)}")
+                if raise_on_error:
+                    raise
+        
+        logger.info(f"Fetched historical bars for {len(historical_data)} of {len(option_symbols)} contracts")
+        return historical_data
+    
+    def get_underlying_bars(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        timeframe: TimeFrame = TimeFrame.Day
+    ) -> UnderlyingHistory:
+        """
+        Fetch the underlying's bars for a whole date range with one request
+        
+        The SDK follows next_page_token, so every bar of the range is
+        returned. Cached like option bars when the client has a cache.
+        
+        Args:
+            start_date: First day of the range
+            end_date: Last day of the range (inclusive)
+            timeframe: TimeFrame of the bars, normally that of the option bars
+                they will be joined to
+        
+        Returns:
+            UnderlyingHistory of the bar closes (empty if nothing was returned)
+        """
+        range_end = datetime.combine(end_date.date() + timedelta(days=1), datetime.min.time())
+        cache_params = {
+            'symbol': self.symbol,
+            'start': start_date.date().isoformat(),
+            'end': end_date.date().isoformat(),
+            'timeframe': str(getattr(timeframe, 'value', timeframe)),
+        }
+        bars = self.cache.get('stock_bars', cache_params) if self.cache else None
+        if bars is None:
+            if self.cache:
+                self.cache.ensure_can_fetch('stock_bars')
+            request_params = StockBarsRequest(
+                symbol_or_symbols=self.symbol,
+                start=datetime.combine(start_date.date(), datetime.min.time()),
+                end=range_end,
                 timeframe=timeframe
             )
-            
-            bars = self.data_client.get_option_bars(request_params)
-            
-            historical_data = []
-            if bars and option_symbol in bars:
-                for bar in bars[option_symbol]:
-                    historical_data.append({
-                        'timestamp': bar.timestamp.isoformat() if bar.timestamp else None,
-                        'open': float(bar.open) if bar.open else None,
-                        'high': float(bar.high) if bar.high else None,
-                        'low': float(bar.low) if bar.low else None,
-                        'close': float(bar.close) if bar.close else None,
-                        'volume': int(bar.volume) if bar.volume else None,
-                        'trade_count': int(bar.trade_count) if hasattr(bar, 'trade_count') and bar.trade_count else None,
-                        'vwap': float(bar.vwap) if hasattr(bar, 'vwap') and bar.vwap else None,
-                    })
-            
-            logger.info(f"Fetched {len(historical_data)} historical bars for {option_symbol}")
-            return historical_data
-            
-        except Exception as e:
-            logger.error(f"Error fetching historical bars for {option_symbol}: {str(e)}")
-            return []
+            bar_set = self._request(self.data_client.get_stock_bars, request_params)
+            bars_by_symbol = getattr(bar_set, 'data', bar_set) or {}
+            self._charge_pages(sum(map(len, bars_by_symbol.values())), BARS_PAGE_LIMIT)
+            bars = [self._bar_to_dict(bar) for bar in bars_by_symbol.get(self.symbol, [])]
+            if self.cache:
+                self.cache.put('stock_bars', cache_params, bars, immutable=is_closed_day(end_date.date()))
+        
+        logger.info(f"Fetched {len(bars)} {self.symbol} bars from {start_date.date()} to {end_date.date()}")
+        return UnderlyingHistory.from_bars(bars, start_date.date(), end_date.date(), timeframe_seconds(timeframe))
     
     def get_historical_options_for_date(
         self,
         target_date: datetime,
-        expiration_date: Optional[str] = None
-    ) -> List[Dict]:
+        expiration_date: Optional[str] = None,
+        contracts: Optional[OptionChain] = None,
+        raise_on_error: bool = False,
+        underlying: Optional[UnderlyingHistory] = None
+    ) -> OptionChain:
         """
         Get historical options data for a specific date
         
         Args:
             target_date: The date to fetch historical data for
             expiration_date: Optional expiration date filter
+            contracts: Contracts to fetch, as returned by get_option_contracts.
+                Defaults to the whole chain.
+            raise_on_error: Re-raise request errors instead of returning
+                partial or empty results
+            underlying: Underlying bars covering target_date (see
+                get_underlying_bars); each option bar gets the close of the
+                nearest one as underlying_price. Without it the underlying
+                price is missing and the chain cannot be priced.
         
         Returns:
-            List of option data dictionaries with historical prices
+            OptionChain of the contracts that traded on target_date, with the
+            day's bar as prices
         """
         try:
             # Get option contracts available on that date
-            contracts = self.get_option_contracts(expiration_date=expiration_date)
+            if contracts is None:
+                contracts = self.get_option_contracts(expiration_date=expiration_date)
             
             if not contracts:
                 logger.warning(f"No option contracts found for date {target_date}")
-                return []
+                return OptionChain({})
             
-            # Get historical bars for each contract
-            historical_data = []
-            for contract in contracts[:50]:  # Limit to first 50 to avoid rate limits
-                option_symbol = contract['symbol']
-                
-                # Fetch historical bars for the target date
-                bars = self.get_historical_option_bars(
-                    option_symbol=option_symbol,
+            # Fetch historical bars for the target date for the whole chain
+            contract_symbols = contracts['option_symbol'].tolist()
+            with metrics.stage('fetch_bars'):
+                bars_by_symbol = self.get_historical_option_bars_batch(
+                    option_symbols=contract_symbols,
                     start_date=target_date,
                     end_date=target_date + timedelta(days=1),
-                    timeframe=TimeFrame.Day
+                    timeframe=TimeFrame.Day,
+                    raise_on_error=raise_on_error
                 )
-                
-                if bars and len(bars) > 0:
-                    bar = bars[0]  # Get the bar for the target date
-                    
-                    # Calculate time to maturity
-                    time_to_maturity = None
-                    if contract['expiration_date']:
-                        exp_date = datetime.fromisoformat(contract['expiration_date'].split('T')[0])
-                        days_to_exp = (exp_date - target_date).days
-                        time_to_maturity = days_to_exp / 365.0
-                    
-                    option_data = {
-                        'symbol': contract['underlying_symbol'],
-                        'option_symbol': option_symbol,
-                        'option_type': contract['option_type'],
-                        'strike_price': contract['strike_price'],
-                        'expiration_date': contract['expiration_date'],
-                        'bid_price': None,  # Historical bars don't have bid/ask
-                        'ask_price': None,
-                        'last_price': bar.get('close'),
-                        'open_price': bar.get('open'),
-                        'high_price': bar.get('high'),
-                        'low_price': bar.get('low'),
-                        'volume': bar.get('volume'),
-                        'underlying_price': None,  # Would need to fetch separately
-                        'time_to_maturity': time_to_maturity,
-                        'timestamp': bar.get('timestamp'),
-                        'implied_volatility': None,
-                    }
-                    
-                    historical_data.append(option_data)
             
-            logger.info(f"Collected historical data for {len(historical_data)} options on {target_date.date()}")
-            return historical_data
+            # Keep the contracts that traded, with the bar for the target date
+            # and time to maturity as of the day's close
+            chain = self._chain_from_bars(
+                contracts, bars_by_symbol, underlying, as_of=market_close(target_date.date())
+            )
+            
+            logger.info(f"Collected historical data for {len(chain)} options on {target_date.date()}")
+            return chain
             
         except Exception as e:
             logger.error(f"Error fetching historical options data: {str(e)}")
-            return []
+            if raise_on_error:
+                raise
+            return OptionChain({})
+    
+    @staticmethod
+    def intraday_windows(
+        target_date: datetime,
+        window_minutes: int = INTRADAY_WINDOW_MINUTES
+    ) -> List[Tuple[datetime, datetime]]:
+        """
+        The trading session of target_date split into time windows
+        
+        Args:
+            target_date: Trading day
+            window_minutes: Length of each window
+        
+        Returns:
+            (start, end) pairs covering INTRADAY_SESSION, New York time
+        """
+        window_start, session_close = (
+            datetime.combine(target_date.date(), session_time, tzinfo=MARKET_TIMEZONE)
+            for session_time in INTRADAY_SESSION
+        )
+        windows = []
+        while window_start < session_close:
+            window_end = min(window_start + timedelta(minutes=window_minutes), session_close)
+            windows.append((window_start, window_end))
+            window_start = window_end
+        return windows
+    
+    def get_historical_options_for_window(
+        self,
+        contracts: OptionChain,
+        window_start: datetime,
+        window_end: datetime,
+        timeframe: TimeFrame,
+        raise_on_error: bool = False,
+        underlying: Optional[UnderlyingHistory] = None
+    ) -> OptionChain:
+        """
+        Get intraday historical options data for one time window
+        
+        Args:
+            contracts: Contracts to fetch, as returned by get_option_contracts
+            window_start: Start of the window (see intraday_windows)
+            window_end: End of the window, exclusive
+            timeframe: TimeFrame of the bars (Minute, Hour, ...)
+            raise_on_error: Re-raise request errors instead of returning
+                partial or empty results
+            underlying: Underlying bars of the same timeframe covering the
+                window, for each bar's underlying_price
+        
+        Returns:
+            OptionChain with one row per contract and bar, timestamped with
+            the bar time and with time to maturity from it
+        """
+        try:
+            with metrics.stage('fetch_bars'):
+                bars_by_symbol = self.get_historical_option_bars_batch(
+                    option_symbols=contracts['option_symbol'].tolist(),
+                    start_date=window_start,
+                    # Bars start on whole minutes, so the bar at window_end is the next window's
+                    end_date=window_end - timedelta(seconds=1),
+                    timeframe=timeframe,
+                    raise_on_error=raise_on_error
+                )
+            chain = self._chain_from_bars(contracts, bars_by_symbol, underlying)
+            
+            logger.info(f"Collected {len(chain)} bars from {window_start} to {window_end}")
+            return chain
+            
+        except Exception as e:
+            logger.error(f"Error fetching intraday options data: {str(e)}")
+            if raise_on_error:
+                raise
+            return OptionChain({})
+    
+    @staticmethod
+    def _chain_from_bars(
+        contracts: OptionChain,
+        bars_by_symbol: Dict[str, List[Dict]],
+        underlying: Optional[UnderlyingHistory] = None,
+        as_of: Optional[datetime] = None
+    ) -> OptionChain:
+        """
+        Chain with one row per bar of each contract, priced from the bar
+        
+        Args:
+            contracts: Contracts the bars were fetched for
+            bars_by_symbol: Option symbol -> bar dictionaries
+            underlying: Underlying bars, for each bar's underlying_price
+            as_of: Time to measure time to maturity from (default: each bar's time)
+        
+        Returns:
+            OptionChain of the contracts that traded, one row per bar
+        """
+        counts = np.array([len(bars_by_symbol.get(symbol) or ()) for symbol in contracts['option_symbol']], dtype=int)
+        chain = contracts.take(np.repeat(np.arange(len(contracts)), counts))
+        bars = [bar for symbol in contracts['option_symbol'] for bar in bars_by_symbol.get(symbol) or ()]
+        
+        def bar_column(name, field):
+            return OptionChain.column_array(name, (bar.get(field) for bar in bars))
+        
+        missing = np.full(len(chain), np.nan)
+        timestamps = bar_column('timestamp', 'timestamp')
+        return chain.with_columns(
+            bid_price=missing,  # Historical bars don't have bid/ask
+            ask_price=missing,
+            last_price=bar_column('last_price', 'close'),
+            open_price=bar_column('open_price', 'open'),
+            high_price=bar_column('high_price', 'high'),
+            low_price=bar_column('low_price', 'low'),
+            volume=bar_column('volume', 'volume'),
+            underlying_price=underlying.price_at(timestamps) if underlying is not None else missing,
+            time_to_maturity=chain.time_to_maturity(as_of if as_of is not None else timestamps_to_seconds(timestamps)),
+            timestamp=timestamps,
+            implied_volatility=missing,
+        )
     
     def verify_sp500_options(self) -> bool:
         """
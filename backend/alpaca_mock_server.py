@@ -0,0 +1,234 @@
+"""
+Local fake of the Alpaca REST endpoints used by AsyncAlpacaOptionsClient
+
+Serves a synthetic chain for the configured symbol: paginated option
+contracts, option snapshots, the underlying's latest bar and paginated
+option bars. Responses can be delayed, and the next requests can be
+answered with HTTP 429, so concurrency and rate-limit handling can be
+checked without an Alpaca account (see check_async_client.py).
+
+Usage:
+    python backend/alpaca_mock_server.py --port 8766 --latency 0.1
+    ALPACA_BASE_URL=http://localhost:8766 ALPACA_DATA_URL=http://localhost:8766 ...
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+class MockAlpacaServer:
+    """
+    Threaded HTTP server answering like the Alpaca trading and data APIs
+    
+    Every request is recorded in requests as (path, query parameters), and
+    max_in_flight is the most requests that were being answered at once.
+    """
+    
+    def __init__(
+        self,
+        symbol: str = 'SPY',
+        underlying_price: float = 500.0,
+        strikes: Sequence[float] = tuple(range(400, 605, 5)),
+        expiration_days: Sequence[int] = (7, 30, 60),
+        page_size: int = 100,
+        latency: float = 0.0
+    ):
+        """
+        Args:
+            symbol: Underlying symbol
+            underlying_price: Close of the latest underlying bar
+            strikes: Strikes listed for every expiration, calls and puts
+            expiration_days: Days from today of the listed expirations
+            page_size: Items per page of every paginated endpoint
+            latency: Seconds every response is delayed
+        """
+        self.symbol = symbol
+        self.underlying_price = underlying_price
+        self.page_size = page_size
+        self.latency = latency
+        self.contracts = [
+            {
+                'symbol': f"{symbol}{expiration:%y%m%d}{option_type[0].upper()}{int(strike * 1000):08d}",
+                'underlying_symbol': symbol,
+                'expiration_date': expiration.isoformat(),
+                'strike_price': str(strike),  # Alpaca sends strikes as strings
+                'type': option_type,
+            }
+            for expiration in (date.today() + timedelta(days=days) for days in expiration_days)
+            for strike in strikes
+            for option_type in ('call', 'put')
+        ]
+        self.contracts_by_symbol = {contract['symbol']: contract for contract in self.contracts}
+        self.requests: List[Tuple[str, Dict[str, str]]] = []
+        self.max_in_flight = 0
+        self.pending_429s = 0
+        self._in_flight = 0
+        self.lock = threading.Lock()
+        self.server: Optional[ThreadingHTTPServer] = None
+    
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """Serve on a background thread (port 0 picks a free port), returning the base URL"""
+        self.server = ThreadingHTTPServer((host, port), make_handler(self))
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.url
+    
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+    
+    def reset(self):
+        """Forget recorded requests"""
+        with self.lock:
+            self.requests = []
+            self.max_in_flight = 0
+    
+    def fail_next(self, count: int = 1):
+        """Answer the next count requests with HTTP 429"""
+        with self.lock:
+            self.pending_429s += count
+    
+    def _page(self, items: List, params: Dict[str, str]) -> Tuple[List, Optional[str]]:
+        """One page of items and the token of the next page (None on the last page)"""
+        offset = int(params.get('page_token') or 0)
+        limit = min(self.page_size, int(params.get('limit') or self.page_size))
+        end = offset + limit
+        return items[offset:end], (str(end) if end < len(items) else None)
+    
+    def option_price(self, contract: Dict) -> float:
+        """Intrinsic value plus one dollar of time value"""
+        strike = float(contract['strike_price'])
+        if contract['type'] == 'call':
+            return max(self.underlying_price - strike, 0.0) + 1.0
+        return max(strike - self.underlying_price, 0.0) + 1.0
+    
+    def respond(self, path: str, params: Dict[str, str]) -> Tuple[int, Dict]:
+        """Status and JSON body of one request"""
+        if path == '/v2/options/contracts':
+            contracts = [
+                contract for contract in self.contracts
+                if contract['underlying_symbol'] in params.get('underlying_symbols', self.symbol).split(',')
+                and params.get('type') in (None, contract['type'])
+                and params.get('expiration_date') in (None, contract['expiration_date'])
+                and contract['expiration_date'] >= params.get('expiration_date_gte', '')
+                and contract['expiration_date'] <= params.get('expiration_date_lte', '9999')
+                and float(contract['strike_price']) >= float(params.get('strike_price_gte', '-inf'))
+                and float(contract['strike_price']) <= float(params.get('strike_price_lte', 'inf'))
+            ]
+            page, token = self._page(contracts, params)
+            return 200, {'option_contracts': page, 'next_page_token': token}
+        
+        if path == f"/v2/stocks/{self.symbol}/bars/latest":
+            now = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+            return 200, {'symbol': self.symbol, 'bar': {'t': now, 'o': self.underlying_price, 'h': self.underlying_price,
+                                                         'l': self.underlying_price, 'c': self.underlying_price, 'v': 1000}}
+        
+        symbols = [s for s in params.get('symbols', '').split(',') if s in self.contracts_by_symbol]
+        if path == '/v1beta1/options/snapshots':
+            page, token = self._page(symbols, params)
+            now = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+            snapshots = {}
+            for symbol in page:
+                price = self.option_price(self.contracts_by_symbol[symbol])
+                snapshots[symbol] = {
+                    'latestQuote': {'t': now, 'bp': round(price - 0.05, 2), 'ap': round(price + 0.05, 2)},
+                    'latestTrade': {'t': now, 'p': price},
+                }
+            return 200, {'snapshots': snapshots, 'next_page_token': token}
+        
+        if path == '/v1beta1/options/bars':
+            # One daily bar per symbol and day of [start, end); a page holds
+            # limit bars, so a symbol's bars can span pages like in Alpaca
+            start = datetime.fromisoformat(params['start'].replace('Z', '+00:00'))
+            end = datetime.fromisoformat(params['end'].replace('Z', '+00:00'))
+            days = []
+            day = start
+            while day < end:
+                days.append(day)
+                day += timedelta(days=1)
+            bars = [(symbol, day) for symbol in symbols for day in days]
+            page, token = self._page(bars, params)
+            bars_by_symbol: Dict[str, List[Dict]] = {}
+            for symbol, day in page:
+                price = self.option_price(self.contracts_by_symbol[symbol])
+                bars_by_symbol.setdefault(symbol, []).append({
+                    't': day.isoformat().replace('+00:00', 'Z'), 'o': price, 'h': price + 0.5,
+                    'l': price - 0.5, 'c': price, 'v': 10, 'n': 3, 'vw': price,
+                })
+            return 200, {'bars': bars_by_symbol, 'next_page_token': token}
+        
+        return 404, {'message': 'not found'}
+
+def make_handler(server: MockAlpacaServer):
+    """Build an HTTP handler answering from server"""
+    
+    class MockAlpacaRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # Keep-alive, like the real API
+        
+        def _send_json(self, status: int, payload: Dict):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {name: values[0] for name, values in parse_qs(url.query).items()}
+            with server.lock:
+                server.requests.append((url.path, params))
+                server._in_flight += 1
+                server.max_in_flight = max(server.max_in_flight, server._in_flight)
+                rate_limited = server.pending_429s > 0
+                if rate_limited:
+                    server.pending_429s -= 1
+            try:
+                if server.latency:
+                    time.sleep(server.latency)
+                if rate_limited:
+                    self._send_json(429, {'message': 'too many requests'})
+                else:
+                    self._send_json(*server.respond(url.path, params))
+            finally:
+                with server.lock:
+                    server._in_flight -= 1
+        
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+    
+    return MockAlpacaRequestHandler
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a fake Alpaca REST API for the async client')
+    parser.add_argument('--host', default='localhost', help='Host to bind. Default: localhost')
+    parser.add_argument('--port', type=int, default=8766, help='Port to bind. Default: 8766')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds every response is delayed. Default: 0')
+    parser.add_argument('--page-size', type=int, default=100, help='Items per page. Default: 100')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    server = MockAlpacaServer(page_size=args.page_size, latency=args.latency)
+    server.start(args.host, args.port)
+    logger.info(f"Serving {len(server.contracts)} mock contracts on {server.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+"""
+Async Alpaca client that fetches the live chain with concurrent requests
+
+AlpacaOptionsClient makes one blocking SDK call after another, so a cycle
+takes the sum of all its round trips. This client talks to the Alpaca REST
+API directly through one httpx.AsyncClient, whose keep-alive connection pool
+is reused by every request. The underlying bar and the contract list are
+requested together, then every snapshot batch at once, so a cycle takes
+about as long as its slowest request in each of the two rounds (snapshots
+need the contract list). Methods return the same shapes as the
+AlpacaOptionsClient methods of the same name.
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httpx
+
+from alpaca.data.timeframe import TimeFrame
+from backend.alpaca_client import AlpacaOptionsClient
+from backend.config import (
+    ALPACA_API_KEY, ALPACA_SECRET_KEY, ALPACA_BASE_URL, ALPACA_DATA_URL,
+    ALPACA_MAX_CONNECTIONS, ALPACA_HTTP_TIMEOUT, SYMBOL, BARS_CHUNK_SIZE,
+    SNAPSHOT_CHUNK_SIZE, CHAIN_MAX_DAYS_TO_EXPIRATION, CHAIN_MONEYNESS_WINDOW,
+    CHAIN_OPTION_TYPE
+)
+from backend.metrics import metrics
+from backend.option_chain import OptionChain
+from backend.rate_limiter import TokenBucketRateLimiter, call_with_rate_limit_async
+
+logger = logging.getLogger(__name__)
+
+# Page sizes accepted by the REST endpoints
+CONTRACTS_PAGE_LIMIT = 10000
+SNAPSHOTS_PAGE_LIMIT = 1000
+BARS_PAGE_LIMIT = 10000
+
+def _rfc3339(value: datetime) -> str:
+    """Timestamp as the API expects it (naive datetimes are taken as UTC)"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
+
+class AsyncAlpacaOptionsClient:
+    def __init__(
+        self,
+        rate_limiter: Optional[TokenBucketRateLimiter] = None,
+        max_connections: int = ALPACA_MAX_CONNECTIONS,
+        timeout: float = ALPACA_HTTP_TIMEOUT,
+        trading_url: str = ALPACA_BASE_URL,
+        data_url: str = ALPACA_DATA_URL
+    ):
+        """
+        Args:
+            rate_limiter: Optional limiter shared by every request (and any
+                other client given the same limiter)
+            max_connections: Size of the connection pool, which is also the
+                most requests in flight at once
+            timeout: Seconds before a request fails
+            trading_url: Base URL of the trading API (option contracts)
+            data_url: Base URL of the market data API (bars and snapshots)
+        """
+        self.symbol = SYMBOL
+        self.rate_limiter = rate_limiter
+        self.trading_url = trading_url.rstrip('/')
+        self.data_url = data_url.rstrip('/')
+        self.http = httpx.AsyncClient(
+            headers={
+                'APCA-API-KEY-ID': ALPACA_API_KEY,
+                'APCA-API-SECRET-KEY': ALPACA_SECRET_KEY,
+            },
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections
+            ),
+            timeout=timeout
+        )
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    def run(self, coroutine):
+        """
+        Run one of this client's coroutines from synchronous code
+        
+        Every call runs on the same private event loop, so pooled connections
+        stay open between collection cycles.
+        """
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(coroutine)
+    
+    async def aclose(self):
+        """Close the pooled connections"""
+        await self.http.aclose()
+    
+    def close(self):
+        """Close the pooled connections and the private event loop"""
+        self.run(self.aclose())
+        self._loop.close()
+        self._loop = None
+    
+    async def _get(self, url: str, params: Optional[Dict] = None, name: str = 'request') -> Dict:
+        """GET a JSON document through the rate limiter, backing off on 429s"""
+        async def get():
+            response = await self.http.get(url, params=params)
+            response.raise_for_status()
+            return response.json()
+        
+        try:
+            return await call_with_rate_limit_async(self.rate_limiter, get)
+        except Exception:
+            metrics.increment('fetch_errors', request=name)
+            raise
+    
+    async def _get_pages(self, url: str, params: Dict, name: str) -> List[Dict]:
+        """GET every page of a paginated endpoint, following next_page_token"""
+        pages = []
+        params = {key: value for key, value in params.items() if value is not None}
+        while True:
+            page = await self._get(url, params, name)
+            pages.append(page)
+            token = page.get('next_page_token')
+            if not token:
+                return pages
+            params['page_token'] = token
+    
+    async def get_option_contracts(
+        self,
+        expiration_date: Optional[str] = None,
+        expiration_date_gte: Optional[str] = None,
+        expiration_date_lte: Optional[str] = None,
+        strike_price_gte: Optional[float] = None,
+        strike_price_lte: Optional[float] = None,
+        option_type: Optional[str] = None
+    ) -> OptionChain:
+        """
+        Fetch option contracts for the symbol (see AlpacaOptionsClient.get_option_contracts)
+        
+        Returns:
+            OptionChain with option_symbol, symbol (the underlying),
+            expiration_date, strike_price and option_type columns
+        """
+        try:
+            pages = await self._get_pages(f"{self.trading_url}/v2/options/contracts", {
+                'underlying_symbols': self.symbol,
+                'expiration_date': expiration_date,
+                'expiration_date_gte': expiration_date_gte,
+                'expiration_date_lte': expiration_date_lte,
+                'strike_price_gte': strike_price_gte,
+                'strike_price_lte': strike_price_lte,
+                'type': option_type,
+                'limit': CONTRACTS_PAGE_LIMIT,
+            }, 'get_option_contracts')
+            
+            columns = {name: [] for name in ('option_symbol', 'symbol', 'expiration_date', 'strike_price', 'option_type')}
+            for page in pages:
+                for contract in page.get('option_contracts') or []:
+                    columns['option_symbol'].append(contract.get('symbol', ''))
+                    columns['symbol'].append(contract.get('underlying_symbol', self.symbol))
+                    columns['expiration_date'].append(contract.get('expiration_date'))
+                    strike = contract.get('strike_price')  # Sent as a string
+                    columns['strike_price'].append(float(strike) if strike is not None else None)
+                    columns['option_type'].append(contract.get('type'))
+            
+            chain = OptionChain({name: OptionChain.column_array(name, values) for name, values in columns.items()})
+            logger.info(f"Fetched {len(chain)} option contracts")
+            return chain
+        
+        except Exception as e:
+            logger.error(f"Error fetching option contracts: {str(e)}")
+            return OptionChain({})
+    
+    async def get_option_snapshot(
+        self,
+        contract_symbols: List[str],
+        chunk_size: int = SNAPSHOT_CHUNK_SIZE
+    ) -> Dict:
+        """
+        Get current snapshot data for option contracts, all chunks at once
+        
+        A failing chunk is logged and skipped.
+        
+        Args:
+            contract_symbols: List of option contract symbols
+            chunk_size: Number of symbols per request
+        
+        Returns:
+            Dictionary of option snapshots (as AlpacaOptionsClient.get_option_snapshot)
+        """
+        async def fetch_chunk(chunk: List[str]) -> Dict:
+            try:
+                pages = await self._get_pages(f"{self.data_url}/v1beta1/options/snapshots", {
+                    'symbols': ','.join(chunk),
+                    'limit': SNAPSHOTS_PAGE_LIMIT,
+                }, 'get_option_snapshot')
+                return {
+                    symbol: self._snapshot_to_dict(snapshot)
+                    for page in pages for symbol, snapshot in (page.get('snapshots') or {}).items()
+                }
+            except Exception as e:
+                logger.error(f"Error fetching option snapshots for {len(chunk)} symbols starting at {chunk[0]}: {str(e)}")
+                return {}
+        
+        snapshot_data = {}
+        for chunk_data in await asyncio.gather(*(
+            fetch_chunk(contract_symbols[start:start + chunk_size])
+            for start in range(0, len(contract_symbols), chunk_size)
+        )):
+            snapshot_data.update(chunk_data)
+        return snapshot_data
+    
+    @staticmethod
+    def _snapshot_to_dict(snapshot: Dict) -> Dict:
+        """Extract last trade and quote fields from a REST option snapshot"""
+        data = {}
+        
+        trade = snapshot.get('latestTrade')
+        if trade:
+            data['last_price'] = float(trade['p']) if trade.get('p') else None
+            data['timestamp'] = trade.get('t')
+        
+        quote = snapshot.get('latestQuote')
+        if quote:
+            data['bid_price'] = float(quote['bp']) if quote.get('bp') else None
+            data['ask_price'] = float(quote['ap']) if quote.get('ap') else None
+        
+        return data
+    
+    async def get_underlying_price(self) -> Optional[float]:
+        """Get current price of the underlying asset"""
+        try:
+            latest = await self._get(
+                f"{self.data_url}/v2/stocks/{self.symbol}/bars/latest", name='get_latest_bar'
+            )
+            bar = latest.get('bar')
+            if bar and bar.get('c') is not None:
+                return float(bar['c'])
+            return None
+        except Exception as e:
+            logger.error(f"Error fetching underlying price: {str(e)}")
+            return None
+    
+    async def get_all_options_data(
+        self,
+        max_days_to_expiration: Optional[int] = CHAIN_MAX_DAYS_TO_EXPIRATION,
+        moneyness_window: Optional[float] = CHAIN_MONEYNESS_WINDOW,
+        option_type: Optional[str] = CHAIN_OPTION_TYPE
+    ) -> OptionChain:
+        """
+        Fetch all available options data with current market data
+        
+        The underlying bar and the contracts are requested concurrently, so
+        the strike band of moneyness_window is applied to the returned
+        contracts instead of server-side.
+        
+        Args:
+            max_days_to_expiration: Only fetch contracts expiring within this many days
+            moneyness_window: Only keep strikes within this fraction of spot
+            option_type: Only fetch 'call' or 'put' contracts
+        
+        Returns:
+            OptionChain as returned by AlpacaOptionsClient.get_all_options_data
+        """
+        async def fetch_spot():
+            with metrics.stage('fetch_spot'):
+                return await self.get_underlying_price()
+        
+        async def fetch_contracts():
+            with metrics.stage('fetch_contracts'):
+                return await self.get_option_contracts(**AlpacaOptionsClient.chain_filters(
+                    None, max_days_to_expiration, None, option_type
+                ))
+        
+        underlying_price, contracts = await asyncio.gather(fetch_spot(), fetch_contracts())
+        
+        if contracts and moneyness_window is not None and underlying_price:
+            strikes = contracts['strike_price']
+            contracts = contracts.take(
+                (strikes >= round(underlying_price * (1 - moneyness_window), 2))
+                & (strikes <= round(underlying_price * (1 + moneyness_window), 2))
+            )
+        
+        if not contracts:
+            logger.warning("No option contracts found")
+            return contracts
+        
+        with metrics.stage('fetch_snapshots'):
+            snapshots = await self.get_option_snapshot(contracts['option_symbol'].tolist())
+        
+        chain = AlpacaOptionsClient.combine_chain(
+            contracts, snapshots, underlying_price, datetime.now(timezone.utc)
+        )
+        logger.info(f"Collected data for {len(chain)} options")
+        return chain
+    
+    @staticmethod
+    def _bar_to_dict(bar: Dict) -> Dict:
+        """Convert a REST bar to the dictionary of AlpacaOptionsClient._bar_to_dict"""
+        return {
+            'timestamp': bar.get('t'),
+            'open': float(bar['o']) if bar.get('o') else None,
+            'high': float(bar['h']) if bar.get('h') else None,
+            'low': float(bar['l']) if bar.get('l') else None,
+            'close': float(bar['c']) if bar.get('c') else None,
+            'volume': int(bar['v']) if bar.get('v') else None,
+            'trade_count': int(bar['n']) if bar.get('n') else None,
+            'vwap': float(bar['vw']) if bar.get('vw') else None,
+        }
+    
+    async def get_historical_option_bars(
+        self,
+        option_symbol: str,
+        start_date: datetime,
+        end_date: datetime,
+        timeframe: TimeFrame = TimeFrame.Day
+    ) -> List[Dict]:
+        """Fetch historical option bars for a specific option contract"""
+        bars = await self.get_historical_option_bars_batch(
+            [option_symbol], start_date, end_date, timeframe
+        )
+        return bars.get(option_symbol, [])
+    
+    async def get_historical_option_bars_batch(
+        self,
+        option_symbols: List[str],
+        start_date: datetime,
+        end_date: datetime,
+        timeframe: TimeFrame = TimeFrame.Day,
+        chunk_size: int = BARS_CHUNK_SIZE,
+        raise_on_error: bool = False
+    ) -> Dict[str, List[Dict]]:
+        """
+        Fetch historical option bars for many contracts, all chunks at once
+        
+        Args:
+            option_symbols: Option contract symbols to fetch
+            start_date: Start date for historical data
+            end_date: End date for historical data
+            timeframe: TimeFrame for bars (Day, Hour, Minute, etc.)
+            chunk_size: Number of symbols per request
+            raise_on_error: Re-raise request errors instead of logging and
+                skipping the failed chunk
+        
+        Returns:
+            Dictionary of option symbol -> list of historical bar data dictionaries
+        """
+        async def fetch_chunk(chunk: List[str]) -> List[Dict]:
+            try:
+                return await self._get_pages(f"{self.data_url}/v1beta1/options/bars", {
+                    'symbols': ','.join(chunk),
+                    'timeframe': getattr(timeframe, 'value', timeframe),
+                    'start': _rfc3339(start_date),
+                    'end': _rfc3339(end_date),
+                    'limit': BARS_PAGE_LIMIT,
+                }, 'get_option_bars')
+            except Exception as e:
+                logger.error(f"Error fetching historical bars for {len(chunk)} symbols starting at {chunk[0]}: {str(e)}")
+                if raise_on_error:
+                    raise
+                return []
+        
+        historical_data: Dict[str, List[Dict]] = {}
+        for pages in await asyncio.gather(*(
+            fetch_chunk(option_symbols[start:start + chunk_size])
+            for start in range(0, len(option_symbols), chunk_size)
+        )):
+            for page in pages:
+                for symbol, symbol_bars in (page.get('bars') or {}).items():
+                    historical_data.setdefault(symbol, []).extend(
+                        self._bar_to_dict(bar) for bar in symbol_bars
+                    )
+        
+        logger.info(f"Fetched historical bars for {len(historical_data)} of {len(option_symbols)} contracts")
+        return historical_data
@@ -0,0 +1,64 @@
+"""
+Local checkpoint journal for resumable historical backfills
+"""
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Unit name recording that every contract chunk of a date is done
+DATE_COMPLETE = '*'
+
+class BackfillCheckpoint:
+    """
+    SQLite journal of completed backfill units
+    
+    A unit is one (date, contract chunk) pair. Units are only recorded after
+    all of their writes succeeded, so anything missing from the journal is
+    safe to retry: the backfill writes through an upsert on the natural key.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS completed_units (
+                    date TEXT NOT NULL,
+                    unit TEXT NOT NULL,
+                    stored INTEGER NOT NULL DEFAULT 0,
+                    completed_at TEXT NOT NULL,
+                    PRIMARY KEY (date, unit)
+                )
+            """)
+    
+    def is_done(self, date: str, unit: str = DATE_COMPLETE) -> bool:
+        """Check whether a unit was completed by this or a previous run"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM completed_units WHERE date = ? AND unit = ?",
+                (date, unit)
+            ).fetchone()
+        return row is not None
+    
+    def mark_done(self, date: str, unit: str = DATE_COMPLETE, stored: int = 0):
+        """Record a unit as completed"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO completed_units (date, unit, stored, completed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (date, unit, stored, datetime.now().isoformat())
+            )
+    
+    def reset(self):
+        """Forget all completed units so the next run starts over"""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM completed_units")
+        logger.info(f"Cleared backfill checkpoint {self.path}")
+    
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -2,14 +2,35 @@
 Main data collector script that fetches options data from Alpaca
 and stores it in Supabase continuously
 """
+import asyncio
 import logging
+import numpy as np
 import schedule
 import time
 from datetime import datetime
-from backend.config import SYMBOL
+from typing import Dict, Optional
+from backend.config import (
+    SYMBOL, WRITE_CHUNK_SIZE, STREAM_FLUSH_INTERVAL, PRICING_CACHE_PATH,
+    PRICING_CACHE_T_BUCKET_HOURS, SKIP_UNCHANGED_WRITES, SNAPSHOT_STORE_PATH,
+    RATE_CURVE_PATH, RISK_FREE_RATE, DIVIDEND_YIELD, IMPLY_FORWARDS, PRICING_WORKERS,
+    METRICS_PORT, METRICS_FILE, PROFILE_DIR, PROFILE_TRIGGER_PATH, PROFILER,
+    ALPACA_ASYNC_FETCH, ALPACA_REQUESTS_PER_MINUTE, VOL_SURFACE_MODEL
+)
 from backend.alpaca_client import AlpacaOptionsClient
-from backend.database import get_supabase_client
+from backend.async_alpaca_client import AsyncAlpacaOptionsClient
+from backend.database import (
+    GREEKS_DATA_COLUMNS, create_chain_snapshot, get_supabase_client, insert_in_chunks,
+    options_data_records, run_maintenance
+)
 from backend.greeks_calculator import GreeksCalculator
+from backend.metrics import CycleProfiler, format_durations, metrics, start_metrics_server
+from backend.option_chain import OptionChain
+from backend.parallel_pricing import ParallelChainPricer
+from backend.pricing_cache import PricingCache
+from backend.rate_curve import RateCurve
+from backend.rate_limiter import TokenBucketRateLimiter
+from backend.snapshot_store import open_snapshot_store
+from backend.vol_surface import SSVIFitter, SVIFitter
 import traceback
 
 logging.basicConfig(
@@ -19,133 +40,311 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class OptionsDataCollector:
-    def __init__(self):
+    def __init__(
+        self,
+        chunk_size: int = WRITE_CHUNK_SIZE,
+        pricing_cache_path: Optional[str] = PRICING_CACHE_PATH,
+        skip_unchanged_writes: bool = SKIP_UNCHANGED_WRITES,
+        pricing_workers: int = PRICING_WORKERS
+    ):
         self.alpaca_client = AlpacaOptionsClient()
+        # Fetches the live chain with concurrent requests over pooled connections
+        self.async_alpaca_client = (
+            AsyncAlpacaOptionsClient(rate_limiter=TokenBucketRateLimiter(ALPACA_REQUESTS_PER_MINUTE))
+            if ALPACA_ASYNC_FETCH else None
+        )
         self.supabase = get_supabase_client()
         self.greeks_calc = GreeksCalculator()
-        self.risk_free_rate = 0.05  # 5% risk-free rate (can be updated from Treasury rates)
+        # Rate and dividend yield term structures (flat RISK_FREE_RATE/DIVIDEND_YIELD without a curve file)
+        self.rate_curve = RateCurve(RATE_CURVE_PATH, RISK_FREE_RATE, DIVIDEND_YIELD)
+        self.imply_forwards = IMPLY_FORWARDS  # Dividend yield per expiration from put-call parity
+        self.chunk_size = chunk_size  # Rows per bulk insert request
+        
+        # Process pool pricing large chains, one shard of expirations per worker
+        self.chain_pricer = ParallelChainPricer(pricing_workers) if pricing_workers > 1 else None
+        
+        # Last cycle's inputs and Greeks per contract, persisted across restarts
+        self.pricing_cache = PricingCache(
+            pricing_cache_path, PRICING_CACHE_T_BUCKET_HOURS,
+            pricer=self.chain_pricer.price_chain if self.chain_pricer else None
+        )
+        self.skip_unchanged_writes = skip_unchanged_writes  # Don't store cycles in which nothing moved
+        
+        # Local Parquet copy of every chain snapshot (None if disabled)
+        self.snapshot_store = open_snapshot_store(SNAPSHOT_STORE_PATH)
+        
+        # SSVI surface (or an SVI smile per expiration), warm-started from the previous cycle's fit
+        self.surface_fitter = SSVIFitter() if VOL_SURFACE_MODEL == 'ssvi' else SVIFitter()
+        
+        # Per-stage timings and counters (see backend/metrics.py)
+        self.metrics_port = METRICS_PORT
+        self.metrics_file = METRICS_FILE
+        self.metrics_server = None
+        self.profiler = CycleProfiler(PROFILE_DIR, PROFILE_TRIGGER_PATH, PROFILER)
     
     def collect_and_store_data(self):
         """Main function to collect options data and store in Supabase"""
-        try:
-            logger.info(f"Starting data collection for {SYMBOL}")
-            
-            # Verify we're getting S&P 500 (SPY) options
-            self.alpaca_client.verify_sp500_options()
-            
-            # Fetch options data from Alpaca
-            options_data = self.alpaca_client.get_all_options_data()
+        with self.profiler.profile_if_requested():
+            try:
+                with metrics.cycle():
+                    self._collect_and_store_data()
+            except Exception as e:
+                metrics.increment('cycle_errors')
+                logger.error(f"Error in data collection: {str(e)}")
+                logger.debug(traceback.format_exc())
+        
+        metrics.increment('cycles')
+        logger.info(f"Cycle stage timings: {format_durations(metrics.last_cycle)}")
+        self.export_metrics()
+    
+    def _collect_and_store_data(self):
+        """One collection cycle: fetch, price, archive, fit and store the chain"""
+        logger.info(f"Starting data collection for {SYMBOL}")
+        
+        # Verify we're getting S&P 500 (SPY) options
+        self.alpaca_client.verify_sp500_options()
+        
+        # Fetch options data from Alpaca
+        if self.async_alpaca_client is not None:
+            chain = self.async_alpaca_client.run(self.async_alpaca_client.get_all_options_data())
+        else:
+            chain = self.alpaca_client.get_all_options_data()
+        
+        if not chain:
+            logger.warning("No options data retrieved")
+            return
+        metrics.increment('contracts', len(chain))
+        
+        with metrics.stage('compute'):
+            # Per-contract rate and dividend yield, and a forward per expiration
+            rates, dividend_yields, forwards = self.rate_curve.chain_inputs(
+                chain, imply_forwards=self.imply_forwards
+            )
             
-            if not options_data:
-                logger.warning("No options data retrieved")
-                return
+            # Price the contracts whose inputs changed in one vectorized pass
+            chain, changed = self.pricing_cache.price_chain(chain, r=rates, q=dividend_yields)
+            self.pricing_cache.save()
+        self.count_iv_failures(chain, changed)
+        
+        # Every row written for this chain shares its capture time and snapshot id
+        snapshot_id = self.register_snapshot(chain, 'live')
+        
+        with metrics.stage('archive_snapshot'):
+            self.archive_snapshot(chain)
+        with metrics.stage('fit_surface'):
+            self.fit_and_store_surface(chain, forwards, snapshot_id, rates, dividend_yields)
+        
+        # A snapshot is stored whole, so the latest snapshot is always the
+        # full chain; skipping only applies when nothing moved at all
+        if self.skip_unchanged_writes and not changed.any():
+            logger.info("No contracts changed since the last cycle, nothing to store")
+            return
+        
+        stored_count = self.store_records(chain, snapshot_id)
+        
+        logger.info(f"Successfully stored {stored_count} options records (snapshot {snapshot_id})")
+    
+    @staticmethod
+    def count_iv_failures(chain: OptionChain, repriced: np.ndarray):
+        """Count repriced contracts whose inputs were usable but whose IV could not be solved"""
+        priceable, _ = GreeksCalculator.pricing_inputs(chain)
+        failures = int((priceable & repriced & np.isnan(chain['implied_volatility'])).sum())
+        if failures:
+            metrics.increment('iv_failures', failures)
+    
+    def export_metrics(self):
+        """Rewrite the metrics file, if enabled"""
+        if not self.metrics_file:
+            return
+        try:
+            metrics.write_file(self.metrics_file)
+        except Exception as e:
+            logger.error(f"Error writing metrics file: {str(e)}")
+    
+    def start_monitoring(self):
+        """Start the metrics endpoint (if METRICS_PORT is set) and listen for profile requests"""
+        if self.metrics_port and self.metrics_server is None:
+            self.metrics_server = start_metrics_server(self.metrics_port)
+        self.profiler.install_signal_handler()
+    
+    def register_snapshot(self, chain: OptionChain, source: str) -> int:
+        """
+        Record a captured chain in chain_snapshots
+        
+        Args:
+            chain: Chain whose contracts all carry the capture time as timestamp
+            source: 'live' or 'stream'
+        
+        Returns:
+            Snapshot id
+        """
+        underlying_price = chain['underlying_price'][0]
+        return create_chain_snapshot(
+            self.supabase,
+            SYMBOL,
+            source,
+            chain['timestamp'][0],
+            underlying_price=None if np.isnan(underlying_price) else float(underlying_price),
+            num_contracts=len(chain)
+        )
+    
+    def archive_snapshot(self, chain: OptionChain):
+        """
+        Append a priced chain to the local snapshot store, if enabled
+        
+        Rows are stamped and partitioned by the chain's capture time (its
+        timestamp column), not by when the archive is written.
+        """
+        if self.snapshot_store is None:
+            return
+        try:
+            captured_at = datetime.fromisoformat(str(chain['timestamp'][0]).replace('Z', '+00:00'))
+            written = self.snapshot_store.write_chain(chain, captured_at)
+            logger.info(f"Archived {written} rows to local snapshot store")
+        except Exception as e:
+            logger.error(f"Error writing local snapshot: {str(e)}")
+            logger.debug(traceback.format_exc())
+    
+    def fit_and_store_surface(
+        self,
+        chain: OptionChain,
+        forwards: Optional[Dict[str, float]] = None,
+        snapshot_id: Optional[int] = None,
+        rates: Optional[np.ndarray] = None,
+        dividend_yields: Optional[np.ndarray] = None
+    ) -> int:
+        """
+        Fit the volatility surface of the full priced chain and store its raw SVI slices
+        
+        Args:
+            chain: Priced chain (with Greek columns)
+            forwards: Forward price per expiration date (from RateCurve.chain_inputs)
+            snapshot_id: chain_snapshots id of the chain; the slices are stamped
+                with it and the chain's capture time
+            rates: Per-contract rates the chain was priced with (default: the
+                curve's rate at each contract's maturity)
+            dividend_yields: Per-contract dividend yields the chain was priced
+                with (default: the curve's yield at each contract's maturity)
+        
+        Returns:
+            Number of slices stored
+        """
+        try:
+            T = np.nan_to_num(chain.get('time_to_maturity'), nan=0.0)
+            if rates is None:
+                rates = self.rate_curve.risk_free_rate(T)
+            if dividend_yields is None:
+                dividend_yields = self.rate_curve.dividend_yield(T)
+            slices = self.surface_fitter.fit_chain(
+                chain, r=rates, q=dividend_yields, forwards=forwards
+            )
+            if snapshot_id is not None:
+                for row in slices:
+                    row['snapshot_id'] = snapshot_id
+                    row['created_at'] = chain['timestamp'][0]
+            inserted = insert_in_chunks(self.supabase, 'vol_surface_slices', slices, self.chunk_size)
+            return sum(1 for row in inserted if row)
+        except Exception as e:
+            logger.error(f"Error fitting volatility surface: {str(e)}")
+            logger.debug(traceback.format_exc())
+            return 0
+    
+    def store_records(self, chain: OptionChain, snapshot_id: Optional[int] = None) -> int:
+        """
+        Bulk insert options_data rows, then the greeks_data and iv_evolution
+        rows of every option that landed
+        
+        Rows are stamped with the chain's timestamp column (its capture time)
+        and snapshot_id, so all tables agree on when the chain was seen.
+        
+        Returns:
+            Number of options_data rows stored
+        """
+        # Insert into options_data table
+        option_records = options_data_records(chain, snapshot_id)
+        inserted = insert_in_chunks(self.supabase, 'options_data', option_records, self.chunk_size)
+        
+        greeks_records = []
+        iv_records = []
+        for row, option_record, greeks in zip(inserted, option_records, chain.to_records(GREEKS_DATA_COLUMNS)):
+            if not row:
+                continue
             
-            # Process and store each option
-            stored_count = 0
-            for option in options_data:
-                try:
-                    # Prepare options_data record
-                    option_record = {
-                        'symbol': option['symbol'],
-                        'option_type': option['option_type'],
-                        'strike_price': float(option['strike_price']) if option['strike_price'] else None,
-                        'expiration_date': option['expiration_date'],
-                        'bid_price': float(option['bid_price']) if option['bid_price'] else None,
-                        'ask_price': float(option['ask_price']) if option['ask_price'] else None,
-                        'last_price': float(option['last_price']) if option['last_price'] else None,
-                        'underlying_price': float(option['underlying_price']) if option['underlying_price'] else None,
-                        'time_to_maturity': float(option['time_to_maturity']) if option['time_to_maturity'] else None,
-                        'implied_volatility': option.get('implied_volatility'),
-                    }
-                    
-                    # Use mid price for calculations if available
-                    mid_price = None
-                    if option['bid_price'] and option['ask_price']:
-                        mid_price = (option['bid_price'] + option['ask_price']) / 2
-                    elif option['last_price']:
-                        mid_price = option['last_price']
-                    
-                    # Calculate Greeks if we have necessary data
-                    if (option['underlying_price'] and option['strike_price'] and 
-                        option['time_to_maturity'] and mid_price):
-                        
-                        greeks = self.greeks_calc.calculate_greeks_for_option(
-                            S=option['underlying_price'],
-                            K=option['strike_price'],
-                            T=option['time_to_maturity'],
-                            r=self.risk_free_rate,
-                            market_price=mid_price,
-                            option_type=option['option_type']
-                        )
-                        
-                        # Update implied volatility if calculated
-                        if greeks['implied_volatility']:
-                            option_record['implied_volatility'] = greeks['implied_volatility']
-                    
-                    # Insert into options_data table
-                    result = self.supabase.table('options_data').insert(option_record).execute()
-                    
-                    if result.data:
-                        option_id = result.data[0]['id']
-                        stored_count += 1
-                        
-                        # Store Greeks if calculated
-                        if (option['underlying_price'] and option['strike_price'] and 
-                            option['time_to_maturity'] and mid_price):
-                            
-                            greeks_record = {
-                                'option_id': option_id,
-                                'symbol': option['symbol'],
-                                'strike_price': float(option['strike_price']),
-                                'expiration_date': option['expiration_date'],
-                                'option_type': option['option_type'],
-                                'delta': greeks['delta'],
-                                'gamma': greeks['gamma'],
-                                'theta': greeks['theta'],
-                                'vega': greeks['vega'],
-                                'rho': greeks['rho'],
-                            }
-                            
-                            self.supabase.table('greeks_data').insert(greeks_record).execute()
-                        
-                        # Store IV evolution data
-                        if option_record['implied_volatility']:
-                            iv_record = {
-                                'symbol': option['symbol'],
-                                'strike_price': float(option['strike_price']),
-                                'expiration_date': option['expiration_date'],
-                                'option_type': option['option_type'],
-                                'implied_volatility': float(option_record['implied_volatility']),
-                                'time_to_maturity': float(option['time_to_maturity']) if option['time_to_maturity'] else None,
-                            }
-                            
-                            self.supabase.table('iv_evolution').insert(iv_record).execute()
-                
-                except Exception as e:
-                    logger.error(f"Error processing option {option.get('option_symbol', 'unknown')}: {str(e)}")
-                    logger.debug(traceback.format_exc())
-                    continue
+            # Greeks and IV rows carry their option's capture time and snapshot
+            stamps = {key: option_record[key] for key in ('created_at', 'snapshot_id') if key in option_record}
+            iv_stamps = dict(stamps)
+            if 'created_at' in iv_stamps:
+                iv_stamps['recorded_at'] = iv_stamps.pop('created_at')
             
-            logger.info(f"Successfully stored {stored_count} options records")
+            # Attach Greeks to the id returned for their option
+            if greeks['delta'] is not None:
+                greeks_records.append({
+                    'option_id': row['id'],
+                    'symbol': option_record['symbol'],
+                    'strike_price': option_record['strike_price'],
+                    'expiration_date': option_record['expiration_date'],
+                    'option_type': option_record['option_type'],
+                    **greeks,
+                    **stamps,
+                })
             
+            # Store IV evolution data
+            if option_record['implied_volatility']:
+                iv_records.append({
+                    'symbol': option_record['symbol'],
+                    'strike_price': option_record['strike_price'],
+                    'expiration_date': option_record['expiration_date'],
+                    'option_type': option_record['option_type'],
+                    'implied_volatility': option_record['implied_volatility'],
+                    'time_to_maturity': option_record['time_to_maturity'],
+                    **iv_stamps,
+                })
+        
+        insert_in_chunks(self.supabase, 'greeks_data', greeks_records, self.chunk_size)
+        insert_in_chunks(self.supabase, 'iv_evolution', iv_records, self.chunk_size)
+        
+        return sum(1 for row in inserted if row)
+    
+    def run_maintenance(self):
+        """Create upcoming partitions, roll up old snapshots and drop expired partitions"""
+        try:
+            actions = run_maintenance(self.supabase)
+            rolled_up = sum(1 for a in actions if a['action'] == 'rolled_up')
+            dropped = sum(1 for a in actions if a['action'] == 'dropped')
+            logger.info(f"Maintenance: rolled up {rolled_up} partitions, dropped {dropped}")
         except Exception as e:
-            logger.error(f"Error in data collection: {str(e)}")
+            logger.error(f"Error running partition maintenance: {str(e)}")
             logger.debug(traceback.format_exc())
     
     def run_continuous(self, interval_minutes: int = 15):
         """Run data collection continuously at specified intervals"""
         logger.info(f"Starting continuous data collection (every {interval_minutes} minutes)")
+        self.start_monitoring()
         
         # Run immediately
+        self.run_maintenance()
         self.collect_and_store_data()
         
-        # Schedule periodic collection
+        # Schedule periodic collection, and partition maintenance once a day
         schedule.every(interval_minutes).minutes.do(self.collect_and_store_data)
+        schedule.every().day.at("00:15").do(self.run_maintenance)
         
         while True:
             schedule.run_pending()
             time.sleep(60)  # Check every minute
 
+    def run_streaming(self, flush_interval: float = STREAM_FLUSH_INTERVAL):
+        """Stream quotes in real time and store repriced contracts every flush_interval seconds"""
+        from backend.streaming import StreamingCollector
+        
+        logger.info(f"Starting streaming data collection (flushing every {flush_interval}s)")
+        self.start_monitoring()
+        streamer = StreamingCollector(self, flush_interval=flush_interval)
+        try:
+            asyncio.run(streamer.run())
+        except KeyboardInterrupt:
+            logger.info("Streaming stopped")
+
 if __name__ == "__main__":
     collector = OptionsDataCollector()
     
@@ -154,4 +353,7 @@ if __name__ == "__main__":
     
     # Uncomment to run continuously (every 15 minutes)
     # collector.run_continuous(interval_minutes=15)
+    
+    # Or uncomment to stream quotes in real time
+    # collector.run_streaming()
 
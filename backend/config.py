@@ -15,3 +15,73 @@ SUPABASE_KEY = os.getenv('SUPABASE_KEY', 'eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.e
 # Trading Configuration
 SYMBOL = 'SPY'  # S&P 500 ETF
 
+# Pricing inputs: CSV rate/dividend curve (see backend/rate_curve.py), with flat fallbacks
+RATE_CURVE_PATH = os.getenv('RATE_CURVE_PATH', 'rate_curve.csv')
+RISK_FREE_RATE = float(os.getenv('RISK_FREE_RATE', '0.05'))  # Used when there is no curve file
+DIVIDEND_YIELD = float(os.getenv('DIVIDEND_YIELD', '0.013'))  # SPY trailing yield, used where the curve has none
+IMPLY_FORWARDS = os.getenv('IMPLY_FORWARDS', 'true').lower() in ('1', 'true', 'yes')  # Dividend yield per expiration from put-call parity
+VOL_SURFACE_MODEL = os.getenv('VOL_SURFACE_MODEL', 'ssvi')  # 'ssvi' (one arbitrage-free surface) or 'svi' (a slice per expiration)
+
+
+# Alpaca request budget (requests per minute allowed by the Alpaca plan)
+ALPACA_REQUESTS_PER_MINUTE = int(os.getenv('ALPACA_REQUESTS_PER_MINUTE', '200'))
+
+# Alpaca request batching
+BARS_CHUNK_SIZE = int(os.getenv('BARS_CHUNK_SIZE', '100'))  # Option symbols per bars request
+SNAPSHOT_CHUNK_SIZE = int(os.getenv('SNAPSHOT_CHUNK_SIZE', '100'))  # Option symbols per snapshot request
+INTRADAY_WINDOW_MINUTES = int(os.getenv('INTRADAY_WINDOW_MINUTES', '60'))  # Session minutes per intraday bars request
+
+# Async collection client (backend/async_alpaca_client.py): spot, contracts and
+# snapshot batches fetched concurrently over a pooled keep-alive connection
+ALPACA_ASYNC_FETCH = os.getenv('ALPACA_ASYNC_FETCH', 'false').lower() in ('1', 'true', 'yes')
+ALPACA_DATA_URL = os.getenv('ALPACA_DATA_URL', 'https://data.alpaca.markets')
+ALPACA_MAX_CONNECTIONS = int(os.getenv('ALPACA_MAX_CONNECTIONS', '8'))  # Also the limit on requests in flight
+ALPACA_HTTP_TIMEOUT = float(os.getenv('ALPACA_HTTP_TIMEOUT', '30'))  # Seconds
+
+# Live chain filters, applied server-side (unset = whole chain)
+CHAIN_MAX_DAYS_TO_EXPIRATION = int(os.getenv('CHAIN_MAX_DAYS_TO_EXPIRATION')) if os.getenv('CHAIN_MAX_DAYS_TO_EXPIRATION') else None
+CHAIN_MONEYNESS_WINDOW = float(os.getenv('CHAIN_MONEYNESS_WINDOW')) if os.getenv('CHAIN_MONEYNESS_WINDOW') else None  # e.g. 0.2 = strikes within 20% of spot
+CHAIN_OPTION_TYPE = os.getenv('CHAIN_OPTION_TYPE') or None  # 'call', 'put' or unset for both
+
+# Storage Configuration
+WRITE_CHUNK_SIZE = int(os.getenv('WRITE_CHUNK_SIZE', '500'))  # Rows per bulk insert request
+
+# Backfill checkpoint journal (SQLite), used by --resume
+BACKFILL_CHECKPOINT_PATH = os.getenv('BACKFILL_CHECKPOINT_PATH', '.backfill_checkpoint.sqlite')
+
+# Record/replay cache of the backfill's Alpaca responses (backend/response_cache.py)
+ALPACA_CACHE_PATH = os.getenv('ALPACA_CACHE_PATH', '.alpaca_cache.sqlite')
+ALPACA_CACHE_MODE = os.getenv('ALPACA_CACHE_MODE', 'record')  # 'off', 'record' or 'replay' (cache only, offline)
+ALPACA_CACHE_LIVE_TTL = float(os.getenv('ALPACA_CACHE_LIVE_TTL', '3600'))  # Seconds for responses that can still change
+
+# Streaming collector
+ALPACA_OPTION_STREAM_URL = os.getenv('ALPACA_OPTION_STREAM_URL', 'wss://stream.data.alpaca.markets/v1beta1/indicative')
+ALPACA_STOCK_STREAM_URL = os.getenv('ALPACA_STOCK_STREAM_URL', 'wss://stream.data.alpaca.markets/v2/iex')
+STREAM_FLUSH_INTERVAL = float(os.getenv('STREAM_FLUSH_INTERVAL', '5'))  # Seconds between reprice/write passes
+STREAM_MAX_CONTRACTS = int(os.getenv('STREAM_MAX_CONTRACTS', '1000'))  # Alpaca's option stream subscription limit
+STREAM_ARCHIVE_INTERVAL = float(os.getenv('STREAM_ARCHIVE_INTERVAL', '900'))  # Seconds between local snapshot store writes
+
+# Incremental recompute: contracts whose inputs did not change reuse last cycle's results
+PRICING_CACHE_PATH = os.getenv('PRICING_CACHE_PATH', '.pricing_cache.json')
+PRICING_CACHE_T_BUCKET_HOURS = float(os.getenv('PRICING_CACHE_T_BUCKET_HOURS', '1'))
+SKIP_UNCHANGED_WRITES = os.getenv('SKIP_UNCHANGED_WRITES', 'false').lower() in ('1', 'true', 'yes')
+
+# Worker processes pricing the chain, sharded by expiration (1 = in-process)
+PRICING_WORKERS = int(os.getenv('PRICING_WORKERS', '1'))
+
+# Metrics: Prometheus endpoint port (0 = disabled) and/or a file rewritten after every cycle (empty = disabled)
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+METRICS_FILE = os.getenv('METRICS_FILE', '')
+
+# On-demand profiling: create PROFILE_TRIGGER_PATH (or send SIGUSR1) to profile the next cycle into PROFILE_DIR
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_TRIGGER_PATH = os.getenv('PROFILE_TRIGGER_PATH', '.profile_next_cycle')
+PROFILER = os.getenv('PROFILER', 'cprofile')  # 'cprofile' or 'pyinstrument'
+
+# Local Parquet snapshot store (empty = disabled)
+SNAPSHOT_STORE_PATH = os.getenv('SNAPSHOT_STORE_PATH', 'data/snapshots')
+
+# Partition maintenance (see run_options_maintenance in supabase_schema.sql)
+ROLLUP_AFTER_DAYS = int(os.getenv('ROLLUP_AFTER_DAYS', '2'))  # Compact raw snapshots older than this into end-of-day rows
+RAW_RETENTION_DAYS = int(os.getenv('RAW_RETENTION_DAYS', '30'))  # Drop raw daily partitions older than this
+PARTITION_DAYS_AHEAD = int(os.getenv('PARTITION_DAYS_AHEAD', '7'))  # Daily partitions created ahead of time
@@ -2,15 +2,334 @@
 Database setup and utilities for Supabase
 """
 from supabase import create_client, Client
-from backend.config import SUPABASE_URL, SUPABASE_KEY
+from backend.config import (
+    SUPABASE_URL, SUPABASE_KEY, WRITE_CHUNK_SIZE, ROLLUP_AFTER_DAYS,
+    RAW_RETENTION_DAYS, PARTITION_DAYS_AHEAD
+)
+from backend.metrics import metrics
+from backend.option_chain import OptionChain, timestamps_to_seconds
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 import logging
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# Columns that identify one option at one snapshot time (uq_options_snapshot)
+OPTIONS_NATURAL_KEY = ('symbol', 'option_type', 'strike_price', 'expiration_date', 'created_at')
+
+# Natural keys of greeks_data (uq_greeks_snapshot) and iv_evolution (uq_iv_snapshot)
+GREEKS_NATURAL_KEY = OPTIONS_NATURAL_KEY
+IV_EVOLUTION_NATURAL_KEY = ('symbol', 'option_type', 'strike_price', 'expiration_date', 'recorded_at')
+
+# Rows per page of a SELECT (PostgREST's default max-rows)
+SELECT_PAGE_SIZE = 1000
+
+# options_data columns taken from an option chain
+OPTIONS_DATA_COLUMNS = (
+    'symbol', 'option_type', 'strike_price', 'expiration_date', 'bid_price', 'ask_price',
+    'last_price', 'underlying_price', 'time_to_maturity', 'implied_volatility'
+)
+
+# Greeks columns of greeks_data
+GREEKS_DATA_COLUMNS = ('delta', 'gamma', 'theta', 'vega', 'rho')
+
 def get_supabase_client() -> Client:
     """Initialize and return Supabase client"""
     return create_client(SUPABASE_URL, SUPABASE_KEY)
 
+def options_data_records(
+    chain: OptionChain,
+    snapshot_id: Optional[Union[int, Sequence[int]]] = None,
+    default_created_at: Optional[str] = None
+) -> List[Dict]:
+    """
+    options_data records for every contract of a priced chain
+    
+    Zero prices and maturities are stored as missing, like unquoted ones.
+    
+    Args:
+        chain: Priced chain
+        snapshot_id: chain_snapshots id to reference from every record, or
+            one id per contract (chains of several bar times)
+        default_created_at: created_at for contracts without a timestamp
+            (without one, and without a timestamp column, the database
+            default applies)
+    """
+    zero_as_missing = {
+        name: np.where(chain.get(name) == 0, np.nan, chain.get(name))
+        for name in ('strike_price', 'bid_price', 'ask_price', 'last_price', 'underlying_price', 'time_to_maturity')
+    }
+    records = chain.with_columns(**zero_as_missing).to_records(OPTIONS_DATA_COLUMNS)
+    if 'timestamp' in chain or default_created_at:
+        for record, timestamp in zip(records, chain.get('timestamp').tolist()):
+            record['created_at'] = timestamp or default_created_at
+    if snapshot_id is not None:
+        snapshot_ids = np.broadcast_to(np.asarray(snapshot_id), len(records)).tolist()
+        for record, record_snapshot_id in zip(records, snapshot_ids):
+            record['snapshot_id'] = record_snapshot_id
+    return records
+
+def create_chain_snapshot(
+    supabase: Client,
+    symbol: str,
+    source: str,
+    captured_at: str,
+    underlying_price: Optional[float] = None,
+    num_contracts: Optional[int] = None
+) -> int:
+    """
+    Register one captured chain in chain_snapshots
+    
+    Registering the same (symbol, source, captured_at) again, e.g. when a
+    backfilled day is retried, returns the existing snapshot's id.
+    
+    Args:
+        supabase: Supabase client
+        symbol: Underlying symbol
+        source: 'live', 'stream' or 'backfill'
+        captured_at: ISO timestamp shared by every row of the chain
+        underlying_price: Spot the chain was priced at
+        num_contracts: Contracts in the chain
+    
+    Returns:
+        Snapshot id
+    """
+    result = supabase.table('chain_snapshots').upsert({
+        'symbol': symbol,
+        'source': source,
+        'captured_at': captured_at,
+        'underlying_price': underlying_price,
+        'num_contracts': num_contracts,
+    }, on_conflict='symbol,source,captured_at').execute()
+    return result.data[0]['id']
+
+def create_chain_snapshots(
+    supabase: Client,
+    symbol: str,
+    source: str,
+    captured_ats: Sequence[str]
+) -> Dict[str, int]:
+    """
+    Register many captured chains in chain_snapshots with one request
+    
+    Bulk counterpart of create_chain_snapshot, e.g. for the bar times of an
+    intraday backfill. Snapshots that already exist keep their id.
+    
+    Args:
+        supabase: Supabase client
+        symbol: Underlying symbol
+        source: 'live', 'stream' or 'backfill'
+        captured_ats: ISO timestamps of the chains
+    
+    Returns:
+        Dictionary of captured_at -> snapshot id
+    """
+    captured_ats = list(dict.fromkeys(captured_ats))
+    if not captured_ats:
+        return {}
+    result = supabase.table('chain_snapshots').upsert(
+        [{'symbol': symbol, 'source': source, 'captured_at': captured_at} for captured_at in captured_ats],
+        on_conflict='symbol,source,captured_at'
+    ).execute()
+    
+    # The database formats timestamps its own way; match rows by instant
+    ids_by_instant = {
+        instant: row['id']
+        for instant, row in zip(timestamps_to_seconds(row['captured_at'] for row in result.data), result.data)
+    }
+    return {
+        captured_at: ids_by_instant[instant]
+        for captured_at, instant in zip(captured_ats, timestamps_to_seconds(captured_ats))
+    }
+
+def insert_in_chunks(
+    supabase: Client,
+    table: str,
+    records: List[Dict],
+    chunk_size: int = WRITE_CHUNK_SIZE
+) -> List[Optional[Dict]]:
+    """
+    Bulk insert records into a table, one request per chunk
+    
+    A failing chunk is logged and skipped so the rest of the batch still lands.
+    
+    Returns:
+        List aligned with records holding the inserted row (with its id),
+        or None for records whose chunk failed
+    """
+    inserted: List[Optional[Dict]] = [None] * len(records)
+    failed_chunks = 0
+    
+    for start in range(0, len(records), chunk_size):
+        chunk = records[start:start + chunk_size]
+        try:
+            with metrics.stage(f"write_{table}"):
+                result = supabase.table(table).insert(chunk).execute()
+            rows = result.data or []
+            if len(rows) != len(chunk):
+                raise ValueError(f"expected {len(chunk)} rows back, got {len(rows)}")
+            inserted[start:start + len(chunk)] = rows
+        except Exception as e:
+            failed_chunks += 1
+            metrics.increment('write_errors', table=table)
+            logger.error(
+                f"Error inserting {table} rows {start}-{start + len(chunk) - 1}: {str(e)}"
+            )
+    
+    if failed_chunks:
+        logger.warning(f"{failed_chunks} chunk(s) failed while writing to {table}")
+    
+    return inserted
+
+def _parse_timestamp(value) -> datetime:
+    """Parse an ISO timestamp, treating naive values as UTC like Postgres does"""
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+def options_natural_key(record: Dict) -> Tuple:
+    """
+    Normalized natural key of an options_data row
+    
+    Works for both the records we send and the rows PostgREST returns, which
+    format numbers, dates and timestamps differently.
+    """
+    return (
+        record['symbol'],
+        record['option_type'],
+        float(record['strike_price']),
+        str(record['expiration_date'])[:10],
+        _parse_timestamp(record['created_at']),
+    )
+
+def upsert_in_chunks(
+    supabase: Client,
+    table: str,
+    records: List[Dict],
+    on_conflict: str,
+    chunk_size: int = WRITE_CHUNK_SIZE
+) -> Tuple[List[Dict], int]:
+    """
+    Bulk insert records in chunks, silently skipping rows that collide with
+    an existing row on the on_conflict columns
+    
+    A failing chunk is logged and skipped so the rest of the batch still lands.
+    
+    Returns:
+        Tuple of (rows that were actually inserted, number of records in
+        failed chunks). Skipped duplicates are neither returned nor counted
+        as failed.
+    """
+    inserted: List[Dict] = []
+    failed_chunks = 0
+    failed_records = 0
+    
+    for start in range(0, len(records), chunk_size):
+        chunk = records[start:start + chunk_size]
+        try:
+            with metrics.stage(f"write_{table}"):
+                result = supabase.table(table).upsert(
+                    chunk, on_conflict=on_conflict, ignore_duplicates=True
+                ).execute()
+            inserted.extend(result.data or [])
+        except Exception as e:
+            failed_chunks += 1
+            failed_records += len(chunk)
+            metrics.increment('write_errors', table=table)
+            logger.error(
+                f"Error upserting {table} rows {start}-{start + len(chunk) - 1}: {str(e)}"
+            )
+    
+    if failed_chunks:
+        logger.warning(f"{failed_chunks} chunk(s) failed while writing to {table}")
+    
+    return inserted, failed_records
+
+def select_option_ids(
+    supabase: Client,
+    records: List[Dict],
+    chunk_size: int = WRITE_CHUNK_SIZE
+) -> Dict[Tuple, int]:
+    """
+    Look up the ids of existing options_data rows matching records on
+    OPTIONS_NATURAL_KEY (rows an ignore-duplicates upsert did not return)
+    
+    Each chunk is fetched with one IN filter per key column and matched
+    client-side, a page of SELECT_PAGE_SIZE rows at a time. A failing
+    chunk is logged and skipped; its records are simply not in the result.
+    
+    Returns:
+        Dictionary of options_natural_key -> options_data id
+    """
+    wanted = {options_natural_key(record) for record in records}
+    option_ids: Dict[Tuple, int] = {}
+    
+    for start in range(0, len(records), chunk_size):
+        chunk = records[start:start + chunk_size]
+        try:
+            with metrics.stage('read_options_data'):
+                offset = 0
+                while True:
+                    query = supabase.table('options_data').select('id,' + ','.join(OPTIONS_NATURAL_KEY))
+                    for column in OPTIONS_NATURAL_KEY:
+                        query = query.in_(column, sorted({str(record[column]) for record in chunk}))
+                    rows = query.order('id').range(offset, offset + SELECT_PAGE_SIZE - 1).execute().data or []
+                    for row in rows:
+                        key = options_natural_key(row)
+                        if key in wanted:
+                            option_ids[key] = row['id']
+                    if len(rows) < SELECT_PAGE_SIZE:
+                        break
+                    offset += SELECT_PAGE_SIZE
+        except Exception as e:
+            metrics.increment('read_errors', table='options_data')
+            logger.error(
+                f"Error looking up options_data ids for rows {start}-{start + len(chunk) - 1}: {str(e)}"
+            )
+    
+    return option_ids
+
+def create_daily_partitions(supabase: Client, start_date: date, end_date: date) -> int:
+    """
+    Make sure the daily partitions for start_date..end_date exist
+    
+    Rows written for days without a partition would otherwise pile up in the
+    default partitions.
+    
+    Returns:
+        Number of partitions created
+    """
+    result = supabase.rpc('create_daily_partitions', {
+        'p_start': start_date.isoformat(),
+        'p_end': end_date.isoformat(),
+    }).execute()
+    return result.data or 0
+
+def run_maintenance(
+    supabase: Client,
+    rollup_after_days: int = ROLLUP_AFTER_DAYS,
+    retention_days: int = RAW_RETENTION_DAYS,
+    days_ahead: int = PARTITION_DAYS_AHEAD
+) -> List[Dict]:
+    """
+    Create upcoming partitions, compact old intraday snapshots into
+    end-of-day rows and drop raw partitions past retention
+    
+    Returns:
+        One {'partition_name', 'action'} row per partition rolled up or dropped
+    """
+    result = supabase.rpc('run_options_maintenance', {
+        'p_rollup_after_days': rollup_after_days,
+        'p_retention_days': retention_days,
+        'p_days_ahead': days_ahead,
+    }).execute()
+    return result.data or []
+
 def create_tables():
     """
     Create necessary tables in Supabase.
@@ -21,9 +340,24 @@ def create_tables():
     
     # SQL to create tables (run this in Supabase SQL editor)
     sql_statements = """
+    -- Tables are partitioned by day; supabase_schema.sql also has the
+    -- end-of-day rollup tables and the partition maintenance functions
+
+    -- One row per captured chain, referenced by every row written for it
+    CREATE TABLE IF NOT EXISTS chain_snapshots (
+        id BIGSERIAL PRIMARY KEY,
+        symbol VARCHAR(10) NOT NULL,
+        source VARCHAR(8) NOT NULL, -- 'live', 'stream' or 'backfill'
+        captured_at TIMESTAMP WITH TIME ZONE NOT NULL,
+        underlying_price DECIMAL(10, 2),
+        num_contracts INTEGER,
+        created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+        UNIQUE (symbol, source, captured_at)
+    );
+
     -- Options data table
     CREATE TABLE IF NOT EXISTS options_data (
-        id BIGSERIAL PRIMARY KEY,
+        id BIGSERIAL,
         symbol VARCHAR(10) NOT NULL,
         option_type VARCHAR(4) NOT NULL, -- 'call' or 'put'
         strike_price DECIMAL(10, 2) NOT NULL,
@@ -36,14 +370,16 @@ def create_tables():
         implied_volatility DECIMAL(8, 6),
         underlying_price DECIMAL(10, 2),
         time_to_maturity DECIMAL(10, 6), -- in years
-        created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-        updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
-    );
+        snapshot_id BIGINT,
+        created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at);
 
     -- Greeks data table
     CREATE TABLE IF NOT EXISTS greeks_data (
-        id BIGSERIAL PRIMARY KEY,
-        option_id BIGINT REFERENCES options_data(id),
+        id BIGSERIAL,
+        option_id BIGINT,
         symbol VARCHAR(10) NOT NULL,
         strike_price DECIMAL(10, 2) NOT NULL,
         expiration_date DATE NOT NULL,
@@ -53,26 +389,46 @@ def create_tables():
         theta DECIMAL(10, 6),
         vega DECIMAL(10, 6),
         rho DECIMAL(10, 6),
-        created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
-    );
+        snapshot_id BIGINT,
+        created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at);
 
     -- IV evolution table
     CREATE TABLE IF NOT EXISTS iv_evolution (
-        id BIGSERIAL PRIMARY KEY,
+        id BIGSERIAL,
         symbol VARCHAR(10) NOT NULL,
         strike_price DECIMAL(10, 2) NOT NULL,
         expiration_date DATE NOT NULL,
         option_type VARCHAR(4) NOT NULL,
         implied_volatility DECIMAL(8, 6),
         time_to_maturity DECIMAL(10, 6),
-        recorded_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
-    );
+        snapshot_id BIGINT,
+        recorded_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (id, recorded_at)
+    ) PARTITION BY RANGE (recorded_at);
+
+    CREATE TABLE IF NOT EXISTS options_data_default PARTITION OF options_data DEFAULT;
+    CREATE TABLE IF NOT EXISTS greeks_data_default PARTITION OF greeks_data DEFAULT;
+    CREATE TABLE IF NOT EXISTS iv_evolution_default PARTITION OF iv_evolution DEFAULT;
 
     -- Create indexes for better query performance
-    CREATE INDEX IF NOT EXISTS idx_options_symbol_exp ON options_data(symbol, expiration_date);
-    CREATE INDEX IF NOT EXISTS idx_options_created_at ON options_data(created_at);
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_options_snapshot
+        ON options_data(symbol, option_type, strike_price, expiration_date, created_at);
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_greeks_snapshot
+        ON greeks_data(symbol, option_type, strike_price, expiration_date, created_at);
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_iv_snapshot
+        ON iv_evolution(symbol, option_type, strike_price, expiration_date, recorded_at);
     CREATE INDEX IF NOT EXISTS idx_greeks_option_id ON greeks_data(option_id);
-    CREATE INDEX IF NOT EXISTS idx_iv_evolution_symbol_exp ON iv_evolution(symbol, expiration_date, strike_price);
+    CREATE INDEX IF NOT EXISTS idx_options_exp_latest
+        ON options_data(expiration_date, created_at DESC)
+        INCLUDE (option_type, strike_price, implied_volatility);
+    CREATE INDEX IF NOT EXISTS idx_greeks_exp_latest
+        ON greeks_data(expiration_date, created_at DESC)
+        INCLUDE (option_type, strike_price, delta, gamma, theta, vega, rho);
+    CREATE INDEX IF NOT EXISTS idx_iv_evolution_exp_recorded
+        ON iv_evolution(expiration_date, recorded_at)
+        INCLUDE (strike_price, option_type, implied_volatility, time_to_maturity);
     """
     
     logger.info("Please run the following SQL in your Supabase SQL editor:")
@@ -1,13 +1,19 @@
 """
-Calculate option Greeks using Black-Scholes model
+Calculate option Greeks using the Black-Scholes-Merton model
+
+Every pricing function takes a continuous dividend yield q (default 0,
+which is plain Black-Scholes).
 """
 import numpy as np
 from scipy.stats import norm
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple, Union
 import logging
+from backend.option_chain import OptionChain
 
 logger = logging.getLogger(__name__)
 
+ArrayLike = Union[float, np.ndarray]
+
 class GreeksCalculator:
     @staticmethod
     def black_scholes(
@@ -16,10 +22,11 @@ class GreeksCalculator:
         T: float,  # Time to maturity (years)
         r: float,  # Risk-free rate
         sigma: float,  # Volatility
-        option_type: str = 'call'  # 'call' or 'put'
+        option_type: str = 'call',  # 'call' or 'put'
+        q: float = 0.0  # Continuous dividend yield
     ) -> Dict[str, float]:
         """
-        Calculate Black-Scholes option price and Greeks
+        Calculate Black-Scholes-Merton option price and Greeks
         
         Returns:
             Dictionary with price, delta, gamma, theta, vega, rho
@@ -39,24 +46,105 @@ class GreeksCalculator:
                 'rho': 0.0
             }
         
-        d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * np.sqrt(T))
+        d1 = (np.log(S / K) + (r - q + 0.5 * sigma ** 2) * T) / (sigma * np.sqrt(T))
         d2 = d1 - sigma * np.sqrt(T)
+        S_div = S * np.exp(-q * T)  # Spot net of dividends paid before expiry
         
         if option_type == 'call':
-            price = S * norm.cdf(d1) - K * np.exp(-r * T) * norm.cdf(d2)
-            delta = norm.cdf(d1)
-            theta = (-(S * norm.pdf(d1) * sigma) / (2 * np.sqrt(T)) 
-                    - r * K * np.exp(-r * T) * norm.cdf(d2)) / 365
+            price = S_div * norm.cdf(d1) - K * np.exp(-r * T) * norm.cdf(d2)
+            delta = np.exp(-q * T) * norm.cdf(d1)
+            theta = (-(S_div * norm.pdf(d1) * sigma) / (2 * np.sqrt(T)) 
+                    - r * K * np.exp(-r * T) * norm.cdf(d2)
+                    + q * S_div * norm.cdf(d1)) / 365
             rho = K * T * np.exp(-r * T) * norm.cdf(d2) / 100
         else:  # put
-            price = K * np.exp(-r * T) * norm.cdf(-d2) - S * norm.cdf(-d1)
-            delta = -norm.cdf(-d1)
-            theta = (-(S * norm.pdf(d1) * sigma) / (2 * np.sqrt(T)) 
-                    + r * K * np.exp(-r * T) * norm.cdf(-d2)) / 365
+            price = K * np.exp(-r * T) * norm.cdf(-d2) - S_div * norm.cdf(-d1)
+            delta = -np.exp(-q * T) * norm.cdf(-d1)
+            theta = (-(S_div * norm.pdf(d1) * sigma) / (2 * np.sqrt(T)) 
+                    + r * K * np.exp(-r * T) * norm.cdf(-d2)
+                    - q * S_div * norm.cdf(-d1)) / 365
             rho = -K * T * np.exp(-r * T) * norm.cdf(-d2) / 100
         
-        gamma = norm.pdf(d1) / (S * sigma * np.sqrt(T))
-        vega = S * norm.pdf(d1) * np.sqrt(T) / 100
+        gamma = np.exp(-q * T) * norm.pdf(d1) / (S * sigma * np.sqrt(T))
+        vega = S_div * norm.pdf(d1) * np.sqrt(T) / 100
+        
+        return {
+            'price': price,
+            'delta': delta,
+            'gamma': gamma,
+            'theta': theta,
+            'vega': vega,
+            'rho': rho
+        }
+    
+    @staticmethod
+    def black_scholes_batch(
+        S: ArrayLike,  # Spot prices
+        K: ArrayLike,  # Strike prices
+        T: ArrayLike,  # Times to maturity (years)
+        r: ArrayLike,  # Risk-free rates
+        sigma: ArrayLike,  # Volatilities
+        is_call: Union[bool, np.ndarray] = True,  # True for calls, False for puts
+        q: ArrayLike = 0.0  # Continuous dividend yields
+    ) -> Dict[str, np.ndarray]:
+        """
+        Calculate Black-Scholes-Merton prices and Greeks for a whole chain at once
+        
+        All inputs are broadcast against each other, so scalars can be mixed
+        with arrays (e.g. a single spot and rate for every contract).
+        Contracts with T <= 0 get the same expired-option values as
+        black_scholes.
+        
+        Returns:
+            Dictionary of arrays with price, delta, gamma, theta, vega, rho
+        """
+        S, K, T, r, sigma, is_call, q = np.broadcast_arrays(
+            np.asarray(S, dtype=float),
+            np.asarray(K, dtype=float),
+            np.asarray(T, dtype=float),
+            np.asarray(r, dtype=float),
+            np.asarray(sigma, dtype=float),
+            np.asarray(is_call, dtype=bool),
+            np.asarray(q, dtype=float)
+        )
+        
+        expired = T <= 0
+        # Keep the math finite on expired rows; they are overwritten below
+        T_live = np.where(expired, 1.0, T)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sqrt_T = np.sqrt(T_live)
+            sig_sqrt_T = sigma * sqrt_T
+            d1 = (np.log(S / K) + (r - q + 0.5 * sigma ** 2) * T_live) / sig_sqrt_T
+            d2 = d1 - sig_sqrt_T
+            
+            discount = K * np.exp(-r * T_live)
+            dividend_discount = np.exp(-q * T_live)
+            S_div = S * dividend_discount
+            pdf_d1 = norm.pdf(d1)
+            # N(d) for calls, N(-d) for puts
+            sign = np.where(is_call, 1.0, -1.0)
+            cdf_d1 = norm.cdf(sign * d1)
+            cdf_d2 = norm.cdf(sign * d2)
+            
+            price = sign * (S_div * cdf_d1 - discount * cdf_d2)
+            delta = sign * dividend_discount * cdf_d1
+            theta = (-(S_div * pdf_d1 * sigma) / (2 * sqrt_T)
+                     - sign * r * discount * cdf_d2
+                     + sign * q * S_div * cdf_d1) / 365
+            rho = sign * discount * T_live * cdf_d2 / 100
+            gamma = dividend_discount * pdf_d1 / (S * sig_sqrt_T)
+            vega = S_div * pdf_d1 * sqrt_T / 100
+        
+        if expired.any():
+            intrinsic = np.maximum(sign * (S - K), 0.0)
+            in_the_money = np.where(is_call, S > K, S < K)
+            price = np.where(expired, intrinsic, price)
+            delta = np.where(expired, np.where(in_the_money, 1.0, 0.0), delta)
+            gamma = np.where(expired, 0.0, gamma)
+            theta = np.where(expired, 0.0, theta)
+            vega = np.where(expired, 0.0, vega)
+            rho = np.where(expired, 0.0, rho)
         
         return {
             'price': price,
@@ -76,10 +164,13 @@ class GreeksCalculator:
         r: float,
         option_type: str = 'call',
         max_iterations: int = 100,
-        tolerance: float = 0.0001
+        tolerance: float = 0.0001,
+        q: float = 0.0
     ) -> Optional[float]:
         """
-        Calculate implied volatility using Newton-Raphson method
+        Calculate implied volatility for a single option
+        
+        Thin wrapper over calculate_implied_volatility_batch.
         
         Returns:
             Implied volatility or None if calculation fails
@@ -87,28 +178,146 @@ class GreeksCalculator:
         if T <= 0 or market_price <= 0:
             return None
         
-        # Initial guess
-        sigma = 0.2
+        sigma = GreeksCalculator.calculate_implied_volatility_batch(
+            market_price, S, K, T, r, option_type == 'call',
+            max_iterations=max_iterations, tolerance=tolerance, q=q
+        )
+        
+        return None if np.isnan(sigma) else float(sigma)
+    
+    @staticmethod
+    def _initial_volatility_guess(
+        call_price: np.ndarray,
+        S: np.ndarray,
+        discounted_K: np.ndarray,
+        T: np.ndarray
+    ) -> np.ndarray:
+        """
+        Corrado-Miller rational guess, falling back to Brenner-Subrahmanyam
+        
+        Both are closed-form approximations from the call price, so puts must
+        be converted through put-call parity first. With dividends, S is the
+        spot net of dividends (S * exp(-q * T)).
+        """
+        moneyness = S - discounted_K
+        half = call_price - moneyness / 2
+        with np.errstate(invalid='ignore'):
+            root = np.sqrt(half ** 2 - moneyness ** 2 / np.pi)
+            corrado_miller = np.sqrt(2 * np.pi / T) / (S + discounted_K) * (half + root)
+        brenner_subrahmanyam = np.sqrt(2 * np.pi / T) * call_price / S
+        return np.where(np.isfinite(corrado_miller) & (corrado_miller > 0),
+                        corrado_miller, brenner_subrahmanyam)
+    
+    @staticmethod
+    def calculate_implied_volatility_batch(
+        market_price: ArrayLike,
+        S: ArrayLike,
+        K: ArrayLike,
+        T: ArrayLike,
+        r: ArrayLike,
+        is_call: Union[bool, np.ndarray] = True,
+        max_iterations: int = 100,
+        tolerance: float = 0.0001,
+        min_sigma: float = 1e-4,
+        max_sigma: float = 5.0,
+        q: ArrayLike = 0.0
+    ) -> np.ndarray:
+        """
+        Calculate implied volatility for a whole chain at once
+        
+        Runs Newton-Raphson on every contract simultaneously while keeping a
+        per-contract [low, high] volatility bracket. Whenever a Newton step
+        leaves the bracket or vega is too small (deep OTM wings), that
+        contract takes a bisection step instead, so the solve cannot diverge.
+        Contracts drop out of the iteration as soon as they converge.
+        
+        Returns:
+            Array of implied volatilities, NaN where no volatility in
+            [min_sigma, max_sigma] reproduces the market price
+        """
+        market_price, S, K, T, r, is_call, q = np.broadcast_arrays(
+            np.asarray(market_price, dtype=float),
+            np.asarray(S, dtype=float),
+            np.asarray(K, dtype=float),
+            np.asarray(T, dtype=float),
+            np.asarray(r, dtype=float),
+            np.asarray(is_call, dtype=bool),
+            np.asarray(q, dtype=float)
+        )
+        shape = market_price.shape
+        market_price, S, K, T, r, is_call, q = (
+            a.ravel() for a in (market_price, S, K, T, r, is_call, q)
+        )
+        
+        sigma = np.full(market_price.shape, np.nan)
+        
+        # Reject contracts whose price breaks the no-arbitrage bounds
+        with np.errstate(invalid='ignore'):
+            T_pos = np.where(T > 0, T, 0.0)
+            discounted_K = K * np.exp(-r * T_pos)
+            discounted_S = S * np.exp(-q * T_pos)
+            lower_bound = np.where(is_call, np.maximum(discounted_S - discounted_K, 0.0),
+                                   np.maximum(discounted_K - discounted_S, 0.0))
+            upper_bound = np.where(is_call, discounted_S, discounted_K)
+            valid = ((T > 0) & (market_price > 0) & (S > 0) & (K > 0)
+                     & (market_price > lower_bound) & (market_price < upper_bound))
+        
+        idx = np.flatnonzero(valid)
+        if idx.size == 0:
+            return sigma.reshape(shape)
+        
+        target = market_price[idx]
+        S_a, K_a, T_a, r_a, call_a, q_a = S[idx], K[idx], T[idx], r[idx], is_call[idx], q[idx]
+        
+        # Prices above what max_sigma can reach have no solution in the bracket
+        high_price = GreeksCalculator.black_scholes_batch(
+            S_a, K_a, T_a, r_a, max_sigma, call_a, q_a
+        )['price']
+        reachable = high_price >= target - tolerance
+        idx, target = idx[reachable], target[reachable]
+        S_a, K_a, T_a, r_a, call_a, q_a = (
+            a[reachable] for a in (S_a, K_a, T_a, r_a, call_a, q_a)
+        )
+        
+        call_price = np.where(call_a, target, target + discounted_S[idx] - discounted_K[idx])
+        guess = GreeksCalculator._initial_volatility_guess(
+            call_price, discounted_S[idx], discounted_K[idx], T_a
+        )
+        
+        low = np.full(idx.shape, min_sigma)
+        high = np.full(idx.shape, max_sigma)
+        vol = np.clip(guess, min_sigma, max_sigma)
+        active = np.arange(idx.size)
         
         for _ in range(max_iterations):
-            greeks = GreeksCalculator.black_scholes(S, K, T, r, sigma, option_type)
-            price = greeks['price']
-            vega = greeks['vega']
+            if active.size == 0:
+                break
+            
+            greeks = GreeksCalculator.black_scholes_batch(
+                S_a[active], K_a[active], T_a[active], r_a[active],
+                vol[active], call_a[active], q_a[active]
+            )
+            diff = greeks['price'] - target[active]
+            vega = greeks['vega'] * 100  # vega is per 1% change
             
-            if abs(price - market_price) < tolerance:
-                return sigma
+            converged = np.abs(diff) < tolerance
+            sigma[idx[active[converged]]] = vol[active[converged]]
             
-            if vega < 1e-10:  # Avoid division by zero
-                break
+            # Price is increasing in volatility, so the sign of diff tightens the bracket
+            too_high = diff > 0
+            high[active] = np.where(too_high, vol[active], high[active])
+            low[active] = np.where(too_high, low[active], vol[active])
             
-            sigma = sigma - (price - market_price) / (vega * 100)  # vega is per 1% change
+            with np.errstate(divide='ignore', over='ignore', invalid='ignore'):
+                newton = vol[active] - diff / vega
+            bisection = 0.5 * (low[active] + high[active])
+            use_newton = ((vega > 1e-10) & (newton > low[active])
+                          & (newton < high[active]))
+            vol[active] = np.where(use_newton, newton, bisection)
             
-            if sigma < 0:
-                sigma = 0.01
-            if sigma > 5:
-                sigma = 5
+            active = active[~converged]
         
-        return None
+        return sigma.reshape(shape)
     
     @staticmethod
     def calculate_greeks_for_option(
@@ -118,7 +327,8 @@ class GreeksCalculator:
         r: float = 0.05,  # Default risk-free rate (5%)
         sigma: Optional[float] = None,
         market_price: Optional[float] = None,
-        option_type: str = 'call'
+        option_type: str = 'call',
+        q: float = 0.0  # Continuous dividend yield
     ) -> Dict[str, Optional[float]]:
         """
         Calculate Greeks for an option
@@ -127,14 +337,14 @@ class GreeksCalculator:
         """
         if sigma is None and market_price is not None:
             sigma = GreeksCalculator.calculate_implied_volatility(
-                market_price, S, K, T, r, option_type
+                market_price, S, K, T, r, option_type, q=q
             )
         
         if sigma is None:
             # Use a default volatility if we can't calculate it
             sigma = 0.2
         
-        greeks = GreeksCalculator.black_scholes(S, K, T, r, sigma, option_type)
+        greeks = GreeksCalculator.black_scholes(S, K, T, r, sigma, option_type, q)
         
         return {
             'implied_volatility': sigma,
@@ -145,3 +355,153 @@ class GreeksCalculator:
             'rho': greeks['rho']
         }
 
+    
+    @staticmethod
+    def calculate_greeks_for_chain(
+        S: ArrayLike,
+        K: ArrayLike,
+        T: ArrayLike,
+        r: ArrayLike = 0.05,
+        sigma: Optional[ArrayLike] = None,
+        market_price: Optional[ArrayLike] = None,
+        is_call: Union[bool, np.ndarray] = True,
+        q: ArrayLike = 0.0
+    ) -> Dict[str, np.ndarray]:
+        """
+        Calculate Greeks for a whole chain in one vectorized pass
+        
+        Array counterpart of calculate_greeks_for_option. If sigma is not
+        provided, it is implied from market_price per contract; contracts
+        where that fails fall back to the same default volatility.
+        """
+        S, K, T, r, is_call, q = np.broadcast_arrays(
+            np.asarray(S, dtype=float),
+            np.asarray(K, dtype=float),
+            np.asarray(T, dtype=float),
+            np.asarray(r, dtype=float),
+            np.asarray(is_call, dtype=bool),
+            np.asarray(q, dtype=float)
+        )
+        
+        if sigma is None:
+            sigma = np.full(S.shape, np.nan)
+            if market_price is not None:
+                sigma = GreeksCalculator.calculate_implied_volatility_batch(
+                    market_price, S, K, T, r, is_call, q=q
+                )
+        else:
+            sigma = np.array(np.broadcast_to(np.asarray(sigma, dtype=float), S.shape))
+        
+        # Use a default volatility if we can't calculate it
+        sigma = np.where(np.isnan(sigma), 0.2, sigma)
+        
+        greeks = GreeksCalculator.black_scholes_batch(S, K, T, r, sigma, is_call, q)
+        
+        return {
+            'implied_volatility': sigma,
+            'delta': greeks['delta'],
+            'gamma': greeks['gamma'],
+            'theta': greeks['theta'],
+            'vega': greeks['vega'],
+            'rho': greeks['rho']
+        }
+    
+    @staticmethod
+    def get_mid_price(option: Dict) -> Optional[float]:
+        """Use mid price for calculations if available, else the last trade price"""
+        if option.get('bid_price') and option.get('ask_price'):
+            return (option['bid_price'] + option['ask_price']) / 2
+        if option.get('last_price'):
+            return option['last_price']
+        return None
+    
+    @staticmethod
+    def pricing_inputs(
+        chain: OptionChain,
+        r: ArrayLike = 0.05,
+        q: ArrayLike = 0.0
+    ) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """
+        Array inputs of calculate_greeks_for_chain for the priceable contracts of a chain
+        
+        Returns:
+            Tuple of (boolean mask of the contracts that can be priced, keyword
+            arguments for calculate_greeks_for_chain for those contracts)
+        """
+        S = chain.get('underlying_price')
+        K = chain.get('strike_price')
+        T = chain.get('time_to_maturity')
+        mid = chain.mid_price()
+        
+        # Only options with all inputs available can be priced
+        priceable = np.ones(len(chain), dtype=bool)
+        for values in (S, K, T, mid):
+            priceable &= ~np.isnan(values) & (values != 0)
+        
+        return priceable, {
+            'S': S[priceable],
+            'K': K[priceable],
+            'T': T[priceable],
+            'r': np.broadcast_to(np.asarray(r, dtype=float), (len(chain),))[priceable],
+            'market_price': mid[priceable],
+            'is_call': chain.is_call[priceable],
+            'q': np.broadcast_to(np.asarray(q, dtype=float), (len(chain),))[priceable],
+        }
+    
+    @staticmethod
+    def price_option_chain(
+        chain: OptionChain,
+        r: ArrayLike = 0.05,
+        q: ArrayLike = 0.0
+    ) -> OptionChain:
+        """
+        Calculate IV and Greeks for a whole chain in one vectorized call
+        
+        Args:
+            chain: Chain as returned by AlpacaOptionsClient
+            r: Risk-free rate, one for all contracts or one per contract
+            q: Dividend yield, one for all contracts or one per contract
+        
+        Returns:
+            The chain with implied_volatility, delta, gamma, theta, vega and
+            rho columns, NaN where the inputs needed for pricing are missing
+        """
+        priceable, inputs = GreeksCalculator.pricing_inputs(chain, r, q)
+        greeks = GreeksCalculator.calculate_greeks_for_chain(**inputs) if priceable.any() else {}
+        return chain.with_greeks(priceable, greeks)
+    
+    @staticmethod
+    def calculate_greeks_for_options(
+        options: List[Dict],
+        r: ArrayLike = 0.05,
+        q: ArrayLike = 0.0
+    ) -> List[Optional[Dict[str, float]]]:
+        """
+        Calculate IV and Greeks for a list of option dictionaries in one vectorized call
+        
+        List counterpart of price_option_chain.
+        
+        Args:
+            options: Option dictionaries
+            r: Risk-free rate, one for all options or one per option
+            q: Dividend yield, one for all options or one per option
+        
+        Returns:
+            List aligned with options holding a Greeks dictionary per option,
+            or None where the inputs needed for pricing are missing
+        """
+        results: List[Optional[Dict[str, float]]] = [None] * len(options)
+        if not options:
+            return results
+        
+        chain = OptionChain.from_records(options)
+        priceable, inputs = GreeksCalculator.pricing_inputs(chain, r, q)
+        if not priceable.any():
+            return results
+        
+        greeks = GreeksCalculator.calculate_greeks_for_chain(**inputs)
+        
+        for j, i in enumerate(np.flatnonzero(priceable)):
+            results[i] = {name: float(values[j]) for name, values in greeks.items()}
+        
+        return results
@@ -3,11 +3,30 @@ Script to backfill historical S&P 500 options data from Alpaca
 """
 import logging
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from backend.config import SYMBOL
+from typing import Iterator, Optional, Sequence, Tuple, Union
+import numpy as np
+from alpaca.data.timeframe import TimeFrame, TimeFrameUnit
+from backend.config import (
+    SYMBOL, WRITE_CHUNK_SIZE, ALPACA_REQUESTS_PER_MINUTE, BARS_CHUNK_SIZE,
+    BACKFILL_CHECKPOINT_PATH, SNAPSHOT_STORE_PATH, RATE_CURVE_PATH, RISK_FREE_RATE,
+    DIVIDEND_YIELD, ALPACA_CACHE_PATH, ALPACA_CACHE_MODE, ALPACA_CACHE_LIVE_TTL
+)
 from backend.alpaca_client import AlpacaOptionsClient
-from backend.database import get_supabase_client
+from backend.checkpoint import BackfillCheckpoint
+from backend.rate_limiter import TokenBucketRateLimiter
+from backend.response_cache import CACHE_MODES, open_response_cache
+from backend.database import (
+    get_supabase_client, upsert_in_chunks, select_option_ids, options_data_records,
+    create_chain_snapshots, options_natural_key, create_daily_partitions, OPTIONS_NATURAL_KEY,
+    GREEKS_NATURAL_KEY, IV_EVOLUTION_NATURAL_KEY, GREEKS_DATA_COLUMNS
+)
 from backend.greeks_calculator import GreeksCalculator
+from backend.option_chain import OptionChain
+from backend.rate_curve import RateCurve
+from backend.snapshot_store import open_snapshot_store
+from backend.underlying_history import UnderlyingHistory, timeframe_seconds
 import traceback
 
 logging.basicConfig(
@@ -16,12 +35,52 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Bar resolutions selectable with --timeframe
+BACKFILL_TIMEFRAMES = {
+    'day': TimeFrame.Day,
+    'hour': TimeFrame.Hour,
+    '5min': TimeFrame(5, TimeFrameUnit.Minute),
+    'minute': TimeFrame.Minute,
+}
+
 class HistoricalBackfill:
-    def __init__(self):
-        self.alpaca_client = AlpacaOptionsClient()
+    def __init__(
+        self,
+        chunk_size: int = WRITE_CHUNK_SIZE,
+        workers: int = 1,
+        requests_per_minute: int = ALPACA_REQUESTS_PER_MINUTE,
+        checkpoint_path: str = BACKFILL_CHECKPOINT_PATH,
+        resume: bool = False,
+        unit_size: int = BARS_CHUNK_SIZE,
+        cache_mode: str = ALPACA_CACHE_MODE,
+        timeframe: TimeFrame = TimeFrame.Day
+    ):
+        # One limiter shared by every worker thread
+        self.rate_limiter = TokenBucketRateLimiter(requests_per_minute)
+        # Contract lists and bars already fetched by a previous run (None if off)
+        self.response_cache = open_response_cache(ALPACA_CACHE_PATH, cache_mode, ALPACA_CACHE_LIVE_TTL)
+        self.alpaca_client = AlpacaOptionsClient(rate_limiter=self.rate_limiter, cache=self.response_cache)
         self.supabase = get_supabase_client()
         self.greeks_calc = GreeksCalculator()
-        self.risk_free_rate = 0.05
+        self.rate_curve = RateCurve(RATE_CURVE_PATH, RISK_FREE_RATE, DIVIDEND_YIELD)
+        self.chunk_size = chunk_size  # Rows per bulk write request
+        self.workers = max(1, workers)  # Dates processed concurrently
+        self.unit_size = unit_size  # Contracts per checkpointed unit
+        
+        # Bar resolution; intraday backfills store every bar of the session
+        # and checkpoint each contract chunk per time window
+        self.timeframe = timeframe
+        self.intraday = timeframe_seconds(timeframe) < timeframe_seconds(TimeFrame.Day)
+        
+        # Journal of completed (date, contract chunk) units
+        self.checkpoint = BackfillCheckpoint(checkpoint_path)
+        self.resume = resume
+        
+        # Local Parquet copy of every backfilled chain (None if disabled)
+        self.snapshot_store = open_snapshot_store(SNAPSHOT_STORE_PATH)
+        
+        # Underlying daily bars that price the option bars, fetched once per range
+        self.underlying_history: Optional[UnderlyingHistory] = None
         
         # Verify we're getting S&P 500 options
         if not self.alpaca_client.verify_sp500_options():
@@ -36,6 +95,9 @@ class HistoricalBackfill:
         """
         Backfill historical options data for a date range
         
+        With more than one worker, dates are processed concurrently; the shared
+        rate limiter keeps the combined request rate within the Alpaca plan.
+        
         Args:
             start_date: Start date for backfill
             end_date: End date for backfill
@@ -43,131 +105,281 @@ class HistoricalBackfill:
         """
         logger.info(f"Starting historical backfill from {start_date.date()} to {end_date.date()}")
         
-        current_date = start_date
-        total_stored = 0
+        if self.resume:
+            logger.info(f"Resuming from checkpoint {self.checkpoint.path}")
+        else:
+            self.checkpoint.reset()
         
+        # Backfilled rows keep their historical timestamps; give them partitions
+        try:
+            created = create_daily_partitions(self.supabase, start_date.date(), end_date.date())
+            logger.info(f"Created {created} daily partitions for the backfill range")
+        except Exception as e:
+            logger.warning(f"Could not create partitions, rows will go to the default partitions: {str(e)}")
+        
+        # One request for the spot of every day in the range (intraday
+        # backfills fetch each day's bars with the day)
+        if not self.intraday:
+            try:
+                self.underlying_history = self.alpaca_client.get_underlying_bars(start_date, end_date)
+            except Exception as e:
+                logger.warning(f"Could not fetch {SYMBOL} bars for the range, fetching them per date: {str(e)}")
+        
+        dates = []
+        current_date = start_date
         while current_date <= end_date:
+            dates.append(current_date)
+            current_date += timedelta(days=days_step)
+        
+        if self.workers > 1:
+            logger.info(f"Backfilling {len(dates)} dates with {self.workers} workers")
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                total_stored = sum(executor.map(self._backfill_date_safely, dates))
+        else:
+            total_stored = sum(self._backfill_date_safely(date) for date in dates)
+        
+        logger.info(f"Backfill complete! Total records stored: {total_stored}")
+        if self.response_cache is not None:
+            logger.info(
+                f"Response cache: {self.response_cache.hits} hits, {self.response_cache.misses} misses "
+                f"({self.response_cache.mode} mode)"
+            )
+    
+    def backfill_date(self, current_date: datetime) -> int:
+        """
+        Backfill historical options data for a single date
+        
+        The chain is processed in contract chunks (intraday: contract chunks
+        per time window); each unit is recorded in the checkpoint once all
+        of its writes succeeded, and units already recorded are skipped.
+        
+        Returns:
+            Number of new options_data rows stored
+        """
+        date_key = current_date.date().isoformat()
+        if self.intraday:
+            date_key += f"@{self.timeframe.value}"
+        if self.checkpoint.is_done(date_key):
+            logger.info(f"Skipping {current_date.date()} (already completed)")
+            return 0
+        
+        logger.info(f"Processing date: {current_date.date()}")
+        
+        contracts = self.alpaca_client.get_option_contracts()
+        if not contracts:
+            logger.warning(f"No data found for {current_date.date()}")
+            return 0
+        
+        # Sort so chunk boundaries are stable between runs
+        contracts = contracts.take(np.argsort(contracts['option_symbol'].astype(str), kind='stable'))
+        
+        try:
+            underlying = self.underlying_history_for(current_date)
+        except Exception as e:
+            logger.error(f"Error fetching {SYMBOL} bars for {current_date.date()}: {str(e)}")
+            logger.debug(traceback.format_exc())
+            return 0
+        
+        stored_count = 0
+        all_units_done = True
+        for unit, chunk, window in self.iter_units(current_date, contracts):
+            if self.checkpoint.is_done(date_key, unit):
+                continue
+            
             try:
-                logger.info(f"Processing date: {current_date.date()}")
-                
-                # Fetch historical options data for this date
-                options_data = self.alpaca_client.get_historical_options_for_date(current_date)
-                
-                if not options_data:
-                    logger.warning(f"No data found for {current_date.date()}")
-                    current_date += timedelta(days=days_step)
-                    continue
-                
-                # Store each option
-                stored_count = 0
-                for option in options_data:
-                    try:
-                        # Check if record already exists
-                        existing = self.supabase.table('options_data')\
-                            .select('id')\
-                            .eq('symbol', option['symbol'])\
-                            .eq('strike_price', option['strike_price'])\
-                            .eq('expiration_date', option['expiration_date'])\
-                            .eq('option_type', option['option_type'])\
-                            .gte('created_at', current_date.isoformat())\
-                            .lt('created_at', (current_date + timedelta(days=1)).isoformat())\
-                            .limit(1)\
-                            .execute()
-                        
-                        if existing.data and len(existing.data) > 0:
-                            logger.debug(f"Skipping duplicate: {option['option_symbol']}")
-                            continue
-                        
-                        # Prepare record
-                        option_record = {
-                            'symbol': option['symbol'],
-                            'option_type': option['option_type'],
-                            'strike_price': float(option['strike_price']) if option['strike_price'] else None,
-                            'expiration_date': option['expiration_date'],
-                            'bid_price': float(option['bid_price']) if option.get('bid_price') else None,
-                            'ask_price': float(option['ask_price']) if option.get('ask_price') else None,
-                            'last_price': float(option['last_price']) if option.get('last_price') else None,
-                            'underlying_price': float(option['underlying_price']) if option.get('underlying_price') else None,
-                            'time_to_maturity': float(option['time_to_maturity']) if option.get('time_to_maturity') else None,
-                            'implied_volatility': option.get('implied_volatility'),
-                            'created_at': option.get('timestamp', current_date.isoformat()),
-                        }
-                        
-                        # Insert into database
-                        result = self.supabase.table('options_data').insert(option_record).execute()
-                        
-                        if result.data:
-                            option_id = result.data[0]['id']
-                            stored_count += 1
-                            
-                            # Calculate and store Greeks if we have necessary data
-                            if (option.get('underlying_price') and option.get('strike_price') and 
-                                option.get('time_to_maturity') and option.get('last_price')):
-                                
-                                greeks = self.greeks_calc.calculate_greeks_for_option(
-                                    S=option['underlying_price'],
-                                    K=option['strike_price'],
-                                    T=option['time_to_maturity'],
-                                    r=self.risk_free_rate,
-                                    market_price=option['last_price'],
-                                    option_type=option['option_type']
-                                )
-                                
-                                if greeks['implied_volatility']:
-                                    option_record['implied_volatility'] = greeks['implied_volatility']
-                                
-                                greeks_record = {
-                                    'option_id': option_id,
-                                    'symbol': option['symbol'],
-                                    'strike_price': float(option['strike_price']),
-                                    'expiration_date': option['expiration_date'],
-                                    'option_type': option['option_type'],
-                                    'delta': greeks['delta'],
-                                    'gamma': greeks['gamma'],
-                                    'theta': greeks['theta'],
-                                    'vega': greeks['vega'],
-                                    'rho': greeks['rho'],
-                                    'created_at': option.get('timestamp', current_date.isoformat()),
-                                }
-                                
-                                self.supabase.table('greeks_data').insert(greeks_record).execute()
-                                
-                                # Store IV evolution
-                                if greeks['implied_volatility']:
-                                    iv_record = {
-                                        'symbol': option['symbol'],
-                                        'strike_price': float(option['strike_price']),
-                                        'expiration_date': option['expiration_date'],
-                                        'option_type': option['option_type'],
-                                        'implied_volatility': float(greeks['implied_volatility']),
-                                        'time_to_maturity': float(option['time_to_maturity']),
-                                        'recorded_at': option.get('timestamp', current_date.isoformat()),
-                                    }
-                                    
-                                    self.supabase.table('iv_evolution').insert(iv_record).execute()
-                    
-                    except Exception as e:
-                        logger.error(f"Error processing option {option.get('option_symbol', 'unknown')}: {str(e)}")
-                        logger.debug(traceback.format_exc())
-                        continue
-                
-                total_stored += stored_count
-                logger.info(f"Stored {stored_count} options for {current_date.date()}")
-                
-                # Move to next date
-                current_date += timedelta(days=days_step)
-                
-                # Rate limiting - wait a bit between requests
-                import time
-                time.sleep(1)
-                
+                unit_stored = self.backfill_unit(current_date, chunk, underlying, window)
             except Exception as e:
-                logger.error(f"Error processing date {current_date.date()}: {str(e)}")
+                all_units_done = False
+                logger.error(f"Error processing {unit} on {current_date.date()}: {str(e)}")
                 logger.debug(traceback.format_exc())
-                current_date += timedelta(days=days_step)
                 continue
+            
+            self.checkpoint.mark_done(date_key, unit, unit_stored)
+            stored_count += unit_stored
         
-        logger.info(f"Backfill complete! Total records stored: {total_stored}")
+        if all_units_done:
+            self.checkpoint.mark_done(date_key, stored=stored_count)
+        
+        logger.info(f"Stored {stored_count} options for {current_date.date()}")
+        return stored_count
+    
+    def iter_units(
+        self,
+        current_date: datetime,
+        contracts: OptionChain
+    ) -> Iterator[Tuple[str, OptionChain, Optional[Tuple[datetime, datetime]]]]:
+        """
+        Checkpointed units of one date, generated lazily
+        
+        Yields:
+            (unit name, contract chunk, time window or None for daily bars)
+        """
+        windows = self.alpaca_client.intraday_windows(current_date) if self.intraday else [None]
+        for start in range(0, len(contracts), self.unit_size):
+            chunk = contracts.take(slice(start, start + self.unit_size))
+            unit = f"{chunk['option_symbol'][0]}-{chunk['option_symbol'][-1]}"
+            for window in windows:
+                yield (f"{unit}@{window[0]:%H:%M}" if window else unit), chunk, window
+    
+    def backfill_unit(
+        self,
+        current_date: datetime,
+        contracts: OptionChain,
+        underlying: Optional[UnderlyingHistory] = None,
+        window: Optional[Tuple[datetime, datetime]] = None
+    ) -> int:
+        """
+        Fetch, price and store one chunk of contracts for one date
+        
+        Raises if any request or write failed, so the unit is not checkpointed.
+        
+        Args:
+            current_date: Trading day
+            contracts: Contract chunk
+            underlying: Underlying bars covering current_date
+            window: (start, end) of the intraday window to backfill; None for
+                the daily bar
+        
+        Returns:
+            Number of new options_data rows stored
+        """
+        if window is None:
+            chain = self.alpaca_client.get_historical_options_for_date(
+                current_date, contracts=contracts, raise_on_error=True, underlying=underlying
+            )
+        else:
+            chain = self.alpaca_client.get_historical_options_for_window(
+                contracts, *window, self.timeframe, raise_on_error=True, underlying=underlying
+            )
+        
+        if not chain:
+            return 0
+        
+        # Bar closes of calls and puts are not synchronous enough for
+        # put-call parity, so historical dividend yields come from the curve
+        rates, dividend_yields, _ = self.rate_curve.chain_inputs(chain, imply_forwards=False)
+        
+        # Price the whole chunk (every bar of the window) in one vectorized pass
+        chain = self.greeks_calc.price_option_chain(chain, r=rates, q=dividend_yields)
+        
+        # One snapshot per bar time, shared by every unit with bars at that
+        # time (registering it again returns the same id)
+        captured_ats = [timestamp or current_date.isoformat() for timestamp in chain['timestamp']]
+        snapshot_ids = create_chain_snapshots(self.supabase, SYMBOL, 'backfill', captured_ats)
+        
+        stored_count, failed_count = self.store_day(
+            chain, current_date, [snapshot_ids[captured_at] for captured_at in captured_ats]
+        )
+        if failed_count:
+            raise RuntimeError(f"{failed_count} rows failed to write")
+        
+        # Archive only once the unit is stored, so a retried unit is archived once
+        if self.snapshot_store is not None:
+            self.snapshot_store.write_chain(chain, current_date)
+        
+        return stored_count
+    
+    def underlying_history_for(self, current_date: datetime) -> UnderlyingHistory:
+        """Underlying bars covering current_date: the range's daily bars, else the date's own bars"""
+        if self.underlying_history is not None and self.underlying_history.covers(current_date.date()):
+            return self.underlying_history
+        return self.alpaca_client.get_underlying_bars(current_date, current_date, self.timeframe)
+    
+    def _backfill_date_safely(self, current_date: datetime) -> int:
+        """backfill_date that logs errors instead of aborting the whole range"""
+        try:
+            return self.backfill_date(current_date)
+        except Exception as e:
+            logger.error(f"Error processing date {current_date.date()}: {str(e)}")
+            logger.debug(traceback.format_exc())
+            return 0
+    
+    def store_day(
+        self,
+        chain: OptionChain,
+        current_date: datetime,
+        snapshot_id: Optional[Union[int, Sequence[int]]] = None
+    ) -> Tuple[int, int]:
+        """
+        Bulk write one day (or intraday window) of historical options data
+        
+        options_data rows are upserted on their natural key with duplicates
+        ignored. The ids of rows that already existed (a unit retried after
+        a failed Greeks or IV write) are read back with a SELECT, and Greeks
+        and IV evolution rows are upserted on their own natural keys,
+        so a retried unit fills in whatever is missing from all three tables
+        without duplicating anything.
+        
+        Args:
+            chain: Priced chain of the day, or of every bar of a window
+            current_date: Trading day (created_at of contracts without a bar timestamp)
+            snapshot_id: chain_snapshots id of the day, or one per row
+        
+        Returns:
+            Tuple of (new options_data rows stored, rows that failed to write)
+        """
+        option_records = options_data_records(chain, snapshot_id, default_created_at=current_date.isoformat())
+        
+        # Insert into database, skipping rows that already exist
+        inserted, _ = upsert_in_chunks(
+            self.supabase, 'options_data', option_records,
+            on_conflict=','.join(OPTIONS_NATURAL_KEY), chunk_size=self.chunk_size
+        )
+        option_keys = [options_natural_key(record) for record in option_records]
+        option_ids = {options_natural_key(row): row['id'] for row in inserted}
+        existing = [record for record, key in zip(option_records, option_keys) if key not in option_ids]
+        if existing:
+            # Duplicates are not returned by the upsert; read their ids back
+            found = select_option_ids(self.supabase, existing, chunk_size=self.chunk_size)
+            option_ids.update(found)
+            logger.debug(f"Found {len(found)} existing options for {current_date.date()}")
+        
+        # Rows without an id failed to insert or to be looked up
+        failed_count = sum(key not in option_ids for key in option_keys)
+        
+        greeks_records = []
+        iv_records = []
+        for option_record, key, greeks in zip(option_records, option_keys, chain.to_records(GREEKS_DATA_COLUMNS)):
+            option_id = option_ids.get(key)
+            
+            # Store Greeks if the option is stored and we had the data to calculate them
+            if option_id is None or greeks['delta'] is None:
+                continue
+            
+            greeks_records.append({
+                'option_id': option_id,
+                'symbol': option_record['symbol'],
+                'strike_price': option_record['strike_price'],
+                'expiration_date': option_record['expiration_date'],
+                'option_type': option_record['option_type'],
+                **greeks,
+                'created_at': option_record['created_at'],
+                'snapshot_id': option_record.get('snapshot_id'),
+            })
+            
+            # Store IV evolution
+            if option_record['implied_volatility']:
+                iv_records.append({
+                    'symbol': option_record['symbol'],
+                    'strike_price': option_record['strike_price'],
+                    'expiration_date': option_record['expiration_date'],
+                    'option_type': option_record['option_type'],
+                    'implied_volatility': option_record['implied_volatility'],
+                    'time_to_maturity': option_record['time_to_maturity'],
+                    'recorded_at': option_record['created_at'],
+                    'snapshot_id': option_record.get('snapshot_id'),
+                })
+        
+        for table, records, natural_key in (
+            ('greeks_data', greeks_records, GREEKS_NATURAL_KEY),
+            ('iv_evolution', iv_records, IV_EVOLUTION_NATURAL_KEY),
+        ):
+            _, table_failed = upsert_in_chunks(
+                self.supabase, table, records, on_conflict=','.join(natural_key), chunk_size=self.chunk_size
+            )
+            failed_count += table_failed
+        
+        return len(inserted), failed_count
 
 def main():
     """Main function to run historical backfill"""
@@ -192,6 +404,36 @@ def main():
         default=1,
         help='Days to step (1=daily, 7=weekly). Default: 1'
     )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Dates to process concurrently. Default: 1'
+    )
+    parser.add_argument(
+        '--rpm',
+        type=int,
+        default=ALPACA_REQUESTS_PER_MINUTE,
+        help=f'Alpaca requests per minute shared by all workers. Default: {ALPACA_REQUESTS_PER_MINUTE}'
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Skip dates and contract chunks completed by a previous run'
+    )
+    parser.add_argument(
+        '--cache-mode',
+        choices=CACHE_MODES,
+        default=ALPACA_CACHE_MODE,
+        help=f"Alpaca response cache: 'record' reuses and stores responses, 'replay' "
+             f"only serves cached ones (no API calls). Default: {ALPACA_CACHE_MODE}"
+    )
+    parser.add_argument(
+        '--timeframe',
+        choices=BACKFILL_TIMEFRAMES,
+        default='day',
+        help='Bar resolution; intraday timeframes store every bar of the session. Default: day'
+    )
     
     args = parser.parse_args()
     
@@ -213,7 +455,10 @@ def main():
         logger.info("Adjusting start date to 2024-02-01")
         start_date = max(start_date, datetime(2024, 2, 1))
     
-    backfill = HistoricalBackfill()
+    backfill = HistoricalBackfill(
+        workers=args.workers, requests_per_minute=args.rpm, resume=args.resume,
+        cache_mode=args.cache_mode, timeframe=BACKFILL_TIMEFRAMES[args.timeframe]
+    )
     backfill.backfill_date_range(start_date, end_date, days_step=args.step)
 
 if __name__ == "__main__":
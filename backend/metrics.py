@@ -0,0 +1,264 @@
+"""
+Per-stage timers and counters for collection cycles
+
+The process-wide registry `metrics` is filled in by the Alpaca client, the
+collector, the rate limiter and the database helpers. It renders in the
+Prometheus text format, which can be served on /metrics or written to a file
+after every cycle (e.g. for node_exporter's textfile collector). A single
+cycle can also be profiled on demand with CycleProfiler.
+"""
+import cProfile
+import logging
+import os
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, Optional, Tuple
+
+try:
+    import pyinstrument
+except ImportError:  # pragma: no cover - pyinstrument is optional
+    pyinstrument = None
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'options_collector'
+
+# Help text of the counters recorded across the backend
+COUNTER_HELP = {
+    'cycles': 'Collection cycles run',
+    'cycle_errors': 'Collection cycles that raised',
+    'contracts': 'Contracts collected',
+    'iv_failures': 'Repriced contracts with usable inputs whose implied volatility could not be solved',
+    'fetch_errors': 'Alpaca requests that failed after retries',
+    'write_errors': 'Write requests that failed',
+    'read_errors': 'Database read requests that failed',
+    'retries': 'Alpaca requests retried after a rate limit response',
+}
+
+class MetricsRegistry:
+    """
+    Thread-safe stage timers and labelled counters
+    
+    Every stage keeps its total time and number of runs, and cycle() records
+    the time each stage took during the latest cycle. Counters only go up.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stage_seconds: Dict[str, float] = {}
+        self.stage_runs: Dict[str, int] = {}
+        self.last_cycle: Dict[str, float] = {}
+        self.counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+    
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as one run of stage name (also when it raises)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+    
+    def observe(self, name: str, seconds: float):
+        """Record one run of a stage"""
+        with self._lock:
+            self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + seconds
+            self.stage_runs[name] = self.stage_runs.get(name, 0) + 1
+    
+    @contextmanager
+    def cycle(self) -> Iterator[None]:
+        """
+        Time the enclosed block as the 'cycle' stage
+        
+        Afterwards last_cycle holds the total time of every stage run during
+        the block, e.g. all write_options_data chunks together.
+        """
+        with self._lock:
+            before = dict(self.stage_seconds)
+        try:
+            with self.stage('cycle'):
+                yield
+        finally:
+            with self._lock:
+                self.last_cycle = {
+                    name: seconds - before.get(name, 0.0)
+                    for name, seconds in self.stage_seconds.items()
+                    if seconds != before.get(name, 0.0)
+                }
+    
+    def increment(self, name: str, value: float = 1, **labels: str):
+        """Add value to a counter, e.g. increment('write_errors', table='greeks_data')"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+    
+    def counter(self, name: str, **labels: str) -> float:
+        """Current value of a counter"""
+        with self._lock:
+            return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+    
+    def reset(self):
+        with self._lock:
+            self.stage_seconds.clear()
+            self.stage_runs.clear()
+            self.last_cycle = {}
+            self.counters.clear()
+    
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            stage_seconds = sorted(self.stage_seconds.items())
+            stage_runs = sorted(self.stage_runs.items())
+            last_cycle = sorted(self.last_cycle.items())
+            counters = sorted(self.counters.items())
+        
+        lines = []
+        
+        def family(name: str, kind: str, help_text: str, samples):
+            lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+            for labels, value in samples:
+                label_text = ','.join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{PREFIX}_{name}{{{label_text}}} {value:.9g}" if labels else f"{PREFIX}_{name} {value:.9g}")
+        
+        family('stage_seconds_total', 'counter', 'Time spent in each stage',
+               [((('stage', stage),), value) for stage, value in stage_seconds])
+        family('stage_runs_total', 'counter', 'Times each stage ran',
+               [((('stage', stage),), value) for stage, value in stage_runs])
+        family('last_cycle_stage_seconds', 'gauge', 'Time spent in each stage during the latest cycle',
+               [((('stage', stage),), value) for stage, value in last_cycle])
+        
+        by_name: Dict[str, list] = {}
+        for (name, labels), value in counters:
+            by_name.setdefault(name, []).append((labels, value))
+        for name, samples in by_name.items():
+            family(f"{name}_total", 'counter', COUNTER_HELP.get(name, name.replace('_', ' ')), samples)
+        
+        return '\n'.join(lines) + '\n'
+    
+    def write_file(self, path: str):
+        """Write render() to path atomically"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+# Registry shared by the whole process
+metrics = MetricsRegistry()
+
+def format_durations(durations: Dict[str, float]) -> str:
+    """Stage durations as 'stage=1.23s' pairs, slowest first"""
+    return ' '.join(
+        f"{stage}={seconds:.3f}s" for stage, seconds in sorted(durations.items(), key=lambda item: -item[1])
+    )
+
+def start_metrics_server(
+    port: int,
+    host: str = '0.0.0.0',
+    registry: MetricsRegistry = metrics
+) -> ThreadingHTTPServer:
+    """
+    Serve the registry on http://host:port/metrics from a daemon thread
+    
+    Returns:
+        The running server (call shutdown() to stop it)
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+    
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{server.server_port}/metrics")
+    return server
+
+class CycleProfiler:
+    """
+    Profiles the next collection cycle when asked
+    
+    Creating trigger_path (e.g. `touch .profile_next_cycle`) or sending the
+    process SIGUSR1 requests a profile. The next cycle then runs under
+    cProfile, or pyinstrument if chosen and installed, and the report is
+    written to output_dir.
+    """
+    
+    def __init__(self, output_dir: str, trigger_path: Optional[str] = None, profiler: str = 'cprofile'):
+        """
+        Args:
+            output_dir: Directory receiving the reports
+            trigger_path: File whose existence requests a profile (None = signal only)
+            profiler: 'cprofile' (.prof file, open with pstats or snakeviz) or
+                'pyinstrument' (.html report)
+        """
+        self.output_dir = output_dir
+        self.trigger_path = trigger_path
+        self.profiler = profiler
+        if profiler == 'pyinstrument' and pyinstrument is None:
+            logger.warning("pyinstrument is not installed; profiling with cProfile instead")
+            self.profiler = 'cprofile'
+        self._requested = threading.Event()
+    
+    def request(self):
+        """Profile the next cycle"""
+        self._requested.set()
+    
+    def install_signal_handler(self):
+        """Request a profile on SIGUSR1 (Unix, main thread only)"""
+        if hasattr(signal, 'SIGUSR1') and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.request())
+    
+    def _take_request(self) -> bool:
+        requested = self._requested.is_set()
+        self._requested.clear()
+        if self.trigger_path and os.path.exists(self.trigger_path):
+            requested = True
+            try:
+                os.remove(self.trigger_path)
+            except OSError:
+                pass
+        return requested
+    
+    @contextmanager
+    def profile_if_requested(self, label: str = 'cycle') -> Iterator[None]:
+        """Profile the enclosed block if a profile was requested since the last one"""
+        if not self._take_request():
+            yield
+            return
+        
+        os.makedirs(self.output_dir, exist_ok=True)
+        stem = os.path.join(self.output_dir, f"{label}-{datetime.now():%Y%m%dT%H%M%S}")
+        if self.profiler == 'pyinstrument':
+            profiler = pyinstrument.Profiler()
+            profiler.start()
+            try:
+                yield
+            finally:
+                profiler.stop()
+                path = f"{stem}.html"
+                with open(path, 'w') as f:
+                    f.write(profiler.output_html())
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                path = f"{stem}.prof"
+                profiler.dump_stats(path)
+        logger.info(f"Wrote {label} profile to {path}")
@@ -0,0 +1,240 @@
+"""
+Column-oriented option chain shared by the client, pricing and writers
+
+One OptionChain replaces the list of per-contract dictionaries that used to
+be rebuilt at every stage: each field is a single NumPy array, prices are
+float64 with NaN for missing values, and derived quantities (mid price,
+moneyness, time to maturity) are computed for the whole chain at once.
+"""
+from datetime import date, datetime, time, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+# Columns holding strings (None where missing); every other column is float64
+STRING_COLUMNS = ('symbol', 'option_symbol', 'option_type', 'expiration_date', 'timestamp')
+
+# Columns added by pricing (NaN where a contract could not be priced)
+GREEK_COLUMNS = ('implied_volatility', 'delta', 'gamma', 'theta', 'vega', 'rho')
+
+# Options expire at the 16:00 New York close of their expiration date
+MARKET_TIMEZONE = ZoneInfo('America/New_York')
+EXPIRY_TIME = time(16, 0)
+SECONDS_PER_YEAR = 365 * 24 * 3600
+
+def market_close(day: date) -> datetime:
+    """16:00 New York time on day (timezone-aware)"""
+    return datetime.combine(day, EXPIRY_TIME, tzinfo=MARKET_TIMEZONE)
+
+def timestamps_to_seconds(values: Iterable) -> np.ndarray:
+    """
+    Unix seconds of ISO timestamps (or datetimes), NaN where missing
+    
+    Each distinct value is parsed once; naive values are taken as UTC.
+    """
+    keys = np.array([value.isoformat() if isinstance(value, datetime) else (value or '') for value in values], dtype=object)
+    if not len(keys):
+        return np.empty(0)
+    distinct, inverse = np.unique(keys.astype(str), return_inverse=True)
+    seconds = np.empty(len(distinct))
+    for i, value in enumerate(distinct):
+        if not value:
+            seconds[i] = np.nan
+            continue
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        seconds[i] = parsed.timestamp()
+    return seconds[inverse.reshape(-1)]
+
+class OptionChain:
+    """
+    Option chain stored column-wise in NumPy arrays
+    
+    chain['strike_price'] returns the stored array itself, not a copy.
+    take() with a slice and with_columns() share the unchanged columns with
+    the original chain, so narrowing or extending a chain does not copy it.
+    """
+    
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        """
+        Args:
+            columns: Column name -> array; all arrays must have the same length
+        """
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"chain columns differ in length: {sorted(lengths)}")
+        self.columns = columns
+        self._size = lengths.pop() if lengths else 0
+    
+    @staticmethod
+    def column_array(name: str, values: Iterable) -> np.ndarray:
+        """Array of the right type for a column (object for strings, float64 otherwise)"""
+        values = list(values)
+        if name not in STRING_COLUMNS:
+            try:
+                # None becomes NaN
+                return np.array(values, dtype=float)
+            except (TypeError, ValueError):
+                pass
+        array = np.empty(len(values), dtype=object)
+        array[:] = values
+        return array
+    
+    @classmethod
+    def from_records(
+        cls,
+        records: Sequence[Dict],
+        greeks: Optional[Sequence[Optional[Dict]]] = None
+    ) -> 'OptionChain':
+        """
+        Build a chain from option dictionaries
+        
+        Args:
+            records: Option dictionaries; the first record defines the columns
+            greeks: Optional Greeks dictionaries aligned with records (None where unpriced)
+        
+        Returns:
+            OptionChain with one column per field
+        """
+        names = list(records[0]) if records else []
+        columns = {name: cls.column_array(name, (record.get(name) for record in records)) for name in names}
+        if greeks is not None:
+            for name in GREEK_COLUMNS:
+                priced = cls.column_array(name, ((g or {}).get(name) for g in greeks))
+                if name in columns:
+                    # Keep a provided value where the contract was not priced
+                    priced = np.where(np.isnan(priced), columns[name], priced)
+                columns[name] = priced
+        return cls(columns)
+    
+    @classmethod
+    def concat(cls, chains: Sequence['OptionChain']) -> 'OptionChain':
+        """Stack chains with the same columns"""
+        chains = [chain for chain in chains if len(chain)]
+        if not chains:
+            return cls({})
+        return cls({
+            name: np.concatenate([chain.columns[name] for chain in chains])
+            for name in chains[0].columns
+        })
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    def __contains__(self, name: str) -> bool:
+        return name in self.columns
+    
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+    
+    def __repr__(self) -> str:
+        return f"OptionChain({self._size} contracts, columns={list(self.columns)})"
+    
+    def get(self, name: str) -> np.ndarray:
+        """A column, or an all-missing column if the chain does not have it"""
+        if name in self.columns:
+            return self.columns[name]
+        return self.column_array(name, [None] * self._size)
+    
+    def take(self, index: Union[slice, np.ndarray, Sequence[int]]) -> 'OptionChain':
+        """Subset of contracts by slice (views), boolean mask or positions"""
+        if not isinstance(index, slice):
+            index = np.asarray(index)
+        return OptionChain({name: values[index] for name, values in self.columns.items()})
+    
+    def with_columns(self, **columns: np.ndarray) -> 'OptionChain':
+        """New chain sharing this chain's arrays, with columns added or replaced"""
+        return OptionChain({**self.columns, **columns})
+    
+    def with_greeks(self, priced: np.ndarray, greeks: Dict[str, np.ndarray]) -> 'OptionChain':
+        """
+        New chain with Greek columns set from the results of pricing a subset
+        
+        Args:
+            priced: Boolean mask of the contracts that were priced
+            greeks: Arrays for the priced contracts, keyed by GREEK_COLUMNS names
+        
+        Returns:
+            Chain with every GREEK_COLUMNS column, NaN where not priced. A
+            provided implied_volatility is kept for contracts that were not priced.
+        """
+        columns = {}
+        for name in GREEK_COLUMNS:
+            values = np.full(self._size, np.nan)
+            if name in greeks:
+                values[priced] = greeks[name]
+            columns[name] = values
+        if 'implied_volatility' in self.columns:
+            columns['implied_volatility'] = np.where(
+                priced, columns['implied_volatility'], self.columns['implied_volatility']
+            )
+        return self.with_columns(**columns)
+    
+    def to_records(self, names: Optional[Sequence[str]] = None) -> List[Dict]:
+        """
+        Option dictionaries with plain Python values (None for missing)
+        
+        Args:
+            names: Columns to include (default: all)
+        """
+        names = list(names or self.columns)
+        values = []
+        for name in names:
+            column = self.get(name)
+            if column.dtype != object:
+                column = np.where(np.isnan(column), None, column)
+            values.append(column.tolist())
+        return [dict(zip(names, row)) for row in zip(*values)]
+    
+    @property
+    def is_call(self) -> np.ndarray:
+        return self.get('option_type') == 'call'
+    
+    def expiration_keys(self) -> np.ndarray:
+        """Expiration dates as YYYY-MM-DD strings"""
+        return np.array([str(e)[:10] if e else '' for e in self.get('expiration_date')])
+    
+    def mid_price(self) -> np.ndarray:
+        """
+        Mid of a two-sided quote, else the last trade price, else NaN
+        
+        Vectorized GreeksCalculator.get_mid_price.
+        """
+        bid, ask, last = self.get('bid_price'), self.get('ask_price'), self.get('last_price')
+        with np.errstate(invalid='ignore'):
+            two_sided = (bid > 0) & (ask > 0)
+            fallback = np.where(last > 0, last, np.nan)
+        return np.where(two_sided, (bid + ask) / 2, fallback)
+    
+    def moneyness(self, forward: Optional[np.ndarray] = None) -> np.ndarray:
+        """Strike over the forward (default: over spot)"""
+        reference = self.get('underlying_price') if forward is None else forward
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.get('strike_price') / reference
+    
+    def log_moneyness(self, forward: Optional[np.ndarray] = None) -> np.ndarray:
+        """ln(K / F), against spot when no forward is given"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.log(self.moneyness(forward))
+    
+    @staticmethod
+    def years_to_expiration(expiration_dates: Iterable, as_of: Union[datetime, np.ndarray]) -> np.ndarray:
+        """
+        Time from as_of to the 16:00 ET expiry of each expiration date, in years
+        
+        Fractional 365-day years, 0 once expired, NaN where the date is
+        missing. as_of is one time for all dates (a naive one is taken as
+        local time) or Unix seconds per date, e.g. the times of intraday bars.
+        """
+        keys = np.array([str(e)[:10] if e else '' for e in expiration_dates])
+        dates, inverse = np.unique(keys, return_inverse=True)
+        expiry = np.array([market_close(date.fromisoformat(d)).timestamp() if d else np.nan for d in dates])
+        as_of_seconds = as_of.timestamp() if isinstance(as_of, datetime) else as_of
+        seconds = expiry[inverse.reshape(-1)] - as_of_seconds
+        return np.maximum(seconds, 0.0) / SECONDS_PER_YEAR
+    
+    def time_to_maturity(self, as_of: Union[datetime, np.ndarray]) -> np.ndarray:
+        """Time to maturity of every contract at as_of (a time, or Unix seconds per contract), in years"""
+        return self.years_to_expiration(self.get('expiration_date'), as_of)
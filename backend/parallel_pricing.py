@@ -0,0 +1,137 @@
+"""
+Price large option chains across a process pool, sharded by expiration
+
+The vectorized solver in GreeksCalculator runs on one core. For a full
+chain the parent splits the contracts into one shard per worker, keeping
+each expiration within a single shard and balancing shards by contract
+count. Workers receive and return plain NumPy arrays, so only compact
+buffers cross the process boundary.
+"""
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+
+from backend.greeks_calculator import ArrayLike, GreeksCalculator
+from backend.option_chain import GREEK_COLUMNS, OptionChain
+
+logger = logging.getLogger(__name__)
+
+def price_shard(
+    S: np.ndarray,
+    K: np.ndarray,
+    T: np.ndarray,
+    r: np.ndarray,
+    market_price: np.ndarray,
+    is_call: np.ndarray,
+    q: np.ndarray
+) -> np.ndarray:
+    """
+    Solve IV and Greeks for one shard (runs in a worker process)
+    
+    Returns:
+        Array of shape (len(GREEK_COLUMNS), len(S))
+    """
+    chain = GreeksCalculator.calculate_greeks_for_chain(
+        S, K, T, r, market_price=market_price, is_call=is_call, q=q
+    )
+    return np.vstack([chain[name] for name in GREEK_COLUMNS])
+
+class ParallelChainPricer:
+    """
+    Drop-in replacement for GreeksCalculator.price_option_chain that fans
+    large chains out to a persistent process pool
+    """
+    
+    def __init__(self, workers: int, min_contracts: int = 2000):
+        """
+        Args:
+            workers: Worker processes (1 prices in-process)
+            min_contracts: Chains smaller than this are priced in-process,
+                where pool overhead would outweigh the parallelism
+        """
+        self.workers = max(1, workers)
+        self.min_contracts = min_contracts
+        self._executor: Optional[ProcessPoolExecutor] = None
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Started on first use and kept for later cycles
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+    
+    @staticmethod
+    def shard_by_expiration(expirations: np.ndarray, shards: int) -> List[np.ndarray]:
+        """
+        Split contract indices into at most shards groups without splitting an expiration
+        
+        Expirations are assigned largest first to the currently smallest
+        shard, which keeps shard sizes close even though expirations differ
+        widely in strike count.
+        
+        Returns:
+            List of index arrays, one per non-empty shard
+        """
+        _, codes, counts = np.unique(expirations, return_inverse=True, return_counts=True)
+        loads = np.zeros(shards, dtype=int)
+        assignment = np.empty(len(counts), dtype=int)
+        for j in np.argsort(-counts, kind='stable'):
+            shard = int(np.argmin(loads))
+            assignment[j] = shard
+            loads[shard] += counts[j]
+        
+        shard_of = assignment[codes]
+        return [np.flatnonzero(shard_of == shard) for shard in range(shards) if loads[shard]]
+    
+    def price_arrays(self, expirations: np.ndarray, **inputs: np.ndarray) -> np.ndarray:
+        """
+        Price a chain given as arrays
+        
+        Args:
+            expirations: Expiration of every contract, used for sharding
+            **inputs: S, K, T, r, market_price, is_call and q arrays, as for
+                GreeksCalculator.calculate_greeks_for_chain
+        
+        Returns:
+            Array of shape (len(GREEK_COLUMNS), number of contracts)
+        """
+        size = len(expirations)
+        if self.workers == 1 or size < self.min_contracts:
+            return price_shard(**inputs)
+        
+        shards = self.shard_by_expiration(expirations, self.workers)
+        executor = self._get_executor()
+        futures = [
+            (index, executor.submit(price_shard, **{name: values[index] for name, values in inputs.items()}))
+            for index in shards
+        ]
+        
+        result = np.empty((len(GREEK_COLUMNS), size))
+        for index, future in futures:
+            result[:, index] = future.result()
+        return result
+    
+    def price_chain(
+        self,
+        chain: OptionChain,
+        r: ArrayLike = 0.05,
+        q: ArrayLike = 0.0
+    ) -> OptionChain:
+        """
+        Calculate IV and Greeks for a chain
+        
+        Same inputs and output as GreeksCalculator.price_option_chain.
+        """
+        priceable, inputs = GreeksCalculator.pricing_inputs(chain, r, q)
+        if not priceable.any():
+            return chain.with_greeks(priceable, {})
+        
+        priced = self.price_arrays(chain.expiration_keys()[priceable], **inputs)
+        return chain.with_greeks(priceable, dict(zip(GREEK_COLUMNS, priced)))
+    
+    def close(self):
+        """Shut the worker processes down"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
@@ -0,0 +1,143 @@
+"""
+Per-contract cache of pricing inputs and results for incremental recompute
+"""
+import json
+import logging
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.greeks_calculator import ArrayLike, GreeksCalculator
+from backend.option_chain import GREEK_COLUMNS, OptionChain
+
+logger = logging.getLogger(__name__)
+
+class PricingCache:
+    """
+    Remembers the (mid, spot, T bucket, r, q) fingerprint and resulting Greeks
+    of every contract from the previous cycle
+    
+    Contracts whose fingerprint did not change reuse their cached Greeks, so
+    illiquid strikes and off-hours cycles skip IV solving entirely. The cache
+    is persisted as JSON so restarts keep it.
+    """
+    
+    def __init__(
+        self,
+        path: Optional[str],
+        t_bucket_hours: float = 1.0,
+        pricer: Optional[Callable] = None
+    ):
+        """
+        Args:
+            path: JSON file to persist the cache to, or None to keep it in memory only
+            t_bucket_hours: Time to maturity is bucketed to this many hours
+                before being fingerprinted
+            pricer: Function pricing the changed contracts, with the signature of
+                GreeksCalculator.price_option_chain (the default)
+        """
+        self.path = path
+        self.t_bucket_years = t_bucket_hours / (24 * 365)
+        self.pricer = pricer or GreeksCalculator.price_option_chain
+        self.entries: Dict[str, Dict] = {}
+        self.load()
+    
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)
+            logger.info(f"Loaded pricing cache for {len(self.entries)} contracts")
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable pricing cache {self.path}: {str(e)}")
+            self.entries = {}
+    
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+    
+    def fingerprints(self, chain: OptionChain, r: np.ndarray, q: np.ndarray) -> List[List]:
+        """Rounded pricing inputs of every contract; equal fingerprints price identically"""
+        def nullable(values: np.ndarray) -> List:
+            return np.where(np.isnan(values) | (values == 0), None, values).tolist()
+        
+        T = chain.get('time_to_maturity')
+        with np.errstate(invalid='ignore'):
+            buckets = np.floor_divide(T, self.t_bucket_years)
+        return [
+            list(fingerprint) for fingerprint in zip(
+                nullable(np.round(chain.mid_price(), 4)),
+                nullable(np.round(chain.get('underlying_price'), 4)),
+                [None if b is None else int(b) for b in nullable(np.where(T == 0, np.nan, buckets))],
+                np.round(r, 6).tolist(),
+                np.round(q, 6).tolist(),
+            )
+        ]
+    
+    def price_chain(
+        self,
+        chain: OptionChain,
+        r: ArrayLike,
+        q: ArrayLike = 0.0
+    ) -> Tuple[OptionChain, np.ndarray]:
+        """
+        Calculate IV and Greeks for a chain, repricing only contracts whose inputs changed
+        
+        Args:
+            chain: Chain as returned by AlpacaOptionsClient
+            r: Risk-free rate, one for all contracts or one per contract
+            q: Dividend yield, one for all contracts or one per contract
+        
+        Returns:
+            Tuple of (the chain with Greek columns as from
+            GreeksCalculator.price_option_chain, boolean mask of the
+            contracts that changed since the previous cycle)
+        """
+        size = len(chain)
+        r = np.broadcast_to(np.asarray(r, dtype=float), (size,))
+        q = np.broadcast_to(np.asarray(q, dtype=float), (size,))
+        symbols = chain.get('option_symbol').tolist()
+        fingerprints = self.fingerprints(chain, r, q)
+        
+        greeks = {name: np.full(size, np.nan) for name in GREEK_COLUMNS}
+        changed = np.ones(size, dtype=bool)
+        for i, (symbol, fingerprint) in enumerate(zip(symbols, fingerprints)):
+            cached = self.entries.get(symbol)
+            if cached and cached['fingerprint'] == fingerprint:
+                changed[i] = False
+                for name, value in (cached['greeks'] or {}).items():
+                    greeks[name][i] = np.nan if value is None else value
+        
+        stale = np.flatnonzero(changed)
+        if stale.size:
+            priced = self.pricer(chain.take(stale), r=r[stale], q=q[stale])
+            for name in GREEK_COLUMNS:
+                greeks[name][stale] = priced[name]
+        
+        if 'implied_volatility' in chain:
+            greeks['implied_volatility'] = np.where(
+                np.isnan(greeks['implied_volatility']), chain['implied_volatility'], greeks['implied_volatility']
+            )
+        priced_chain = chain.with_columns(**greeks)
+        
+        # Only keep contracts still in the chain
+        columns = [np.where(np.isnan(greeks[name]), None, greeks[name]).tolist() for name in GREEK_COLUMNS]
+        self.entries = {
+            symbol: {
+                'fingerprint': fingerprint,
+                'greeks': dict(zip(GREEK_COLUMNS, values)) if is_priced else None,
+            }
+            for symbol, fingerprint, values, is_priced in zip(
+                symbols, fingerprints, zip(*columns), (~np.isnan(greeks['delta'])).tolist()
+            )
+            if symbol
+        }
+        
+        logger.info(f"Repriced {stale.size} of {size} contracts ({size - stale.size} unchanged)")
+        return priced_chain, changed
@@ -0,0 +1,217 @@
+"""
+Risk-free rate and dividend yield term structures for option pricing
+
+Rates come from a local CSV curve (see RateCurve), interpolated per
+maturity. Each expiration's dividend yield can instead be implied from
+put-call parity, which also absorbs borrow costs and discrete dividends
+the curve does not know about.
+"""
+import csv
+import logging
+import os
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from backend.option_chain import OptionChain
+
+logger = logging.getLogger(__name__)
+
+class RateCurve:
+    """
+    Continuously compounded zero rates and dividend yields by maturity
+    
+    The CSV has a header and one row per tenor:
+    
+        maturity_years,risk_free_rate,dividend_yield
+        0.0833,0.0431,0.0125
+        1.0,0.0402,0.0128
+    
+    dividend_yield may be left empty. Rates are interpolated linearly in
+    maturity and held flat beyond the first and last tenor. The parsed curve
+    is cached and only re-read when the file changes; without a file, the
+    flat default rate and yield are used.
+    """
+    
+    # Implied yields outside this range mean the parity pairs were not usable
+    MAX_IMPLIED_YIELD = 0.25
+    
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        default_rate: float = 0.05,
+        default_dividend_yield: float = 0.0,
+        yield_tolerance: float = 0.0005
+    ):
+        """
+        Args:
+            path: CSV curve file, or None for a flat curve
+            default_rate: Risk-free rate used when there is no curve
+            default_dividend_yield: Dividend yield used where the curve has none
+            yield_tolerance: An implied dividend yield is only updated once it
+                moves by more than this, so quote noise does not change every
+                contract's pricing inputs (and defeat the pricing cache)
+        """
+        self.path = path
+        self.default_rate = default_rate
+        self.default_dividend_yield = default_dividend_yield
+        self.yield_tolerance = yield_tolerance
+        self.maturities = np.array([1.0])
+        self.rates = np.array([default_rate])
+        self.dividend_yields = np.array([default_dividend_yield])
+        self._mtime: Optional[float] = None
+        # Last yield implied from put-call parity per expiration
+        self.implied_yields: Dict[str, float] = {}
+        self.refresh()
+    
+    def refresh(self):
+        """Re-read the curve file if it changed since it was last loaded"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        mtime = os.path.getmtime(self.path)
+        if mtime == self._mtime:
+            return
+        
+        try:
+            with open(self.path, newline='') as f:
+                rows = sorted(
+                    (float(row['maturity_years']), float(row['risk_free_rate']),
+                     float(row['dividend_yield']) if row.get('dividend_yield') else self.default_dividend_yield)
+                    for row in csv.DictReader(f)
+                )
+            if not rows:
+                raise ValueError("no tenors")
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable rate curve {self.path}: {str(e)}")
+            return
+        
+        self.maturities, self.rates, self.dividend_yields = (np.array(column) for column in zip(*rows))
+        self._mtime = mtime
+        logger.info(f"Loaded rate curve with {len(rows)} tenors from {self.path}")
+    
+    def risk_free_rate(self, T) -> np.ndarray:
+        """Zero rate for maturities T (years)"""
+        return np.interp(T, self.maturities, self.rates)
+    
+    def dividend_yield(self, T) -> np.ndarray:
+        """Curve dividend yield for maturities T (years)"""
+        return np.interp(T, self.maturities, self.dividend_yields)
+    
+    def implied_forwards(self, chain: OptionChain, max_pairs: int = 5) -> Dict[str, float]:
+        """
+        Forward per expiration implied from put-call parity
+        
+        Calls and puts at the same strike are paired and each pair gives
+        F = K + exp(r * T) * (C - P). The median over the max_pairs pairs
+        closest to the money (smallest |C - P|) is taken, since those have
+        the tightest and most synchronous quotes.
+        
+        Returns:
+            Dictionary of expiration date (YYYY-MM-DD) to forward price
+        """
+        mids = chain.mid_price()
+        strikes = chain.get('strike_price')
+        T = chain.get('time_to_maturity')
+        expirations = chain.expiration_keys()
+        with np.errstate(invalid='ignore'):
+            usable = (mids > 0) & (strikes > 0) & (T > 0) & (expirations != '')
+        if not usable.any():
+            return {}
+        
+        labels, codes = np.unique(expirations[usable], return_inverse=True)
+        strikes, is_call, T, mids = strikes[usable], chain.is_call[usable], T[usable], mids[usable]
+        
+        # Sort so that a put is directly followed by the call at the same strike
+        order = np.lexsort((is_call, strikes, codes))
+        codes, strikes, is_call, T, mids = (a[order] for a in (codes, strikes, is_call, T, mids))
+        paired = ((codes[:-1] == codes[1:]) & (strikes[:-1] == strikes[1:])
+                  & ~is_call[:-1] & is_call[1:])
+        put_idx = np.flatnonzero(paired)
+        if put_idx.size == 0:
+            return {}
+        call_idx = put_idx + 1
+        
+        pair_codes = codes[put_idx]
+        pair_T = 0.5 * (T[put_idx] + T[call_idx])
+        spread = mids[call_idx] - mids[put_idx]
+        pair_forwards = strikes[put_idx] + np.exp(self.risk_free_rate(pair_T) * pair_T) * spread
+        
+        # Rank pairs within each expiration by distance to the money
+        order = np.lexsort((np.abs(spread), pair_codes))
+        pair_codes, pair_forwards = pair_codes[order], pair_forwards[order]
+        starts = np.searchsorted(pair_codes, pair_codes, side='left')
+        near = (np.arange(pair_codes.size) - starts) < max_pairs
+        pair_codes, pair_forwards = pair_codes[near], pair_forwards[near]
+        
+        bounds = np.flatnonzero(np.diff(pair_codes)) + 1
+        return {
+            str(labels[group[0]]): float(np.median(values))
+            for group, values in zip(np.split(pair_codes, bounds), np.split(pair_forwards, bounds))
+        }
+    
+    def chain_inputs(
+        self,
+        chain: OptionChain,
+        imply_forwards: bool = True
+    ) -> Tuple[np.ndarray, np.ndarray, Dict[str, float]]:
+        """
+        Per-contract rate and dividend yield, plus a forward per expiration
+        
+        With imply_forwards, each expiration's dividend yield is implied from
+        put-call parity (q = r - ln(F / S) / T). Expirations without usable
+        pairs in this chain reuse the last yield implied for them, and fall
+        back to the curve's dividend yield otherwise.
+        
+        Args:
+            chain: Chain as returned by AlpacaOptionsClient
+            imply_forwards: Whether to imply dividend yields from parity
+        
+        Returns:
+            Tuple of (rates aligned with the chain, dividend yields aligned
+            with the chain, dictionary of expiration date to forward price)
+        """
+        self.refresh()
+        
+        T = np.nan_to_num(chain.get('time_to_maturity'), nan=0.0)
+        S = np.where(chain.get('underlying_price') > 0, chain.get('underlying_price'), np.nan)
+        expirations = chain.expiration_keys()
+        r = self.risk_free_rate(T)
+        q = self.dividend_yield(T)
+        if not len(chain):
+            return r, q, {}
+        
+        # Spot and maturity of every expiration
+        labels, codes = np.unique(expirations, return_inverse=True)
+        spot: Dict[str, float] = {}
+        maturity: Dict[str, float] = {}
+        for j, expiration in enumerate(labels):
+            members = (codes == j) & (T > 0) & ~np.isnan(S)
+            if members.any():
+                spot[expiration] = float(np.median(S[members]))
+                maturity[expiration] = float(np.median(T[members]))
+        
+        if imply_forwards:
+            for expiration, forward in self.implied_forwards(chain).items():
+                if expiration not in spot:
+                    continue
+                T_exp = maturity[expiration]
+                implied = float(self.risk_free_rate(T_exp)) - np.log(forward / spot[expiration]) / T_exp
+                if not np.isfinite(implied) or abs(implied) > self.MAX_IMPLIED_YIELD:
+                    continue
+                previous = self.implied_yields.get(expiration)
+                if previous is None or abs(implied - previous) > self.yield_tolerance:
+                    self.implied_yields[expiration] = float(implied)
+            # Expirations that rolled off the chain no longer need a yield
+            self.implied_yields = {e: y for e, y in self.implied_yields.items() if e in maturity}
+            for j, expiration in enumerate(labels):
+                if expiration in self.implied_yields:
+                    q[codes == j] = self.implied_yields[expiration]
+        
+        forwards = {
+            str(expiration): spot[expiration] * float(np.exp(
+                (self.risk_free_rate(maturity[expiration]) - np.median(q[codes == j])) * maturity[expiration]
+            ))
+            for j, expiration in enumerate(labels) if expiration in spot
+        }
+        
+        return r, q, forwards
@@ -0,0 +1,140 @@
+"""
+Shared rate limiting for Alpaca API calls
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+from backend.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+class TokenBucketRateLimiter:
+    """
+    Thread-safe token bucket sized to a requests-per-minute budget
+    
+    Tokens refill continuously at requests_per_minute / 60 per second, up to
+    a burst of `burst` tokens. Every API call takes one token, blocking
+    until one is available.
+    """
+    
+    def __init__(self, requests_per_minute: int, burst: Optional[int] = None):
+        if requests_per_minute <= 0:
+            raise ValueError("requests_per_minute must be positive")
+        
+        self.rate = requests_per_minute / 60.0  # tokens per second
+        self.capacity = float(burst if burst is not None else max(1, requests_per_minute // 10))
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+    
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+    
+    async def acquire_async(self):
+        """acquire() for coroutines: waits without blocking the event loop"""
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            await asyncio.sleep(wait)
+    
+    def charge(self, tokens: float):
+        """
+        Take tokens without waiting, e.g. for pages an SDK call fetched on
+        its own after its first request
+        
+        The bucket can go negative, so the next callers wait for the debt.
+        """
+        if tokens <= 0:
+            return
+        with self.lock:
+            self._refill()
+            self.tokens -= tokens
+    
+    def drain(self):
+        """Empty the bucket so every caller waits, e.g. after the server said 429"""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens, 0.0)
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """True if an exception from the Alpaca SDK is an HTTP 429"""
+    status_code = getattr(error, 'status_code', None)
+    if status_code is None:
+        response = getattr(error, 'response', None)
+        status_code = getattr(response, 'status_code', None)
+    return status_code == 429 or 'too many requests' in str(error).lower()
+
+def call_with_rate_limit(
+    limiter: Optional[TokenBucketRateLimiter],
+    func: Callable[..., T],
+    *args,
+    max_retries: int = 5,
+    base_delay: float = 1.0,
+    **kwargs
+) -> T:
+    """
+    Call func after taking a token from limiter, backing off exponentially on 429s
+    
+    One token covers one HTTP request. SDK calls that follow pagination
+    internally send more; callers charge those pages with limiter.charge().
+    Any other exception, or a 429 after max_retries attempts, is re-raised.
+    """
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if attempt == max_retries or not is_rate_limit_error(e):
+                raise
+            delay = base_delay * (2 ** attempt)
+            metrics.increment('retries')
+            logger.warning(f"Rate limited by Alpaca, retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+            if limiter is not None:
+                limiter.drain()
+            time.sleep(delay)
+
+async def call_with_rate_limit_async(
+    limiter: Optional[TokenBucketRateLimiter],
+    func: Callable[..., Awaitable[T]],
+    *args,
+    max_retries: int = 5,
+    base_delay: float = 1.0,
+    **kwargs
+) -> T:
+    """call_with_rate_limit for coroutine functions"""
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            await limiter.acquire_async()
+        try:
+            return await func(*args, **kwargs)
+        except Exception as e:
+            if attempt == max_retries or not is_rate_limit_error(e):
+                raise
+            delay = base_delay * (2 ** attempt)
+            metrics.increment('retries')
+            logger.warning(f"Rate limited by Alpaca, retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+            if limiter is not None:
+                limiter.drain()
+            await asyncio.sleep(delay)
@@ -0,0 +1,174 @@
+"""
+Local record/replay cache for Alpaca responses
+
+Backfills request the same contract lists and historical bars again after a
+crash, on a re-run with another --step, or from tests. Responses are kept in
+a SQLite file keyed by a hash of the request, so a repeated request costs no
+API quota. Bars of closed days never change and never expire; anything that
+can still change (today's bars, the active contract list) expires after a
+TTL. In replay mode nothing is fetched at all and a request missing from the
+cache fails, so backfills and tests run fully offline.
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+from backend.option_chain import MARKET_TIMEZONE
+
+logger = logging.getLogger(__name__)
+
+CACHE_MODES = ('off', 'record', 'replay')
+
+class ReplayCacheMiss(LookupError):
+    """A request was not in the cache while in replay mode"""
+
+def is_closed_day(day: date) -> bool:
+    """True once a trading day is over in New York, so its data can no longer change"""
+    return day < datetime.now(MARKET_TIMEZONE).date()
+
+class ResponseCache:
+    """
+    Content-addressed SQLite cache of API responses
+    
+    An entry's key is the SHA-256 of its endpoint and canonical JSON request
+    parameters; its value is the JSON response, zlib-compressed. Entries
+    stored with a TTL are ignored once expired (except in replay mode, which
+    serves whatever was recorded).
+    """
+    
+    def __init__(self, path: str, mode: str = 'record', live_ttl: float = 3600):
+        """
+        Args:
+            path: SQLite file
+            mode: 'record' (serve hits, fetch and store misses) or 'replay'
+                (serve hits, fail on misses)
+            live_ttl: Seconds responses that can still change are kept
+        """
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"cache mode must be 'record' or 'replay', not {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.live_ttl = live_ttl
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    endpoint TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    stored_at REAL NOT NULL,
+                    expires_at REAL
+                )
+            """)
+    
+    @property
+    def replay(self) -> bool:
+        return self.mode == 'replay'
+    
+    @staticmethod
+    def key(endpoint: str, params: Dict) -> str:
+        """Content address of a request"""
+        canonical = json.dumps([endpoint, params], sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+    
+    def get(self, endpoint: str, params: Dict) -> Optional[Any]:
+        """Cached response to a request, or None"""
+        return self.get_many(endpoint, [params]).get(0)
+    
+    def get_many(self, endpoint: str, params_list: Sequence[Dict]) -> Dict[int, Any]:
+        """
+        Cached responses to many requests of one endpoint
+        
+        Returns:
+            Index into params_list -> response, for the requests that hit
+        """
+        keys = [self.key(endpoint, params) for params in params_list]
+        now = time.time()
+        found = {}
+        with self.lock:
+            # Stay well below SQLite's limit on bound parameters
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT key, value, expires_at FROM responses WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                for key, value, expires_at in rows:
+                    if self.replay or expires_at is None or expires_at > now:
+                        found[key] = value
+        
+        responses = {
+            i: json.loads(zlib.decompress(found[key])) for i, key in enumerate(keys) if key in found
+        }
+        self.hits += len(responses)
+        self.misses += len(keys) - len(responses)
+        return responses
+    
+    def put(self, endpoint: str, params: Dict, value: Any, immutable: bool = False):
+        """Store the response to a request"""
+        self.put_many(endpoint, [(params, value)], immutable)
+    
+    def put_many(self, endpoint: str, entries: List[tuple], immutable: bool = False):
+        """
+        Store responses to many requests of one endpoint
+        
+        Args:
+            endpoint: Endpoint name
+            entries: (params, response) pairs
+            immutable: The responses can no longer change (e.g. bars of closed
+                days) and never expire; otherwise they expire after live_ttl
+        """
+        now = time.time()
+        expires_at = None if immutable else now + self.live_ttl
+        rows = [
+            (
+                self.key(endpoint, params), endpoint,
+                json.dumps(params, sort_keys=True, default=str),
+                zlib.compress(json.dumps(value).encode()), now, expires_at
+            )
+            for params, value in entries
+        ]
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO responses (key, endpoint, params, value, stored_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+    
+    def ensure_can_fetch(self, endpoint: str, count: int = 1):
+        """Raise ReplayCacheMiss if count requests to endpoint would have to go to the API"""
+        if self.replay and count:
+            raise ReplayCacheMiss(f"{count} {endpoint} requests not in replay cache {self.path}")
+    
+    def purge_expired(self) -> int:
+        """Delete expired entries, returning how many were deleted"""
+        with self.lock, self.conn:
+            deleted = self.conn.execute(
+                "DELETE FROM responses WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+            ).rowcount
+        return deleted
+    
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+def open_response_cache(path: Optional[str], mode: str = 'record', live_ttl: float = 3600) -> Optional[ResponseCache]:
+    """Response cache at path, or None if disabled (no path or mode 'off')"""
+    if not path or mode == 'off':
+        return None
+    cache = ResponseCache(path, mode, live_ttl)
+    if not cache.replay:
+        purged = cache.purge_expired()
+        if purged:
+            logger.info(f"Purged {purged} expired responses from {path}")
+    return cache
@@ -0,0 +1,184 @@
+"""
+Local columnar store of chain snapshots (partitioned Parquet dataset)
+
+Every collected or backfilled chain is also appended here so research and
+backfill verification can scan months of history without going through
+Supabase. Files are hive-partitioned by snapshot_date and expiration_date,
+so date and expiration filters only open the matching directories.
+"""
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import numpy as np
+
+from backend.option_chain import OptionChain
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+PRICE_COLUMNS = (
+    'strike_price', 'bid_price', 'ask_price', 'last_price', 'underlying_price',
+    'time_to_maturity', 'implied_volatility', 'delta', 'gamma', 'theta', 'vega', 'rho',
+)
+
+def _schema():
+    category = pa.dictionary(pa.int8(), pa.string())
+    return pa.schema(
+        [
+            ('snapshot_time', pa.timestamp('us', tz='UTC')),
+            ('symbol', category),
+            ('option_symbol', pa.string()),
+            ('option_type', category),
+        ]
+        + [(name, pa.float32()) for name in PRICE_COLUMNS]
+        + [
+            ('snapshot_date', pa.date32()),
+            ('expiration_date', pa.date32()),
+        ]
+    )
+
+def _partitioning():
+    return ds.partitioning(
+        pa.schema([('snapshot_date', pa.date32()), ('expiration_date', pa.date32())]),
+        flavor='hive'
+    )
+
+def _to_utc(value, default: datetime) -> datetime:
+    if not value:
+        value = default
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+class SnapshotStore:
+    """Append-only Parquet dataset of priced option chains"""
+    
+    def __init__(self, root: str):
+        if pa is None:
+            raise ImportError("pyarrow is required for the snapshot store (pip install pyarrow)")
+        self.root = root
+        self.schema = _schema()
+    
+    def write_chain(self, chain: OptionChain, snapshot_time: datetime) -> int:
+        """
+        Append one priced chain
+        
+        Args:
+            chain: Chain priced by GreeksCalculator.price_option_chain
+            snapshot_time: Time of the snapshot; a contract's own 'timestamp'
+                takes precedence (e.g. bar times in backfills)
+        
+        Returns:
+            Number of rows written
+        """
+        expirations = chain.expiration_keys()
+        keep = expirations != ''
+        if not keep.any():
+            return 0
+        chain, expirations = chain.take(keep), expirations[keep]
+        
+        timestamps = chain.get('timestamp')
+        if any(timestamps):
+            times = [_to_utc(value, snapshot_time) for value in timestamps]
+        else:
+            times = [_to_utc(None, snapshot_time)] * len(chain)
+        
+        def floats(name):
+            values = chain.get(name)
+            return pa.array(values.astype(np.float32), pa.float32(), mask=np.isnan(values))
+        
+        columns = {
+            'snapshot_time': pa.array(times, pa.timestamp('us', tz='UTC')),
+            'symbol': pa.array(chain.get('symbol')).dictionary_encode().cast(self.schema.field('symbol').type),
+            'option_symbol': pa.array(chain.get('option_symbol'), pa.string()),
+            'option_type': pa.array(chain.get('option_type')).dictionary_encode().cast(self.schema.field('option_type').type),
+        }
+        for name in PRICE_COLUMNS:
+            columns[name] = floats(name)
+        columns['snapshot_date'] = pa.array([t.date() for t in times], pa.date32())
+        columns['expiration_date'] = pa.array(expirations.astype('datetime64[D]'), pa.date32())
+        
+        table = pa.table(columns, schema=self.schema)
+        ds.write_dataset(
+            table,
+            self.root,
+            format='parquet',
+            partitioning=_partitioning(),
+            basename_template=f"{uuid.uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior='overwrite_or_ignore',
+        )
+        return table.num_rows
+    
+    def dataset(self, memory_map: bool = True) -> 'ds.Dataset':
+        """Open the dataset; with memory_map, reads map files instead of copying them"""
+        return ds.dataset(
+            self.root,
+            schema=self.schema,
+            format='parquet',
+            partitioning=_partitioning(),
+            filesystem=fs.LocalFileSystem(use_mmap=memory_map),
+        )
+    
+    def read(
+        self,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        expiration_date: Optional[str] = None,
+        option_type: Optional[str] = None,
+        columns: Optional[List[str]] = None,
+        memory_map: bool = True
+    ) -> 'pa.Table':
+        """
+        Read snapshots matching the given filters
+        
+        Date and expiration filters prune whole partitions; other predicates
+        are pushed down to Parquet row-group statistics.
+        
+        Args:
+            start_date: First snapshot date to include (YYYY-MM-DD)
+            end_date: Last snapshot date to include (YYYY-MM-DD)
+            expiration_date: Only this expiration (YYYY-MM-DD)
+            option_type: Only 'call' or 'put'
+            columns: Columns to load (default: all)
+            memory_map: Memory-map files rather than reading them into buffers
+        
+        Returns:
+            Arrow table of matching rows
+        """
+        def date(value):
+            return pa.scalar(datetime.fromisoformat(value).date(), pa.date32())
+        
+        conditions = []
+        if start_date:
+            conditions.append(ds.field('snapshot_date') >= date(start_date))
+        if end_date:
+            conditions.append(ds.field('snapshot_date') <= date(end_date))
+        if expiration_date:
+            conditions.append(ds.field('expiration_date') == date(expiration_date))
+        if option_type:
+            conditions.append(ds.field('option_type').cast(pa.string()) == option_type)
+        
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        
+        return self.dataset(memory_map).to_table(columns=columns, filter=expression)
+
+def open_snapshot_store(root: Optional[str]) -> Optional[SnapshotStore]:
+    """Snapshot store at root, or None if disabled (no root) or pyarrow is missing"""
+    if not root:
+        return None
+    if pa is None:
+        logger.warning("pyarrow is not installed; local snapshot store disabled")
+        return None
+    return SnapshotStore(root)
@@ -0,0 +1,88 @@
+"""
+Local fake of Alpaca's market data websocket that replays recorded messages
+
+Recordings are JSON lines of decoded stream messages, as written by
+StreamingCollector(record_path=...). Each connection goes through the same
+connect/auth/subscribe handshake as Alpaca and then receives the recorded
+quotes and trades for the symbols it subscribed to.
+
+Usage:
+    python backend/stream_replay.py recording.jsonl --port 8765
+    ALPACA_OPTION_STREAM_URL=ws://localhost:8765 \
+    ALPACA_STOCK_STREAM_URL=ws://localhost:8765 python run_collector.py --stream
+"""
+import argparse
+import asyncio
+import json
+import logging
+from typing import Dict, List
+
+import msgpack
+import websockets
+
+logger = logging.getLogger(__name__)
+
+def load_recording(path: str) -> List[Dict]:
+    """Read a JSON-lines recording, keeping only quotes and trades"""
+    with open(path) as f:
+        messages = [json.loads(line) for line in f if line.strip()]
+    return [m for m in messages if m.get('T') in ('q', 't')]
+
+def make_handler(messages: List[Dict], delay: float = 0.0):
+    """Build a websocket handler that replays messages to each subscriber"""
+    
+    async def handler(ws, path=None):
+        content_type = ws.request_headers.get('Content-Type', '') if hasattr(ws, 'request_headers') else ''
+        use_msgpack = 'msgpack' in content_type
+        
+        async def send(payload: List[Dict]):
+            await ws.send(msgpack.packb(payload) if use_msgpack else json.dumps(payload))
+        
+        def decode(raw) -> Dict:
+            return msgpack.unpackb(raw) if isinstance(raw, bytes) else json.loads(raw)
+        
+        await send([{'T': 'success', 'msg': 'connected'}])
+        
+        auth = decode(await ws.recv())
+        if auth.get('action') != 'auth':
+            await send([{'T': 'error', 'code': 401, 'msg': 'not authenticated'}])
+            return
+        await send([{'T': 'success', 'msg': 'authenticated'}])
+        
+        subscription = decode(await ws.recv())
+        quotes = set(subscription.get('quotes', []))
+        trades = set(subscription.get('trades', []))
+        await send([{'T': 'subscription', 'quotes': sorted(quotes), 'trades': sorted(trades)}])
+        
+        for message in messages:
+            wanted = quotes if message['T'] == 'q' else trades
+            if message.get('S') in wanted:
+                await send([message])
+                if delay:
+                    await asyncio.sleep(delay)
+        
+        # Keep the connection open like the real stream would
+        await ws.wait_closed()
+    
+    return handler
+
+async def serve(path: str, host: str = 'localhost', port: int = 8765, delay: float = 0.0):
+    """Serve a recording until cancelled"""
+    messages = load_recording(path)
+    logger.info(f"Replaying {len(messages)} messages on ws://{host}:{port}")
+    async with websockets.serve(make_handler(messages, delay), host, port):
+        await asyncio.Future()
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a recorded Alpaca stream over a local websocket')
+    parser.add_argument('recording', help='JSON-lines recording of stream messages')
+    parser.add_argument('--host', default='localhost', help='Host to bind. Default: localhost')
+    parser.add_argument('--port', type=int, default=8765, help='Port to bind. Default: 8765')
+    parser.add_argument('--delay', type=float, default=0.0, help='Seconds between replayed messages. Default: 0')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(serve(args.recording, args.host, args.port, args.delay))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""
+Streaming collector mode using Alpaca's real-time market data websockets
+
+Subscribes to quotes and trades for the tracked option contracts (the ones
+nearest the money, up to the stream's subscription limit) and the
+underlying, keeps the latest quote per symbol in memory, and reprices only
+the contracts whose inputs moved. Every flush interval in which anything
+moved, the whole tracked chain is stored as one snapshot.
+"""
+import asyncio
+import json
+import logging
+import time
+import traceback
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+
+import msgpack
+import numpy as np
+import websockets
+
+from backend.config import (
+    ALPACA_API_KEY, ALPACA_SECRET_KEY, ALPACA_OPTION_STREAM_URL,
+    ALPACA_STOCK_STREAM_URL, STREAM_FLUSH_INTERVAL, STREAM_MAX_CONTRACTS, STREAM_ARCHIVE_INTERVAL
+)
+from backend.metrics import metrics
+from backend.option_chain import OptionChain
+
+if TYPE_CHECKING:
+    from backend.collector import OptionsDataCollector
+
+logger = logging.getLogger(__name__)
+
+class QuoteBook:
+    """Latest quote and trade per symbol, plus the set of symbols that moved"""
+    
+    def __init__(self):
+        self.quotes: Dict[str, Dict] = {}
+        self.dirty: Set[str] = set()
+    
+    def update_quote(self, symbol: str, bid_price: Optional[float], ask_price: Optional[float]):
+        quote = self.quotes.setdefault(symbol, {})
+        if quote.get('bid_price') != bid_price or quote.get('ask_price') != ask_price:
+            quote['bid_price'] = bid_price
+            quote['ask_price'] = ask_price
+            self.dirty.add(symbol)
+    
+    def update_trade(self, symbol: str, price: Optional[float]):
+        quote = self.quotes.setdefault(symbol, {})
+        if quote.get('last_price') != price:
+            quote['last_price'] = price
+            # The last trade only feeds pricing when there is no two-sided quote
+            if not (quote.get('bid_price') and quote.get('ask_price')):
+                self.dirty.add(symbol)
+    
+    def get(self, symbol: str) -> Dict:
+        return self.quotes.get(symbol, {})
+    
+    def pop_dirty(self) -> Set[str]:
+        """Return the symbols that moved since the last call and reset the set"""
+        dirty, self.dirty = self.dirty, set()
+        return dirty
+
+class StreamingCollector:
+    """
+    Real-time counterpart of OptionsDataCollector.run_continuous
+    
+    Reuses the collector's Alpaca client for the initial chain, and its
+    pricing and bulk write path for every flush. Stream URLs can point at a
+    local server (see backend/stream_replay.py) to replay recorded sessions.
+    """
+    
+    def __init__(
+        self,
+        collector: 'OptionsDataCollector',
+        flush_interval: float = STREAM_FLUSH_INTERVAL,
+        option_stream_url: str = ALPACA_OPTION_STREAM_URL,
+        stock_stream_url: str = ALPACA_STOCK_STREAM_URL,
+        spot_reprice_threshold: float = 0.0005,
+        record_path: Optional[str] = None,
+        max_contracts: int = STREAM_MAX_CONTRACTS,
+        archive_interval: float = STREAM_ARCHIVE_INTERVAL
+    ):
+        """
+        Args:
+            collector: Collector whose client, pricing and writers are reused
+            flush_interval: Seconds between repricing/write passes
+            option_stream_url: Websocket URL of the options data stream
+            stock_stream_url: Websocket URL of the stock data stream
+            spot_reprice_threshold: Relative spot move that reprices the whole chain
+            record_path: Optional JSON-lines file receiving every decoded message
+            max_contracts: Most option contracts subscribed to; the ones
+                nearest the money are kept
+            archive_interval: Seconds between writes to the local snapshot
+                store (the collector's cadence, not every flush)
+        """
+        self.collector = collector
+        self.flush_interval = flush_interval
+        self.option_stream_url = option_stream_url
+        self.stock_stream_url = stock_stream_url
+        self.spot_reprice_threshold = spot_reprice_threshold
+        self.record_path = record_path
+        self.max_contracts = max_contracts
+        self.archive_interval = archive_interval
+        
+        self.symbol = collector.alpaca_client.symbol
+        self.book = QuoteBook()
+        self.contracts: Dict[str, Dict] = {}
+        self.spot: Optional[float] = None
+        self.priced_spot: Optional[float] = None
+        self._stopped = asyncio.Event()
+        self._record_file = None
+        self._last_archived: Optional[float] = None
+    
+    @staticmethod
+    def nearest_contracts(chain: OptionChain, max_contracts: int) -> OptionChain:
+        """
+        The max_contracts contracts nearest the money
+        
+        Distance is |ln(K/S)| / sqrt(T), so longer expirations keep a wider
+        band of strikes, like a window of standard deviations.
+        """
+        if len(chain) <= max_contracts:
+            return chain
+        with np.errstate(divide='ignore', invalid='ignore'):
+            distance = np.abs(np.log(chain['strike_price'] / chain['underlying_price'])) / np.sqrt(
+                np.maximum(np.nan_to_num(chain['time_to_maturity'], nan=0.0), 1 / 365)
+            )
+        order = np.argsort(np.nan_to_num(distance, nan=np.inf), kind='stable')
+        return chain.take(np.sort(order[:max_contracts]))
+    
+    def load_chain(self):
+        """Fetch the tracked contracts and seed the book from their snapshots"""
+        chain = self.collector.alpaca_client.get_all_options_data()
+        if len(chain) > self.max_contracts:
+            logger.warning(
+                f"Chain has {len(chain)} contracts; streaming the {self.max_contracts} nearest the money"
+            )
+            chain = self.nearest_contracts(chain, self.max_contracts)
+        for option in chain.to_records():
+            symbol = option['option_symbol']
+            self.contracts[symbol] = option
+            self.book.update_quote(symbol, option.get('bid_price'), option.get('ask_price'))
+            self.book.update_trade(symbol, option.get('last_price'))
+            if option.get('underlying_price'):
+                self.spot = option['underlying_price']
+        logger.info(f"Streaming {len(self.contracts)} option contracts")
+    
+    def handle_message(self, message: Dict):
+        """Apply one decoded stream message to the book"""
+        msg_type = message.get('T')
+        symbol = message.get('S')
+        
+        if msg_type == 'q':
+            if symbol == self.symbol:
+                bid, ask = message.get('bp'), message.get('ap')
+                if bid and ask:
+                    self.spot = (bid + ask) / 2
+            else:
+                self.book.update_quote(symbol, message.get('bp'), message.get('ap'))
+        elif msg_type == 't':
+            if symbol == self.symbol:
+                self.spot = message.get('p') or self.spot
+            else:
+                self.book.update_trade(symbol, message.get('p'))
+        elif msg_type == 'error':
+            logger.error(f"Stream error {message.get('code')}: {message.get('msg')}")
+        elif msg_type in ('success', 'subscription'):
+            logger.info(f"Stream {msg_type}: {message.get('msg', '')}")
+    
+    def take_batch(self) -> Tuple[List[Dict], int]:
+        """
+        Collect the whole tracked chain if anything moved since the last batch
+        
+        A spot move beyond spot_reprice_threshold moves every contract;
+        otherwise only contracts whose own quote moved count. The batch is
+        one complete snapshot: every option has the same timestamp, and time
+        to maturity is measured from it.
+        
+        Returns:
+            Tuple of (option dictionaries, empty if nothing moved; number of
+            contracts that moved)
+        """
+        dirty = self.book.pop_dirty()
+        if self.spot and (
+            not self.priced_spot
+            or abs(self.spot - self.priced_spot) / self.priced_spot > self.spot_reprice_threshold
+        ):
+            dirty = set(self.contracts)
+            self.priced_spot = self.spot
+        
+        moved = len(dirty & self.contracts.keys())
+        if not moved:
+            return [], 0
+        
+        now = datetime.now(timezone.utc)
+        batch = []
+        for symbol, contract in self.contracts.items():
+            option = dict(contract)
+            option.update(self.book.get(symbol))
+            option['underlying_price'] = self.priced_spot
+            option['time_to_maturity'] = self.collector.alpaca_client.time_to_maturity(
+                contract['expiration_date'], now
+            )
+            option['timestamp'] = now.isoformat()
+            batch.append(option)
+        return batch, moved
+    
+    def write_batch(self, options_data: List[Dict]) -> int:
+        """
+        Price and store a batch through the collector's bulk write path
+        
+        Only contracts whose inputs changed are repriced (through the
+        collector's pricing cache). The chain is archived locally at most
+        once per archive_interval.
+        """
+        chain = OptionChain.from_records(options_data)
+        with metrics.stage('compute'):
+            rates, dividend_yields, _ = self.collector.rate_curve.chain_inputs(
+                chain, imply_forwards=self.collector.imply_forwards
+            )
+            chain, changed = self.collector.pricing_cache.price_chain(chain, r=rates, q=dividend_yields)
+        self.collector.count_iv_failures(chain, changed)
+        snapshot_id = self.collector.register_snapshot(chain, 'stream')
+        if self._last_archived is None or time.monotonic() - self._last_archived >= self.archive_interval:
+            with metrics.stage('archive_snapshot'):
+                self.collector.archive_snapshot(chain)
+            self._last_archived = time.monotonic()
+        return self.collector.store_records(chain, snapshot_id)
+    
+    async def flush(self) -> int:
+        """Reprice what moved since the last flush and store the whole chain"""
+        batch, moved = self.take_batch()
+        if not batch:
+            return 0
+        
+        loop = asyncio.get_running_loop()
+        try:
+            # Writes are blocking HTTP calls; keep them off the event loop
+            with metrics.cycle():
+                stored = await loop.run_in_executor(None, self.write_batch, batch)
+            metrics.increment('cycles')
+            metrics.increment('contracts', len(batch))
+            self.collector.export_metrics()
+            logger.info(f"{moved} contracts moved, stored {stored} records")
+            return stored
+        except Exception as e:
+            metrics.increment('cycle_errors')
+            logger.error(f"Error flushing streamed quotes: {str(e)}")
+            logger.debug(traceback.format_exc())
+            return 0
+    
+    @staticmethod
+    def _decode(raw) -> List[Dict]:
+        messages = msgpack.unpackb(raw) if isinstance(raw, bytes) else json.loads(raw)
+        return messages if isinstance(messages, list) else [messages]
+    
+    @staticmethod
+    def _encode(message: Dict, use_msgpack: bool):
+        return msgpack.packb(message) if use_msgpack else json.dumps(message)
+    
+    async def _consume(self, url: str, subscription: Dict, use_msgpack: bool):
+        """Connect, authenticate, subscribe and feed messages into the book until stopped"""
+        headers = {'Content-Type': 'application/msgpack'} if use_msgpack else None
+        backoff = 1
+        
+        while not self._stopped.is_set():
+            try:
+                async with websockets.connect(url, extra_headers=headers) as ws:
+                    await ws.send(self._encode(
+                        {'action': 'auth', 'key': ALPACA_API_KEY, 'secret': ALPACA_SECRET_KEY},
+                        use_msgpack
+                    ))
+                    await ws.send(self._encode({'action': 'subscribe', **subscription}, use_msgpack))
+                    backoff = 1
+                    
+                    async for raw in ws:
+                        for message in self._decode(raw):
+                            if self._record_file:
+                                self._record_file.write(json.dumps(message, default=str) + '\n')
+                            self.handle_message(message)
+                        if self._stopped.is_set():
+                            break
+                
+                logger.warning(f"Stream {url} closed")
+            except Exception as e:
+                logger.error(f"Stream {url} failed: {str(e)}")
+            
+            if not self._stopped.is_set():
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+    
+    async def _flush_loop(self):
+        while not self._stopped.is_set():
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+    
+    async def run(self, duration: Optional[float] = None):
+        """
+        Stream until stop() is called, or for duration seconds if given
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.load_chain)
+        
+        if self.record_path:
+            self._record_file = open(self.record_path, 'a')
+        
+        option_symbols = list(self.contracts)
+        consumers = [
+            asyncio.create_task(self._consume(
+                self.option_stream_url,
+                {'quotes': option_symbols, 'trades': option_symbols},
+                use_msgpack=True
+            )),
+            asyncio.create_task(self._consume(
+                self.stock_stream_url,
+                {'quotes': [self.symbol], 'trades': [self.symbol]},
+                use_msgpack=False
+            )),
+        ]
+        flusher = asyncio.create_task(self._flush_loop())
+        
+        try:
+            if duration is None:
+                await self._stopped.wait()
+            else:
+                try:
+                    await asyncio.wait_for(self._stopped.wait(), timeout=duration)
+                except asyncio.TimeoutError:
+                    self.stop()
+            # The flush loop does one last flush once stopped
+            await flusher
+        finally:
+            for task in consumers + [flusher]:
+                task.cancel()
+            await asyncio.gather(*consumers, flusher, return_exceptions=True)
+            if self._record_file:
+                self._record_file.close()
+                self._record_file = None
+    
+    def stop(self):
+        """Stop streaming; pending moves are flushed one last time"""
+        self._stopped.set()
@@ -0,0 +1,360 @@
+"""
+Interpolated implied volatility and Greeks from the latest fitted SVI surface
+
+Grids of (strike or delta, maturity) are answered in one vectorized
+evaluation of the stored slices (see backend/vol_surface.py), so consumers
+never need to read per-strike rows.
+
+Python:
+    service = SurfaceQueryService()
+    grid = service.query(maturities=[0.1, 0.25], strikes=[400, 450, 500])
+    grid = service.query(maturities=[0.1, 0.25], deltas=[0.25, 0.5, -0.25])
+
+HTTP (local):
+    python backend/surface_api.py --port 8080
+    curl 'http://localhost:8080/surface?maturities=0.1,0.25&strikes=400,450,500'
+    curl 'http://localhost:8080/surface?maturities=0.1,0.25&deltas=0.25,0.5,-0.25'
+"""
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Hashable, List, Optional, Sequence
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+from scipy.stats import norm
+
+# Allow running as a script (python backend/surface_api.py)
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.config import RATE_CURVE_PATH, RISK_FREE_RATE, DIVIDEND_YIELD
+from backend.database import get_supabase_client
+from backend.greeks_calculator import GreeksCalculator
+from backend.rate_curve import RateCurve
+from backend.vol_surface import SVI_PARAMS, svi_total_variance
+
+logger = logging.getLogger(__name__)
+
+class LRUCache:
+    """Small thread-safe least-recently-used cache"""
+    
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def get(self, key: Hashable):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+    
+    def put(self, key: Hashable, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+class VolSurface:
+    """
+    SVI slices of one snapshot, interpolated across maturities
+    
+    Between two slices, total variance is interpolated linearly in time at
+    constant log moneyness; before the first and after the last slice the
+    nearest slice's implied volatility is held constant.
+    """
+    
+    def __init__(self, slices: List[Dict], snapshot_id: Optional[int] = None):
+        if not slices:
+            raise ValueError("a surface needs at least one slice")
+        slices = sorted(slices, key=lambda s: float(s['time_to_maturity']))
+        
+        self.snapshot_id = snapshot_id
+        self.T = np.array([float(s['time_to_maturity']) for s in slices])
+        self.forward = np.array([float(s['forward_price']) for s in slices])
+        self.params = np.array([[float(s[name]) for name in SVI_PARAMS] for s in slices])
+        self.spot = float(np.median([float(s['underlying_price']) for s in slices if s.get('underlying_price')] or self.forward[:1]))
+        # Continuously compounded carry implied by each slice's forward
+        self.carry = np.log(self.forward / self.spot) / self.T
+    
+    def forward_price(self, T: np.ndarray) -> np.ndarray:
+        """Forward for any maturity, interpolating the slices' implied carry"""
+        return self.spot * np.exp(np.interp(T, self.T, self.carry) * T)
+    
+    def _slice_variance(self, k: np.ndarray, index: np.ndarray) -> np.ndarray:
+        a, b, rho, m, sigma = (self.params[index, i] for i in range(len(SVI_PARAMS)))
+        return svi_total_variance(k, a, b, rho, m, sigma)
+    
+    def total_variance(self, K: np.ndarray, T: np.ndarray) -> np.ndarray:
+        """Total implied variance at strikes K and maturities T (broadcast)"""
+        K, T = np.broadcast_arrays(np.asarray(K, dtype=float), np.asarray(T, dtype=float))
+        k = np.log(K / self.forward_price(T))
+        
+        if len(self.T) == 1:
+            return self._slice_variance(k, np.zeros(T.shape, dtype=int)) * T / self.T[0]
+        
+        hi = np.clip(np.searchsorted(self.T, T), 1, len(self.T) - 1)
+        lo = hi - 1
+        T_lo, T_hi = self.T[lo], self.T[hi]
+        w_lo = self._slice_variance(k, lo)
+        w_hi = self._slice_variance(k, hi)
+        
+        weight = np.clip((T - T_lo) / (T_hi - T_lo), 0.0, 1.0)
+        w = w_lo + weight * (w_hi - w_lo)
+        # Constant implied volatility outside the fitted maturities
+        w = np.where(T < T_lo, w_lo * T / T_lo, w)
+        w = np.where(T > T_hi, w_hi * T / T_hi, w)
+        return w
+    
+    def implied_volatility(self, K: np.ndarray, T: np.ndarray) -> np.ndarray:
+        """Implied volatility at strikes K and maturities T (NaN where variance is not positive)"""
+        w = self.total_variance(K, T)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.sqrt(np.where(w > 0, w, np.nan) / T)
+    
+    def strikes_for_delta(self, delta: np.ndarray, T: np.ndarray, q=0.0, iterations: int = 20) -> np.ndarray:
+        """
+        Strikes whose Black-Scholes-Merton delta under the surface equals delta
+        
+        Positive deltas are call deltas, negative deltas put deltas. Solved by
+        fixed-point iteration on K = F * exp(-d1 * sigma * sqrt(T) + sigma^2 * T / 2)
+        with sigma read from the surface at the current K.
+        """
+        delta, T, q = np.broadcast_arrays(
+            np.asarray(delta, dtype=float), np.asarray(T, dtype=float), np.asarray(q, dtype=float)
+        )
+        # Undo the dividend discount on delta, then convert put deltas to N(d1)
+        n_d1 = delta * np.exp(q * T)
+        n_d1 = np.where(delta < 0, n_d1 + 1.0, n_d1)
+        d1 = norm.ppf(np.clip(n_d1, 1e-6, 1 - 1e-6))
+        F = self.forward_price(T)
+        sqrt_T = np.sqrt(T)
+        
+        K = F
+        for _ in range(iterations):
+            sigma = np.nan_to_num(self.implied_volatility(K, T), nan=0.2)
+            K = F * np.exp(-d1 * sigma * sqrt_T + 0.5 * sigma * sigma * T)
+        return K
+    
+    def dividend_yield(self, T: np.ndarray, r) -> np.ndarray:
+        """Dividend yield consistent with the surface's forwards at rate r"""
+        return r - np.interp(T, self.T, self.carry)
+    
+    def evaluate(self, K: np.ndarray, T: np.ndarray, is_call, r=None) -> Dict[str, np.ndarray]:
+        """
+        Implied volatility, price and Greeks at strikes K and maturities T
+        
+        The dividend yield is backed out of the slices' forwards at rate r
+        (default: the forwards' own carry, i.e. no dividends).
+        """
+        K, T, is_call = np.broadcast_arrays(
+            np.asarray(K, dtype=float), np.asarray(T, dtype=float), np.asarray(is_call, dtype=bool)
+        )
+        iv = self.implied_volatility(K, T)
+        r = np.interp(T, self.T, self.carry) if r is None else r
+        result = GreeksCalculator.black_scholes_batch(
+            self.spot, K, T, r, iv, is_call, self.dividend_yield(T, r)
+        )
+        result['implied_volatility'] = iv
+        result['strike_price'] = K
+        return result
+
+class SurfaceQueryService:
+    """
+    Serves interpolated IV/Greeks grids from the latest stored surface
+    
+    Surfaces and evaluated grids are kept in LRU caches keyed by the
+    chain_snapshots id of the chain the slices were fitted to, so repeated
+    requests for the same grid are answered without touching Supabase or
+    recomputing anything.
+    """
+    
+    def __init__(
+        self,
+        supabase=None,
+        cache_size: int = 256,
+        refresh_interval: float = 5.0,
+        rate_curve: Optional[RateCurve] = None
+    ):
+        """
+        Args:
+            supabase: Supabase client (a new one if None)
+            cache_size: Number of evaluated grids to keep
+            refresh_interval: Seconds between checks for a newer snapshot
+            rate_curve: Risk-free rates used for discounting (RATE_CURVE_PATH if None)
+        """
+        self.supabase = supabase or get_supabase_client()
+        self.rate_curve = rate_curve or RateCurve(RATE_CURVE_PATH, RISK_FREE_RATE, DIVIDEND_YIELD)
+        self.refresh_interval = refresh_interval
+        self.surfaces = LRUCache(8)
+        self.results = LRUCache(cache_size)
+        self._latest_snapshot_id: Optional[int] = None
+        self._checked_at = 0.0
+    
+    def latest_snapshot_id(self) -> Optional[int]:
+        """Snapshot id of the most recently stored surface, re-checked every refresh_interval seconds"""
+        now = time.monotonic()
+        if self._latest_snapshot_id is None or now - self._checked_at > self.refresh_interval:
+            # Snapshot ids increase with every captured chain; slices stored
+            # before snapshots existed have none and are skipped
+            result = self.supabase.table('vol_surface_slices') \
+                .select('snapshot_id') \
+                .gt('snapshot_id', 0) \
+                .order('snapshot_id', desc=True) \
+                .limit(1) \
+                .execute()
+            if result.data:
+                self._latest_snapshot_id = int(result.data[0]['snapshot_id'])
+            self._checked_at = now
+        return self._latest_snapshot_id
+    
+    def load_surface(self, snapshot_id: int) -> VolSurface:
+        """Surface of one snapshot (cached)"""
+        surface = self.surfaces.get(snapshot_id)
+        if surface is None:
+            result = self.supabase.table('vol_surface_slices') \
+                .select('*') \
+                .eq('snapshot_id', snapshot_id) \
+                .execute()
+            surface = VolSurface(result.data or [], snapshot_id)
+            self.surfaces.put(snapshot_id, surface)
+        return surface
+    
+    def query(
+        self,
+        maturities: Sequence[float],
+        strikes: Optional[Sequence[float]] = None,
+        deltas: Optional[Sequence[float]] = None,
+        option_type: str = 'call',
+        snapshot_id: Optional[int] = None
+    ) -> Dict:
+        """
+        Evaluate a (strike or delta) x maturity grid
+        
+        Args:
+            maturities: Times to maturity in years (grid columns)
+            strikes: Strikes (grid rows); give either strikes or deltas
+            deltas: Deltas (grid rows); positive for calls, negative for puts
+            option_type: 'call' or 'put' for strike grids
+            snapshot_id: chain_snapshots id of the surface to use (default: the latest)
+        
+        Returns:
+            Dictionary with snapshot_id, maturities, strikes or deltas, and
+            read-only len(rows) x len(maturities) arrays for strike_price,
+            implied_volatility, price, delta, gamma, theta, vega and rho.
+            Results are cached; do not modify them.
+        """
+        if (strikes is None) == (deltas is None):
+            raise ValueError("give exactly one of strikes or deltas")
+        
+        snapshot_id = snapshot_id or self.latest_snapshot_id()
+        if snapshot_id is None:
+            raise LookupError("no fitted surface has been stored yet")
+        
+        rows = tuple(float(x) for x in (strikes if strikes is not None else deltas))
+        maturities = tuple(float(T) for T in maturities)
+        key = (snapshot_id, 'strike' if strikes is not None else 'delta', rows, maturities, option_type)
+        cached = self.results.get(key)
+        if cached is not None:
+            return cached
+        
+        surface = self.load_surface(snapshot_id)
+        T = np.array(maturities)[None, :]
+        r = self.rate_curve.risk_free_rate(T)
+        if strikes is not None:
+            K = np.array(rows)[:, None]
+            is_call = option_type == 'call'
+        else:
+            delta = np.array(rows)[:, None]
+            K = surface.strikes_for_delta(delta, T, surface.dividend_yield(T, r))
+            is_call = delta >= 0
+        
+        result = surface.evaluate(K, T, is_call, r)
+        for values in result.values():
+            values.setflags(write=False)
+        result.update({
+            'snapshot_id': snapshot_id,
+            'maturities': list(maturities),
+            'strikes' if strikes is not None else 'deltas': list(rows),
+        })
+        self.results.put(key, result)
+        return result
+
+def make_handler(service: SurfaceQueryService):
+    """Build an HTTP handler answering GET /surface from service"""
+    
+    class SurfaceRequestHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, payload: Dict):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != '/surface':
+                self._send_json(404, {'error': 'not found'})
+                return
+            
+            params = parse_qs(url.query)
+            
+            def floats(name):
+                if name not in params:
+                    return None
+                return [float(x) for x in params[name][0].split(',') if x]
+            
+            try:
+                result = service.query(
+                    maturities=floats('maturities') or [],
+                    strikes=floats('strikes'),
+                    deltas=floats('deltas'),
+                    option_type=params.get('option_type', ['call'])[0],
+                    snapshot_id=int(params['snapshot_id'][0]) if 'snapshot_id' in params else None,
+                )
+            except (ValueError, LookupError) as e:
+                self._send_json(400, {'error': str(e)})
+                return
+            except Exception as e:
+                logger.error(f"Error answering surface query: {str(e)}")
+                self._send_json(500, {'error': str(e)})
+                return
+            
+            payload = {
+                name: (np.where(np.isfinite(value), value, None).tolist() if isinstance(value, np.ndarray) else value)
+                for name, value in result.items()
+            }
+            self._send_json(200, payload)
+        
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+    
+    return SurfaceRequestHandler
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve interpolated IV/Greeks from the latest fitted surface')
+    parser.add_argument('--host', default='127.0.0.1', help='Host to bind. Default: 127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080, help='Port to bind. Default: 8080')
+    parser.add_argument('--cache-size', type=int, default=256, help='Evaluated grids to cache. Default: 256')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    service = SurfaceQueryService(cache_size=args.cache_size)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    logger.info(f"Serving surface queries on http://{args.host}:{args.port}/surface")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
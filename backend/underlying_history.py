@@ -0,0 +1,99 @@
+"""
+Underlying price history for pricing historical option bars
+
+Historical option bars carry no spot price, so the backfill fetches the
+underlying's bars for its whole date range in one request and looks up the
+spot for every option bar here: an as-of join to the nearest underlying bar,
+done with one binary search over the sorted bar times for the whole chain.
+"""
+import re
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from backend.option_chain import timestamps_to_seconds
+
+# Seconds per unit of an Alpaca timeframe ('1Day', '5Min', ...)
+TIMEFRAME_UNIT_SECONDS = {'Min': 60, 'Hour': 3600, 'Day': 86400, 'Week': 7 * 86400, 'Month': 31 * 86400}
+
+def timeframe_seconds(timeframe) -> float:
+    """Length of one bar of an Alpaca TimeFrame (or its string value, e.g. '5Min')"""
+    value = str(getattr(timeframe, 'value', timeframe))
+    match = re.fullmatch(r'(\d+)(Min|Hour|Day|Week|Month)', value)
+    if not match:
+        raise ValueError(f"Unknown timeframe: {value}")
+    return int(match.group(1)) * TIMEFRAME_UNIT_SECONDS[match.group(2)]
+
+class UnderlyingHistory:
+    """
+    Closes of the underlying's bars over a date range, sorted by bar time
+    """
+    
+    def __init__(
+        self,
+        times: np.ndarray,
+        closes: np.ndarray,
+        start: date,
+        end: date,
+        bar_seconds: float
+    ):
+        """
+        Args:
+            times: Bar start times in Unix seconds
+            closes: Close of each bar
+            start: First day the history was requested for
+            end: Last day the history was requested for
+            bar_seconds: Length of one bar; lookups further than this from
+                every bar find no price
+        """
+        order = np.argsort(times, kind='stable')
+        self.times = np.asarray(times, dtype=float)[order]
+        self.closes = np.asarray(closes, dtype=float)[order]
+        self.start = start
+        self.end = end
+        self.bar_seconds = bar_seconds
+    
+    @classmethod
+    def from_bars(cls, bars: List[Dict], start: date, end: date, bar_seconds: float) -> 'UnderlyingHistory':
+        """History from bar dictionaries (as returned by AlpacaOptionsClient._bar_to_dict)"""
+        bars = [bar for bar in bars if bar.get('timestamp') and bar.get('close')]
+        return cls(
+            timestamps_to_seconds(bar['timestamp'] for bar in bars),
+            np.array([bar['close'] for bar in bars], dtype=float),
+            start, end, bar_seconds
+        )
+    
+    def __len__(self) -> int:
+        return len(self.times)
+    
+    def covers(self, day: date) -> bool:
+        """True if day is inside the range the history was fetched for"""
+        return self.start <= day <= self.end
+    
+    def price_at(self, timestamps: Iterable, tolerance: Optional[float] = None) -> np.ndarray:
+        """
+        Close of the underlying bar nearest to each timestamp
+        
+        Args:
+            timestamps: ISO timestamps (or datetimes) of the option bars
+            tolerance: Largest gap in seconds to a matching bar (default: one bar)
+        
+        Returns:
+            Spot price per timestamp, NaN where the timestamp is missing or
+            no bar is close enough
+        """
+        seconds = timestamps_to_seconds(timestamps)
+        if not len(self) or not len(seconds):
+            return np.full(len(seconds), np.nan)
+        tolerance = self.bar_seconds if tolerance is None else tolerance
+        
+        # Candidates: the last bar at or before, and the first bar after
+        after = np.clip(np.searchsorted(self.times, seconds, side='right'), 0, len(self) - 1)
+        before = np.clip(after - 1, 0, len(self) - 1)
+        with np.errstate(invalid='ignore'):
+            nearest = np.where(
+                np.abs(self.times[before] - seconds) <= np.abs(self.times[after] - seconds), before, after
+            )
+            gap = np.abs(self.times[nearest] - seconds)
+            return np.where(gap <= tolerance, self.closes[nearest], np.nan)
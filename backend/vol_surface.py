@@ -0,0 +1,374 @@
+"""
+Fit SVI volatility smiles to priced option chains
+
+Each expiration is summarized by the five raw SVI parameters (Gatheral):
+
+    w(k) = a + b * (rho * (k - m) + sqrt((k - m)^2 + sigma^2))
+
+where w is total implied variance (IV^2 * T) and k = ln(K / F) is log
+moneyness against the forward. A smooth smile at any strike can then be
+evaluated from the stored parameters instead of the raw per-strike points.
+
+SSVIFitter instead fits the whole surface at once with SSVI (Gatheral and
+Jacquier), whose slices are raw SVI slices sharing rho and a power-law
+curvature, constrained to be free of butterfly and calendar arbitrage:
+
+    w(k, theta) = theta / 2 * (1 + rho * phi * k + sqrt((phi * k + rho)^2 + 1 - rho^2))
+    phi(theta) = eta / (theta^gamma * (1 + theta)^(1 - gamma))
+"""
+import logging
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+from scipy.optimize import least_squares
+
+from backend.option_chain import OptionChain
+
+logger = logging.getLogger(__name__)
+
+SVI_PARAMS = ('a', 'b', 'rho', 'm', 'sigma')
+
+def svi_total_variance(k: np.ndarray, a: float, b: float, rho: float, m: float, sigma: float) -> np.ndarray:
+    """Raw SVI total implied variance at log moneyness k"""
+    x = np.asarray(k, dtype=float) - m
+    return a + b * (rho * x + np.sqrt(x * x + sigma * sigma))
+
+def ssvi_to_svi(theta: float, rho: float, phi: float) -> Dict[str, float]:
+    """Raw SVI parameters of the SSVI slice with ATM total variance theta and curvature phi"""
+    return {
+        'a': theta / 2 * (1 - rho * rho),
+        'b': theta * phi / 2,
+        'rho': rho,
+        'm': -rho / phi,
+        'sigma': np.sqrt(1 - rho * rho) / phi,
+    }
+
+def svi_implied_volatility(k: np.ndarray, T: float, params: Dict[str, float]) -> np.ndarray:
+    """Implied volatility of an SVI slice at log moneyness k (NaN where variance is negative)"""
+    w = svi_total_variance(k, *(params[name] for name in SVI_PARAMS))
+    with np.errstate(invalid='ignore'):
+        return np.sqrt(np.where(w > 0, w, np.nan) / T)
+
+class SVIFitter:
+    """
+    Fits one SVI slice per expiration, warm-starting each expiration from
+    the parameters fitted to the previous snapshot
+    """
+    
+    def __init__(self, min_points: int = 5, max_rmse: float = 0.05, min_price: float = 0.05):
+        """
+        Args:
+            min_points: Fewest usable quotes needed to fit a slice
+            min_price: Quotes with a mid below this are left out; at a few
+                ticks the implied volatility says more about the tick size
+                than about the smile
+            max_rmse: Slices whose vega-weighted IV root mean squared error
+                exceeds this are discarded (in volatility units, 0.05 = 5 vol points)
+        """
+        self.min_points = min_points
+        self.max_rmse = max_rmse
+        self.min_price = min_price
+        self.previous: Dict[str, np.ndarray] = {}
+    
+    @staticmethod
+    def _initial_guess(k: np.ndarray, w: np.ndarray) -> np.ndarray:
+        """Heuristic starting point: vertex at the lowest variance, mild skew"""
+        i = int(np.argmin(w))
+        return np.array([0.5 * w[i], 0.1, -0.5, k[i], 0.1])
+    
+    @staticmethod
+    def _bounds(k: np.ndarray, w: np.ndarray):
+        w_max = float(np.max(w))
+        k_span = float(np.ptp(k)) + 0.1
+        lower = np.array([-w_max, 0.0, -0.999, float(np.min(k)) - k_span, 1e-4])
+        upper = np.array([w_max, 10.0, 0.999, float(np.max(k)) + k_span, 5.0])
+        return lower, upper
+    
+    def fit_slice(
+        self,
+        k: np.ndarray,
+        w: np.ndarray,
+        weights: Optional[np.ndarray] = None,
+        x0: Optional[Sequence[float]] = None
+    ) -> Optional[Dict[str, float]]:
+        """
+        Least-squares fit of one SVI slice to total variances
+        
+        Args:
+            k: Log moneyness ln(K/F)
+            w: Total implied variance IV^2 * T
+            weights: Optional per-point weights
+            x0: Starting parameters (a, b, rho, m, sigma); a heuristic guess if None
+        
+        Returns:
+            Dictionary of SVI parameters plus 'cost' and 'nfev', or None if the fit failed
+        """
+        k = np.asarray(k, dtype=float)
+        w = np.asarray(w, dtype=float)
+        weights = np.ones_like(w) if weights is None else np.asarray(weights, dtype=float)
+        
+        lower, upper = self._bounds(k, w)
+        start = self._initial_guess(k, w) if x0 is None else np.asarray(x0, dtype=float)
+        start = np.clip(start, lower + 1e-9, upper - 1e-9)
+        
+        def residuals(p):
+            a, b, rho, m, sigma = p
+            fit = svi_total_variance(k, a, b, rho, m, sigma)
+            # Minimum total variance a + b*sigma*sqrt(1 - rho^2) must stay non-negative
+            floor = a + b * sigma * np.sqrt(1 - rho * rho)
+            return np.append(weights * (fit - w), 10.0 * min(floor, 0.0))
+        
+        try:
+            # soft_l1 keeps a few stale or crossed quotes from dragging the slice
+            result = least_squares(
+                residuals, start, bounds=(lower, upper), method='trf', x_scale='jac',
+                loss='soft_l1', f_scale=max(0.05 * float(np.median(weights * w)), 1e-8)
+            )
+        except Exception as e:
+            logger.error(f"Error fitting SVI slice: {str(e)}")
+            return None
+        
+        if not result.success:
+            return None
+        
+        params = dict(zip(SVI_PARAMS, (float(x) for x in result.x)))
+        params['cost'] = float(result.cost)
+        params['nfev'] = int(result.nfev)
+        return params
+    
+    def fit_chain(
+        self,
+        chain: OptionChain,
+        r: Union[float, np.ndarray] = 0.05,
+        q: Union[float, np.ndarray] = 0.0,
+        forwards: Optional[Dict[str, float]] = None
+    ) -> List[Dict]:
+        """
+        Fit one SVI slice per expiration of a priced chain
+        
+        Only out-of-the-money quotes are used (puts below the forward, calls
+        above) with a mid of at least min_price, weighted by vega so the far
+        wings count less than the strikes near the money.
+        
+        Args:
+            chain: Chain priced by GreeksCalculator.price_option_chain
+            r: Risk-free rate the chain was priced with, one for all contracts
+                or one per contract; used for the forward of expirations not
+                in forwards
+            q: Dividend yield the chain was priced with, like r
+            forwards: Forward price per expiration date (YYYY-MM-DD), e.g. from
+                RateCurve.chain_inputs
+        
+        Returns:
+            One record per fitted expiration, ready for the vol_surface_slices table
+        """
+        slices = []
+        points = self.expiration_points(chain, r, q, forwards)
+        for expiration, fit_points in points.items():
+            params = self.fit_slice(
+                fit_points['k'], fit_points['w'], weights=fit_points['weights'],
+                x0=self.previous.get(expiration)
+            )
+            if params is None:
+                logger.warning(f"SVI fit failed for {expiration}")
+                continue
+            
+            record = self.slice_record(expiration, fit_points, params, 'svi')
+            if record is None:
+                self.previous.pop(expiration, None)
+                continue
+            self.previous[expiration] = np.array([params[name] for name in SVI_PARAMS])
+            slices.append(record)
+        
+        # Expirations that rolled off the chain no longer need a warm start
+        for expiration in set(self.previous) - set(points):
+            del self.previous[expiration]
+        
+        logger.info(f"Fitted SVI slices for {len(slices)} of {len(points)} expirations")
+        return slices
+    
+    def expiration_points(
+        self,
+        chain: OptionChain,
+        r: Union[float, np.ndarray] = 0.05,
+        q: Union[float, np.ndarray] = 0.0,
+        forwards: Optional[Dict[str, float]] = None
+    ) -> Dict[str, Dict]:
+        """
+        Usable quotes of every expiration with enough of them (see fit_chain)
+        
+        Returns:
+            Dictionary of expiration date -> dictionary with the slice's
+            symbol, underlying_price, time_to_maturity and forward, and the
+            arrays k, w, iv and weights of its out-of-the-money quotes
+        """
+        iv = chain.get('implied_volatility')
+        S = chain.get('underlying_price')
+        T = chain.get('time_to_maturity')
+        K = chain.get('strike_price')
+        mid = chain.mid_price()
+        with np.errstate(invalid='ignore'):
+            usable = (iv > 0) & (S > 0) & (T > 0) & (K > 0) & (mid >= self.min_price)
+        
+        expirations = chain.expiration_keys()
+        labels, codes = np.unique(expirations[usable], return_inverse=True)
+        symbols = chain.get('symbol')[usable]
+        S, T, strikes, ivs = S[usable], T[usable], K[usable], iv[usable]
+        rates = np.broadcast_to(np.asarray(r, dtype=float), len(chain))[usable]
+        dividend_yields = np.broadcast_to(np.asarray(q, dtype=float), len(chain))[usable]
+        is_calls = chain.is_call[usable]
+        vegas = np.nan_to_num(chain.get('vega')[usable])
+        
+        points = {}
+        for j, expiration in enumerate(labels.tolist()):
+            members = codes == j
+            S_exp = float(S[members][0])
+            T_exp = float(np.median(T[members]))
+            forward = (forwards or {}).get(expiration) or S_exp * np.exp(
+                (np.median(rates[members]) - np.median(dividend_yields[members])) * T_exp
+            )
+            
+            strike, is_call, vol, vega = strikes[members], is_calls[members], ivs[members], vegas[members]
+            otm = np.where(is_call, strike >= forward, strike < forward) & (vega > 0)
+            if otm.sum() < self.min_points:
+                continue
+            
+            points[expiration] = {
+                'symbol': symbols[members][0],
+                'underlying_price': S_exp,
+                'time_to_maturity': T_exp,
+                'forward': float(forward),
+                'k': np.log(strike[otm] / forward),
+                'w': vol[otm] ** 2 * T_exp,
+                'iv': vol[otm],
+                'weights': vega[otm] / vega[otm].max(),
+            }
+        return points
+    
+    def slice_record(self, expiration: str, points: Dict, params: Dict[str, float], model: str) -> Optional[Dict]:
+        """
+        vol_surface_slices record of a fitted slice, or None if its fit is too poor
+        
+        A fitted IV that is NaN (negative total variance) at any quote
+        counts as a failed fit rather than being left out of the error.
+        """
+        fitted_iv = svi_implied_volatility(points['k'], points['time_to_maturity'], params)
+        weights = points['weights']
+        if np.isnan(fitted_iv).any():
+            logger.warning(f"Discarding {model.upper()} slice for {expiration} (negative total variance)")
+            return None
+        rmse = float(np.sqrt(np.sum(weights * (fitted_iv - points['iv']) ** 2) / weights.sum()))
+        if not np.isfinite(rmse) or rmse > self.max_rmse:
+            logger.warning(f"Discarding {model.upper()} slice for {expiration} (IV RMSE {rmse:.4f})")
+            return None
+        
+        return {
+            'symbol': points['symbol'],
+            'expiration_date': expiration,
+            'model': model,
+            'time_to_maturity': points['time_to_maturity'],
+            'underlying_price': points['underlying_price'],
+            'forward_price': points['forward'],
+            **{name: float(params[name]) for name in SVI_PARAMS},
+            'rmse': rmse,
+            'num_points': int(len(points['k'])),
+        }
+
+class SSVIFitter(SVIFitter):
+    """
+    Fits one SSVI surface across all expirations of a chain in a single
+    vectorized least-squares problem
+    
+    The unknowns are the global rho, eta and gamma plus the ATM total
+    variance theta of every expiration. theta is the running sum of
+    non-negative increments in order of maturity, so it never decreases
+    (no calendar arbitrage), and eta stays within 2 / (1 + |rho|) with
+    gamma in (0, 1/2] (no butterfly arbitrage). Each fitted slice is stored
+    as its equivalent raw SVI parameters, so readers of vol_surface_slices
+    evaluate it like any SVI slice. The global parameters warm-start the
+    next snapshot's fit.
+    """
+    
+    def fit_chain(
+        self,
+        chain: OptionChain,
+        r: Union[float, np.ndarray] = 0.05,
+        q: Union[float, np.ndarray] = 0.0,
+        forwards: Optional[Dict[str, float]] = None
+    ) -> List[Dict]:
+        """
+        Fit an SSVI surface to a priced chain (same quotes and weights as
+        SVIFitter.fit_chain)
+        
+        Returns:
+            One record per expiration of the surface, ready for the
+            vol_surface_slices table
+        """
+        points = self.expiration_points(chain, r, q, forwards)
+        if not points:
+            return []
+        
+        # Slices in order of maturity, flattened into one set of quotes
+        expirations = sorted(points, key=lambda expiration: points[expiration]['time_to_maturity'])
+        slice_of = np.concatenate([np.full(len(points[e]['k']), i) for i, e in enumerate(expirations)])
+        k = np.concatenate([points[e]['k'] for e in expirations])
+        iv = np.concatenate([points[e]['iv'] for e in expirations])
+        weights = np.concatenate([points[e]['weights'] for e in expirations])
+        T = np.array([points[e]['time_to_maturity'] for e in expirations])[slice_of]
+        
+        def atm_variance(expiration: str) -> float:
+            order = np.argsort(points[expiration]['k'])
+            return float(np.interp(0.0, points[expiration]['k'][order], points[expiration]['w'][order]))
+        
+        # ATM total variance of each slice, made non-decreasing
+        theta0 = np.maximum.accumulate([max(atm_variance(e), 1e-6) for e in expirations])
+        increments0 = np.maximum(np.diff(theta0, prepend=0.0), 1e-6)
+        # Global parameters: rho, eta as a fraction of its bound 2 / (1 + |rho|), gamma
+        start = np.concatenate([self.previous.get('ssvi', np.array([-0.5, 0.5, 0.4])), increments0])
+        
+        n = len(expirations)
+        lower = np.concatenate([[-0.999, 1e-4, 0.01], np.full(n, 1e-6)])
+        upper = np.concatenate([[0.999, 1.0, 0.5], np.full(n, 5.0)])
+        start = np.clip(start, lower + 1e-9, upper - 1e-9)
+        
+        def surface(x):
+            rho, eta_fraction, gamma = x[:3]
+            theta = np.cumsum(x[3:])
+            phi = 2 * eta_fraction / (1 + abs(rho)) / (theta ** gamma * (1 + theta) ** (1 - gamma))
+            return theta, phi
+        
+        def residuals(x):
+            rho = x[0]
+            theta, phi = surface(x)
+            theta_k, phi_k = theta[slice_of], phi[slice_of]
+            w = theta_k / 2 * (1 + rho * phi_k * k + np.sqrt((phi_k * k + rho) ** 2 + 1 - rho * rho))
+            return weights * (np.sqrt(w / T) - iv)
+        
+        try:
+            # soft_l1 keeps a few stale or crossed quotes from dragging the surface
+            result = least_squares(
+                residuals, start, bounds=(lower, upper), method='trf', x_scale='jac',
+                loss='soft_l1', f_scale=0.01
+            )
+        except Exception as e:
+            logger.error(f"Error fitting SSVI surface: {str(e)}")
+            return []
+        
+        if not result.success:
+            logger.warning("SSVI surface fit failed")
+            self.previous.pop('ssvi', None)
+            return []
+        
+        self.previous['ssvi'] = result.x[:3].copy()
+        rho = float(result.x[0])
+        theta, phi = surface(result.x)
+        
+        slices = []
+        for expiration, theta_e, phi_e in zip(expirations, theta, phi):
+            params = ssvi_to_svi(float(theta_e), rho, float(phi_e))
+            record = self.slice_record(expiration, points[expiration], params, 'ssvi')
+            if record is not None:
+                slices.append(record)
+        
+        logger.info(f"Fitted SSVI surface with {len(slices)} of {len(points)} expirations")
+        return slices
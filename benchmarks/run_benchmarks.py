@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks for pricing, IV solving and ingestion throughput
+
+Runs every benchmark on synthetic SPY-like chains (1k, 10k and 100k
+contracts by default) and writes the results as JSON, so a run on one
+commit can be compared with a run on another:
+    
+    python benchmarks/run_benchmarks.py --output before.json
+    python benchmarks/run_benchmarks.py --output after.json --compare before.json
+
+Benchmarks:
+    black_scholes / calculate_implied_volatility
+        Scalar calls, one per contract, on a sample of the chain
+    black_scholes_batch / calculate_implied_volatility_batch
+        One vectorized call over the whole chain
+    price_chain
+        Rate curve inputs plus IV and Greeks for the chain, as in collect_and_store_data
+    build_records
+        Priced chain to options_data records
+    store_records
+        OptionsDataCollector.store_records against an in-process PostgREST stub
+        (or a real PostgREST given --supabase-url)
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from functools import partial
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+# Add project root to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from backend.collector import OptionsDataCollector
+from backend.database import options_data_records
+from backend.greeks_calculator import GreeksCalculator
+from backend.option_chain import OptionChain
+from backend.rate_curve import RateCurve
+from benchmarks.synthetic import DIVIDEND_YIELD, RISK_FREE_RATE, StubSupabase, synthetic_chain
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+def time_calls(func: Callable, runs: int, warmup: int = 1) -> np.ndarray:
+    """Wall time in seconds of each of runs calls to func, after warmup calls"""
+    for _ in range(warmup):
+        func()
+    samples = np.empty(runs)
+    for i in range(runs):
+        start = time.perf_counter()
+        func()
+        samples[i] = time.perf_counter() - start
+    return samples
+
+def summarize(name: str, size: int, samples: np.ndarray, contracts_per_call: int) -> Dict:
+    """
+    Result row for one benchmark
+    
+    Args:
+        name: Benchmark name
+        size: Size of the chain the benchmark ran on
+        samples: Seconds per call
+        contracts_per_call: Contracts processed by each call
+    """
+    return {
+        'benchmark': name,
+        'chain_size': size,
+        'calls': len(samples),
+        'contracts_per_call': contracts_per_call,
+        'contracts_per_sec': contracts_per_call * len(samples) / samples.sum(),
+        'p50_ms': float(np.percentile(samples, 50) * 1e3),
+        'p99_ms': float(np.percentile(samples, 99) * 1e3),
+        'mean_ms': float(samples.mean() * 1e3),
+    }
+
+def scalar_samples(func: Callable, args: List[tuple]) -> np.ndarray:
+    """Seconds taken by each func(*a) call"""
+    samples = np.empty(len(args))
+    for i, a in enumerate(args):
+        start = time.perf_counter()
+        func(*a)
+        samples[i] = time.perf_counter() - start
+    return samples
+
+def run_size(
+    size: int,
+    runs: int,
+    scalar_sample: int,
+    supabase,
+    chunk_size: int
+) -> List[Dict]:
+    """Run every benchmark on a synthetic chain of size contracts"""
+    chain = synthetic_chain(size)
+    rate_curve = RateCurve(None, RISK_FREE_RATE, DIVIDEND_YIELD)
+    results = []
+    
+    # Scalar functions, one call per contract of a random sample
+    rng = np.random.default_rng(size)
+    sample = np.sort(rng.choice(size, min(size, scalar_sample), replace=False))
+    S, K, T = chain['underlying_price'], chain['strike_price'], chain['time_to_maturity']
+    option_type, mid = chain['option_type'], chain.mid_price()
+    sigma = np.full(size, 0.2)
+    bs_args = [
+        (S[i], K[i], T[i], RISK_FREE_RATE, sigma[i], option_type[i], DIVIDEND_YIELD) for i in sample
+    ]
+    results.append(summarize(
+        'black_scholes', size, scalar_samples(GreeksCalculator.black_scholes, bs_args), 1
+    ))
+    iv_args = [
+        (mid[i], S[i], K[i], T[i], RISK_FREE_RATE, option_type[i])
+        for i in sample if mid[i] > 0 and T[i] > 0
+    ]
+    results.append(summarize(
+        'calculate_implied_volatility', size,
+        scalar_samples(partial(GreeksCalculator.calculate_implied_volatility, q=DIVIDEND_YIELD), iv_args), 1
+    ))
+    
+    # Vectorized functions over the whole chain
+    is_call = chain.is_call
+    results.append(summarize('black_scholes_batch', size, time_calls(
+        lambda: GreeksCalculator.black_scholes_batch(S, K, T, RISK_FREE_RATE, sigma, is_call, DIVIDEND_YIELD),
+        runs
+    ), size))
+    priceable = (mid > 0) & (T > 0)
+    results.append(summarize('calculate_implied_volatility_batch', size, time_calls(
+        lambda: GreeksCalculator.calculate_implied_volatility_batch(
+            mid[priceable], S[priceable], K[priceable], T[priceable], RISK_FREE_RATE,
+            is_call[priceable], q=DIVIDEND_YIELD
+        ),
+        runs
+    ), int(priceable.sum())))
+    
+    # Collector pipeline: price the chain, build records, write them
+    def price_chain() -> OptionChain:
+        rates, dividend_yields, _ = rate_curve.chain_inputs(chain)
+        return GreeksCalculator.price_option_chain(chain, r=rates, q=dividend_yields)
+    
+    results.append(summarize('price_chain', size, time_calls(price_chain, runs), size))
+    priced = price_chain()
+    results.append(summarize('build_records', size, time_calls(lambda: options_data_records(priced), runs), size))
+    
+    # Only the write path of the collector is used, so skip its Alpaca and
+    # Supabase setup
+    collector = OptionsDataCollector.__new__(OptionsDataCollector)
+    collector.supabase = supabase
+    collector.chunk_size = chunk_size
+    results.append(summarize(
+        'store_records', size, time_calls(lambda: collector.store_records(priced), runs), size
+    ))
+    
+    return results
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=project_root, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def compare(results: List[Dict], baseline_path: str):
+    """Print the throughput change of every benchmark against a previous results file"""
+    with open(baseline_path) as f:
+        baseline = {
+            (row['benchmark'], row['chain_size']): row for row in json.load(f)['results']
+        }
+    
+    print(f"\nChange in contracts/sec vs {baseline_path}:")
+    for row in results:
+        before = baseline.get((row['benchmark'], row['chain_size']))
+        if before is None:
+            continue
+        change = row['contracts_per_sec'] / before['contracts_per_sec'] - 1
+        print(f"  {row['benchmark']:<36} {row['chain_size']:>7}  {change:+7.1%}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark pricing, IV solving and ingestion throughput')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help='Chain sizes in contracts (default: 1000 10000 100000)')
+    parser.add_argument('--runs', type=int, default=10,
+                        help='Timed calls per chain-level benchmark (default: 10)')
+    parser.add_argument('--scalar-sample', type=int, default=2000,
+                        help='Contracts timed one by one for the scalar benchmarks (default: 2000)')
+    parser.add_argument('--chunk-size', type=int, default=500,
+                        help='Rows per write request (default: 500)')
+    parser.add_argument('--request-latency-ms', type=float, default=0.0,
+                        help='Round trip added to each stub write request (default: 0)')
+    parser.add_argument('--supabase-url', type=str, default=None,
+                        help='Write to this (local) PostgREST/Supabase instead of the in-process stub')
+    parser.add_argument('--supabase-key', type=str, default='',
+                        help='API key for --supabase-url')
+    parser.add_argument('--output', type=str, default='benchmark_results.json',
+                        help='JSON file to write the results to (default: benchmark_results.json)')
+    parser.add_argument('--compare', type=str, default=None,
+                        help='Previous results file to compare throughput against')
+    args = parser.parse_args()
+    
+    if args.supabase_url:
+        from supabase import create_client
+        supabase = create_client(args.supabase_url, args.supabase_key)
+    else:
+        supabase = StubSupabase(args.request_latency_ms / 1e3)
+    
+    results = []
+    for size in args.sizes:
+        print(f"Benchmarking a {size}-contract chain...")
+        for row in run_size(size, args.runs, args.scalar_sample, supabase, args.chunk_size):
+            print(
+                f"  {row['benchmark']:<36} {row['contracts_per_sec']:>14,.0f} contracts/s"
+                f"  p50 {row['p50_ms']:10.3f} ms  p99 {row['p99_ms']:10.3f} ms"
+            )
+            results.append(row)
+    
+    report = {
+        'commit': git_commit(),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+    
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == '__main__':
+    main()
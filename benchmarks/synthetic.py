@@ -0,0 +1,157 @@
+"""
+Synthetic SPY-like option chains and an in-process Supabase stand-in for benchmarks
+
+Everything here runs offline: quotes come from Black-Scholes on a skewed
+smile, and the stub client answers PostgREST inserts without a network.
+"""
+import itertools
+import json
+import time
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from backend.greeks_calculator import GreeksCalculator
+from backend.option_chain import OptionChain
+
+SPOT = 580.0
+RISK_FREE_RATE = 0.045
+DIVIDEND_YIELD = 0.013
+
+# Fixed valuation time so every run prices the same chain
+AS_OF = datetime(2025, 1, 6, 15, 0)
+
+def spy_expirations(as_of: datetime = AS_OF) -> List[date]:
+    """
+    SPY-style expiration calendar: daily for two weeks, weekly for three
+    months, then monthly (third Friday) out to two years
+    """
+    start = as_of.date()
+    expirations = set()
+    
+    day = start
+    while len(expirations) < 10:
+        day += timedelta(days=1)
+        if day.weekday() < 5:
+            expirations.add(day)
+    
+    friday = start + timedelta(days=(4 - start.weekday()) % 7 or 7)
+    while friday <= start + timedelta(days=91):
+        expirations.add(friday)
+        friday += timedelta(days=7)
+    
+    for months in range(1, 25):
+        year, month = start.year + (start.month - 1 + months) // 12, (start.month - 1 + months) % 12 + 1
+        first = date(year, month, 1)
+        expirations.add(first + timedelta(days=(4 - first.weekday()) % 7 + 14))
+    
+    return sorted(expirations)
+
+def synthetic_chain(size: int, spot: float = SPOT, as_of: datetime = AS_OF, seed: int = 0) -> OptionChain:
+    """
+    Chain of exactly size contracts quoted off a Black-Scholes smile
+    
+    Strikes are centred on spot, one dollar apart for short maturities and
+    five dollars apart beyond three months, with calls and puts at every
+    strike. Bid/ask straddle the model price with a spread that widens with
+    price, so some deep wings are one-sided or zero-bid as in the real chain.
+    
+    Args:
+        size: Number of contracts
+        spot: Underlying price
+        as_of: Valuation time; time_to_maturity is measured from it
+        seed: Seed for the quote noise
+    
+    Returns:
+        Unpriced OptionChain shaped like AlpacaOptionsClient.get_all_options_data
+    """
+    expirations = spy_expirations(as_of)
+    per_expiration = -(-size // (2 * len(expirations)))
+    
+    columns: Dict[str, list] = {name: [] for name in ('option_symbol', 'option_type', 'strike_price', 'expiration_date')}
+    for expiration in expirations:
+        step = 1.0 if (expiration - as_of.date()).days <= 91 else 5.0
+        lowest = max(step, np.round(spot / step) * step - step * (per_expiration // 2))
+        strikes = lowest + step * np.arange(per_expiration)
+        for strike, option_type in itertools.product(strikes, ('call', 'put')):
+            columns['option_symbol'].append(
+                f"SPY{expiration:%y%m%d}{option_type[0].upper()}{int(round(strike * 1000)):08d}"
+            )
+            columns['option_type'].append(option_type)
+            columns['strike_price'].append(strike)
+            columns['expiration_date'].append(expiration.isoformat())
+    
+    chain = OptionChain({
+        name: OptionChain.column_array(name, values[:size]) for name, values in columns.items()
+    })
+    n = len(chain)
+    T = chain.time_to_maturity(as_of)
+    K = chain['strike_price']
+    
+    # Skewed smile, steeper for short maturities
+    k = np.log(K / spot) / np.sqrt(np.maximum(T, 1 / 365))
+    sigma = np.clip(0.16 - 0.08 * k + 0.04 * k ** 2, 0.08, 1.5)
+    price = GreeksCalculator.black_scholes_batch(
+        spot, K, np.maximum(T, 1 / 365), RISK_FREE_RATE, sigma, chain.is_call, DIVIDEND_YIELD
+    )['price']
+    
+    rng = np.random.default_rng(seed)
+    half_spread = np.maximum(0.005, 0.01 * price) * rng.uniform(0.5, 1.5, n)
+    bid = np.round(np.maximum(price - half_spread, 0.0), 2)
+    ask = np.round(price + half_spread, 2)
+    last = np.where(rng.random(n) < 0.8, np.round(price, 2), np.nan)
+    
+    return chain.with_columns(
+        symbol=OptionChain.column_array('symbol', ['SPY'] * n),
+        bid_price=bid,
+        ask_price=np.maximum(ask, 0.01),
+        last_price=last,
+        underlying_price=np.full(n, spot),
+        time_to_maturity=T,
+        implied_volatility=np.full(n, np.nan),
+    )
+
+class StubSupabase:
+    """
+    In-process stand-in for the Supabase client's table insert/upsert calls
+    
+    Every request body is JSON-encoded and decoded as it would be on the way
+    to PostgREST, and rows come back with sequential ids, so the write path
+    does all of its record building, chunking and serialization work.
+    """
+    
+    def __init__(self, request_latency: float = 0.0):
+        """
+        Args:
+            request_latency: Seconds each request sleeps, to model a round trip
+        """
+        self.request_latency = request_latency
+        self.requests = 0
+        self.rows_written = 0
+        self._ids = itertools.count(1)
+    
+    def table(self, name: str) -> '_StubRequest':
+        return _StubRequest(self, name)
+
+class _StubRequest:
+    def __init__(self, client: StubSupabase, table: str):
+        self.client = client
+        self.table = table
+        self.body: Optional[str] = None
+    
+    def insert(self, rows: List[Dict]) -> '_StubRequest':
+        self.body = json.dumps(rows)
+        return self
+    
+    def upsert(self, rows: List[Dict], on_conflict: str = '', ignore_duplicates: bool = False) -> '_StubRequest':
+        return self.insert(rows)
+    
+    def execute(self) -> SimpleNamespace:
+        if self.client.request_latency:
+            time.sleep(self.client.request_latency)
+        rows = json.loads(self.body)
+        self.client.requests += 1
+        self.client.rows_written += len(rows)
+        return SimpleNamespace(data=[{**row, 'id': next(self.client._ids)} for row in rows])
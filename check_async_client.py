@@ -0,0 +1,149 @@
+"""
+Check the async Alpaca client against the local mock server
+
+Needs no API keys or network: backend/alpaca_mock_server.py serves the
+REST endpoints on a free local port.
+"""
+import sys
+import os
+import time
+from datetime import datetime, timedelta
+
+# Add the project root to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backend.alpaca_mock_server import MockAlpacaServer
+from backend.async_alpaca_client import AsyncAlpacaOptionsClient
+from backend.metrics import metrics
+
+LATENCY = 0.2
+
+def requests_to(server, path):
+    return [params for request_path, params in server.requests if request_path == path]
+
+def test_contract_pages(server, client):
+    """Test that get_option_contracts follows next_page_token and parses contracts"""
+    print("Testing contract pagination...")
+    try:
+        server.reset()
+        contracts = client.run(client.get_option_contracts())
+        pages = requests_to(server, '/v2/options/contracts')
+        if len(contracts) != len(server.contracts):
+            print(f"✗ Fetched {len(contracts)} of {len(server.contracts)} contracts")
+            return False
+        if len(pages) < 2 or 'page_token' not in pages[-1]:
+            print(f"✗ Expected several pages, got {len(pages)} requests")
+            return False
+        expected = server.contracts[0]
+        if (contracts['option_symbol'][0] != expected['symbol']
+                or contracts['strike_price'][0] != float(expected['strike_price'])
+                or contracts['option_type'][0] != expected['type']):
+            print(f"✗ First contract parsed wrong: {contracts['option_symbol'][0]} {contracts['strike_price'][0]}")
+            return False
+        print(f"✓ {len(contracts)} contracts over {len(pages)} pages")
+        return True
+    except Exception as e:
+        print(f"✗ Contract pagination failed: {str(e)}")
+        return False
+
+def test_concurrent_snapshots(server, client):
+    """Test that snapshot chunks are requested at the same time"""
+    print("\nTesting concurrent snapshot chunks...")
+    try:
+        symbols = [contract['symbol'] for contract in server.contracts]
+        server.reset()
+        server.latency = LATENCY
+        start = time.perf_counter()
+        snapshots = client.run(client.get_option_snapshot(symbols, chunk_size=50))
+        elapsed = time.perf_counter() - start
+        server.latency = 0.0
+        chunks = len(requests_to(server, '/v1beta1/options/snapshots'))
+        if len(snapshots) != len(symbols):
+            print(f"✗ Got snapshots for {len(snapshots)} of {len(symbols)} contracts")
+            return False
+        if server.max_in_flight < 2 or elapsed > chunks * LATENCY / 2:
+            print(f"✗ {chunks} requests took {elapsed:.2f}s with at most {server.max_in_flight} in flight")
+            return False
+        snapshot = snapshots[symbols[0]]
+        if None in (snapshot.get('bid_price'), snapshot.get('ask_price'), snapshot.get('last_price')):
+            print(f"✗ Snapshot parsed wrong: {snapshot}")
+            return False
+        print(f"✓ {chunks} requests in {elapsed:.2f}s, {server.max_in_flight} in flight at once")
+        return True
+    except Exception as e:
+        print(f"✗ Snapshot fetch failed: {str(e)}")
+        return False
+
+def test_rate_limit_retry(server, client):
+    """Test that an HTTP 429 is retried"""
+    print("\nTesting 429 retry...")
+    try:
+        server.reset()
+        server.fail_next(1)
+        retries = metrics.counter('retries')
+        price = client.run(client.get_underlying_price())
+        if price != server.underlying_price:
+            print(f"✗ Got price {price} after a 429, expected {server.underlying_price}")
+            return False
+        if len(server.requests) != 2 or metrics.counter('retries') != retries + 1:
+            print(f"✗ Expected one retry, saw {len(server.requests)} requests")
+            return False
+        print(f"✓ Retried after a 429 (SPY price: ${price:.2f})")
+        return True
+    except Exception as e:
+        print(f"✗ 429 retry failed: {str(e)}")
+        return False
+
+def test_bars(server, client):
+    """Test that option bars are parsed, following next_page_token within a chunk"""
+    print("\nTesting historical bars...")
+    try:
+        symbols = [contract['symbol'] for contract in server.contracts[:30]]
+        end = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        start = end - timedelta(days=5)
+        server.reset()
+        bars = client.run(client.get_historical_option_bars_batch(symbols, start, end))
+        pages = requests_to(server, '/v1beta1/options/bars')
+        if sorted(bars) != sorted(symbols) or any(len(symbol_bars) != 5 for symbol_bars in bars.values()):
+            print(f"✗ Expected 5 bars for each of {len(symbols)} contracts, got {sum(map(len, bars.values()))} bars")
+            return False
+        if len(pages) < 2:
+            print(f"✗ Expected several pages, got {len(pages)} requests")
+            return False
+        bar = bars[symbols[0]][0]
+        if not isinstance(bar['close'], float) or not isinstance(bar['volume'], int) or not bar['timestamp']:
+            print(f"✗ Bar parsed wrong: {bar}")
+            return False
+        print(f"✓ {sum(map(len, bars.values()))} bars over {len(pages)} pages")
+        return True
+    except Exception as e:
+        print(f"✗ Bars fetch failed: {str(e)}")
+        return False
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("Alpaca Options Dashboard - Async Client Check")
+    print("=" * 50)
+    
+    server = MockAlpacaServer(page_size=100)
+    url = server.start()
+    client = AsyncAlpacaOptionsClient(trading_url=url, data_url=url)
+    
+    try:
+        results = {
+            'Contract pages': test_contract_pages(server, client),
+            'Concurrent snapshots': test_concurrent_snapshots(server, client),
+            '429 retry': test_rate_limit_retry(server, client),
+            'Historical bars': test_bars(server, client),
+        }
+    finally:
+        client.close()
+        server.stop()
+    
+    print("\n" + "=" * 50)
+    print("Check Summary:")
+    for name, ok in results.items():
+        print(f"  {name}: {'✓' if ok else '✗'}")
+    print("=" * 50)
+    
+    sys.exit(0 if all(results.values()) else 1)
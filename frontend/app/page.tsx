@@ -17,16 +17,12 @@ export default function Home() {
   const fetchExpirationDates = async () => {
     try {
       const { supabase } = await import('@/lib/supabase')
-      const { data, error } = await supabase
-        .from('options_data')
-        .select('expiration_date')
-        .order('expiration_date', { ascending: true })
+      // Distinct expirations are computed in Postgres (see supabase_schema.sql)
+      const { data, error } = await supabase.rpc('get_expiration_dates')
 
       if (error) throw error
 
-      const uniqueDates = Array.from(
-        new Set(data.map((item: any) => item.expiration_date))
-      ).sort() as string[]
+      const uniqueDates = data.map((item: any) => item.expiration_date) as string[]
 
       setExpirationDates(uniqueDates)
       if (uniqueDates.length > 0 && !selectedExpiration) {
@@ -32,10 +32,9 @@ export default function Greeks({ expirationDate }: GreeksProps) {
   const fetchGreeksData = async () => {
     setLoading(true)
     try {
+      // Latest Greeks only: one row per strike and option type
       const { data, error } = await supabase
-        .from('greeks_data')
-        .select('strike_price, delta, gamma, theta, vega, rho, option_type')
-        .eq('expiration_date', expirationDate)
+        .rpc('get_latest_greeks', { p_expiration_date: expirationDate })
         .order('strike_price', { ascending: true })
 
       if (error) throw error
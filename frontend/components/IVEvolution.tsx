@@ -31,19 +31,11 @@ export default function IVEvolution({ expirationDate }: IVEvolutionProps) {
   const fetchIVEvolutionData = async () => {
     setLoading(true)
     try {
-      let query = supabase
-        .from('iv_evolution')
-        .select('time_to_maturity, implied_volatility, strike_price, option_type, recorded_at')
-        .eq('expiration_date', expirationDate)
-        .not('implied_volatility', 'is', null)
-        .not('time_to_maturity', 'is', null)
-        .order('recorded_at', { ascending: true })
-
-      if (selectedStrike) {
-        query = query.eq('strike_price', selectedStrike)
-      }
-
-      const { data, error } = await query
+      // Averaged into hourly buckets per strike and option type in Postgres
+      const { data, error } = await supabase.rpc('get_iv_evolution', {
+        p_expiration_date: expirationDate,
+        p_strike_price: selectedStrike,
+      })
 
       if (error) throw error
 
@@ -14,9 +14,27 @@ interface OptionData {
   option_type: string
 }
 
+interface SVISlice {
+  time_to_maturity: number
+  forward_price: number
+  a: number
+  b: number
+  rho: number
+  m: number
+  sigma: number
+}
+
+// Implied volatility (%) of a fitted SVI slice at a strike
+const sviImpliedVolatility = (slice: SVISlice, strike: number) => {
+  const x = Math.log(strike / slice.forward_price) - slice.m
+  const w = slice.a + slice.b * (slice.rho * x + Math.sqrt(x * x + slice.sigma * slice.sigma))
+  return w > 0 ? Math.sqrt(w / slice.time_to_maturity) * 100 : null
+}
+
 export default function SmileCurve({ expirationDate }: SmileCurveProps) {
   const [callData, setCallData] = useState<any[]>([])
   const [putData, setPutData] = useState<any[]>([])
+  const [fitSlice, setFitSlice] = useState<SVISlice | null>(null)
   const [loading, setLoading] = useState(true)
 
   useEffect(() => {
@@ -28,12 +46,13 @@ export default function SmileCurve({ expirationDate }: SmileCurveProps) {
   const fetchSmileCurveData = async () => {
     setLoading(true)
     try {
-      const { data, error } = await supabase
-        .from('options_data')
-        .select('strike_price, implied_volatility, option_type')
-        .eq('expiration_date', expirationDate)
-        .not('implied_volatility', 'is', null)
-        .order('strike_price', { ascending: true })
+      // Latest snapshot only: one row per strike and option type, plus the fitted smile
+      const [{ data, error }, { data: slices }] = await Promise.all([
+        supabase
+          .rpc('get_latest_smile', { p_expiration_date: expirationDate })
+          .order('strike_price', { ascending: true }),
+        supabase.rpc('get_latest_svi_slice', { p_expiration_date: expirationDate }),
+      ])
 
       if (error) throw error
 
@@ -55,6 +74,7 @@ export default function SmileCurve({ expirationDate }: SmileCurveProps) {
 
       setCallData(calls)
       setPutData(puts)
+      setFitSlice(slices && slices.length > 0 ? slices[0] : null)
     } catch (error: any) {
       console.error('Error fetching smile curve data:', error)
       if (error?.code === 'PGRST116' || error?.message?.includes('404') || error?.message?.includes('NOT_FOUND')) {
@@ -82,6 +102,14 @@ export default function SmileCurve({ expirationDate }: SmileCurveProps) {
   const minStrike = allData.length > 0 ? Math.min(...allData.map(d => d.strike)) : 0
   const maxStrike = allData.length > 0 ? Math.max(...allData.map(d => d.strike)) : 1000
 
+  // Smooth smile evaluated from the five SVI parameters
+  const fitData = fitSlice
+    ? Array.from({ length: 101 }, (_, i) => {
+        const strike = minStrike + ((maxStrike - minStrike) * i) / 100
+        return { strike, iv: sviImpliedVolatility(fitSlice, strike) }
+      }).filter((item) => item.iv !== null)
+    : []
+
   return (
     <ResponsiveContainer width="100%" height={400}>
       <LineChart>
@@ -128,6 +156,18 @@ export default function SmileCurve({ expirationDate }: SmileCurveProps) {
             connectNulls
           />
         )}
+        {fitData.length > 0 && (
+          <Line
+            type="monotone"
+            dataKey="iv"
+            data={fitData}
+            name="SVI fit"
+            stroke="#10B981"
+            strokeWidth={2}
+            strokeDasharray="5 5"
+            dot={false}
+          />
+        )}
       </LineChart>
     </ResponsiveContainer>
   )
@@ -0,0 +1,52 @@
+-- Convert options_data, greeks_data and iv_evolution from plain tables to
+-- daily range-partitioned tables, keeping their rows and id sequences.
+--
+-- Run once in the Supabase SQL Editor on a database created with the earlier
+-- unpartitioned schema, then run supabase_schema.sql to create the indexes,
+-- policies, rollup tables and functions, and finally split the copied rows
+-- out of the default partitions:
+--
+--   SELECT create_daily_partitions(
+--       (SELECT MIN(created_at)::DATE FROM options_data),
+--       CURRENT_DATE
+--   );
+--
+-- Copying takes a lock on the old tables; stop the collector while it runs.
+
+BEGIN;
+
+-- Partitioned options_data is only unique on (id, created_at), so the
+-- greeks_data -> options_data foreign key cannot be kept
+ALTER TABLE greeks_data DROP CONSTRAINT IF EXISTS greeks_data_option_id_fkey;
+
+DO $$
+DECLARE
+    v_table TEXT;
+    v_column TEXT;
+BEGIN
+    FOR v_table, v_column IN
+        VALUES ('options_data', 'created_at'), ('greeks_data', 'created_at'), ('iv_evolution', 'recorded_at')
+    LOOP
+        EXECUTE format('ALTER TABLE %I RENAME TO %I', v_table, v_table || '_unpartitioned');
+        EXECUTE format('ALTER INDEX %I RENAME TO %I', v_table || '_pkey', v_table || '_unpartitioned_pkey');
+
+        -- Same columns and defaults; the id default keeps using the old sequence
+        EXECUTE format(
+            'CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS, PRIMARY KEY (id, %I)) PARTITION BY RANGE (%I)',
+            v_table, v_table || '_unpartitioned', v_column, v_column
+        );
+        EXECUTE format('CREATE TABLE %I PARTITION OF %I DEFAULT', v_table || '_default', v_table);
+
+        EXECUTE format(
+            'INSERT INTO %I SELECT * FROM %I WHERE %I IS NOT NULL',
+            v_table, v_table || '_unpartitioned', v_column
+        );
+
+        EXECUTE format('ALTER SEQUENCE %I OWNED BY %I.id', v_table || '_id_seq', v_table);
+        -- Drops the old table with its indexes and policies, freeing their names
+        EXECUTE format('DROP TABLE %I', v_table || '_unpartitioned');
+    END LOOP;
+END;
+$$;
+
+COMMIT;
@@ -0,0 +1,45 @@
+-- Add chain_snapshots and the snapshot_id column of the time-series tables.
+--
+-- Run once in the Supabase SQL Editor on a database created before
+-- chain_snapshots existed, then re-run the CREATE OR REPLACE FUNCTION
+-- statements of the "Dashboard functions" section of supabase_schema.sql so
+-- get_latest_smile, get_latest_greeks and get_latest_svi_slice read the
+-- newest snapshot.
+--
+-- Rows written before the migration keep a NULL snapshot_id and their
+-- per-row created_at.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS chain_snapshots (
+    id BIGSERIAL PRIMARY KEY,
+    symbol VARCHAR(10) NOT NULL,
+    source VARCHAR(8) NOT NULL, -- 'live', 'stream' or 'backfill'
+    captured_at TIMESTAMP WITH TIME ZONE NOT NULL, -- time the quotes were captured
+    underlying_price DECIMAL(10, 2),
+    num_contracts INTEGER,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    UNIQUE (symbol, source, captured_at)
+);
+CREATE INDEX IF NOT EXISTS idx_chain_snapshots_latest
+    ON chain_snapshots(symbol, captured_at DESC);
+
+-- Added to the partitioned parents, so existing and future daily partitions get it too
+ALTER TABLE options_data ADD COLUMN IF NOT EXISTS snapshot_id BIGINT;
+ALTER TABLE greeks_data ADD COLUMN IF NOT EXISTS snapshot_id BIGINT;
+ALTER TABLE iv_evolution ADD COLUMN IF NOT EXISTS snapshot_id BIGINT;
+ALTER TABLE vol_surface_slices ADD COLUMN IF NOT EXISTS snapshot_id BIGINT;
+
+-- Surfaces are looked up by snapshot id instead of created_at
+DROP INDEX IF EXISTS idx_vol_surface_exp_latest;
+CREATE INDEX IF NOT EXISTS idx_vol_surface_exp_snapshot
+    ON vol_surface_slices(expiration_date, snapshot_id DESC NULLS LAST);
+CREATE INDEX IF NOT EXISTS idx_vol_surface_snapshot
+    ON vol_surface_slices(snapshot_id);
+
+ALTER TABLE chain_snapshots ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Allow public read access" ON chain_snapshots FOR SELECT USING (true);
+CREATE POLICY "Allow public insert" ON chain_snapshots FOR INSERT WITH CHECK (true);
+CREATE POLICY "Allow public update" ON chain_snapshots FOR UPDATE USING (true);
+
+COMMIT;
@@ -0,0 +1,35 @@
+-- Add the natural-key unique indexes of greeks_data and iv_evolution.
+--
+-- Run once in the Supabase SQL Editor on a database created before the
+-- indexes existed. The backfill upserts Greeks and IV on these keys, so a
+-- retried unit fills in missing rows instead of writing duplicates.
+--
+-- Duplicates left by earlier backfill retries are deleted first, keeping the
+-- oldest row of each key.
+
+BEGIN;
+
+DELETE FROM greeks_data g
+USING greeks_data older
+WHERE g.symbol = older.symbol
+  AND g.option_type = older.option_type
+  AND g.strike_price = older.strike_price
+  AND g.expiration_date = older.expiration_date
+  AND g.created_at = older.created_at
+  AND g.id > older.id;
+
+DELETE FROM iv_evolution iv
+USING iv_evolution older
+WHERE iv.symbol = older.symbol
+  AND iv.option_type = older.option_type
+  AND iv.strike_price = older.strike_price
+  AND iv.expiration_date = older.expiration_date
+  AND iv.recorded_at = older.recorded_at
+  AND iv.id > older.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_greeks_snapshot
+    ON greeks_data(symbol, option_type, strike_price, expiration_date, created_at);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_iv_snapshot
+    ON iv_evolution(symbol, option_type, strike_price, expiration_date, recorded_at);
+
+COMMIT;
@@ -0,0 +1,20 @@
+-- Add the (expiration_date, snapshot_id) indexes of options_data and
+-- greeks_data.
+--
+-- Run once in the Supabase SQL Editor on a database created before the
+-- indexes existed, then re-run the get_latest_smile and get_latest_greeks
+-- statements of the "Dashboard functions" section of supabase_schema.sql,
+-- including their DROP FUNCTION statements, so both functions read only the
+-- newest snapshot's rows instead of scanning a time window.
+
+BEGIN;
+
+-- Added to the partitioned parents, so existing and future daily partitions get them too
+CREATE INDEX IF NOT EXISTS idx_options_exp_snapshot
+    ON options_data(expiration_date, snapshot_id)
+    INCLUDE (option_type, strike_price, implied_volatility, created_at);
+CREATE INDEX IF NOT EXISTS idx_greeks_exp_snapshot
+    ON greeks_data(expiration_date, snapshot_id)
+    INCLUDE (option_type, strike_price, delta, gamma, theta, vega, rho, created_at);
+
+COMMIT;
@@ -4,13 +4,16 @@ Runner script for historical backfill
 """
 import sys
 import os
+import argparse
 from datetime import datetime, timedelta
 
 # Add project root to path
 project_root = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, project_root)
 
-from backend.historical_backfill import HistoricalBackfill
+from backend.config import ALPACA_REQUESTS_PER_MINUTE, ALPACA_CACHE_MODE
+from backend.historical_backfill import HistoricalBackfill, BACKFILL_TIMEFRAMES
+from backend.response_cache import CACHE_MODES
 import logging
 
 logging.basicConfig(
@@ -20,6 +23,39 @@ logging.basicConfig(
 
 def main():
     """Run historical backfill for last 30 days"""
+    parser = argparse.ArgumentParser(description='Backfill the last 30 days of S&P 500 options data')
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Dates to process concurrently. Default: 1'
+    )
+    parser.add_argument(
+        '--rpm',
+        type=int,
+        default=ALPACA_REQUESTS_PER_MINUTE,
+        help=f'Alpaca requests per minute shared by all workers. Default: {ALPACA_REQUESTS_PER_MINUTE}'
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Skip dates and contract chunks completed by a previous run'
+    )
+    parser.add_argument(
+        '--cache-mode',
+        choices=CACHE_MODES,
+        default=ALPACA_CACHE_MODE,
+        help=f"Alpaca response cache: 'record' reuses and stores responses, 'replay' "
+             f"only serves cached ones (no API calls). Default: {ALPACA_CACHE_MODE}"
+    )
+    parser.add_argument(
+        '--timeframe',
+        choices=BACKFILL_TIMEFRAMES,
+        default='day',
+        help='Bar resolution; intraday timeframes store every bar of the session. Default: day'
+    )
+    args = parser.parse_args()
+    
     # Calculate dates
     end_date = datetime.now()
     start_date = end_date - timedelta(days=30)
@@ -37,11 +73,17 @@ def main():
     print(f"Start Date: {start_date.date()}")
     print(f"End Date: {end_date.date()}")
     print(f"Days to process: {(end_date - start_date).days}")
+    print(f"Workers: {args.workers} (sharing {args.rpm} requests/min)")
+    print(f"Response cache: {args.cache_mode}")
+    print(f"Timeframe: {args.timeframe}")
     print("=" * 60)
     print()
     
     try:
-        backfill = HistoricalBackfill()
+        backfill = HistoricalBackfill(
+            workers=args.workers, requests_per_minute=args.rpm, resume=args.resume,
+            cache_mode=args.cache_mode, timeframe=BACKFILL_TIMEFRAMES[args.timeframe]
+        )
         backfill.backfill_date_range(start_date, end_date, days_step=1)
         print()
         print("✅ Backfill complete!")
@@ -25,7 +25,11 @@ try:
     print()
     
     collector = OptionsDataCollector()
-    collector.collect_and_store_data()
+    if '--stream' in sys.argv[1:]:
+        print("Streaming real-time quotes (Ctrl+C to stop)...")
+        collector.run_streaming()
+    else:
+        collector.collect_and_store_data()
     
     print()
     print("✅ Data collection complete!")
@@ -33,7 +37,7 @@ try:
 except ImportError as e:
     print(f"❌ Import error: {e}")
     print("\nPlease install dependencies:")
-    print("  pip install alpaca-py supabase python-dotenv pandas numpy scipy")
+    print("  pip install -r requirements.txt")
     sys.exit(1)
 except Exception as e:
     print(f"❌ Error: {e}")
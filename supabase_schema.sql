@@ -1,9 +1,34 @@
 -- Supabase Database Schema for Alpaca Options Dashboard
 -- Run this SQL in your Supabase SQL Editor
+-- (Databases created with the earlier unpartitioned schema: run
+-- migrations/001_partition_time_series_tables.sql first; databases created
+-- before chain_snapshots existed: run migrations/002_chain_snapshots.sql;
+-- databases created before the snapshot lookup indexes existed: run
+-- migrations/004_snapshot_lookup_indexes.sql)
+
+-- The three time-series tables are range-partitioned by day on their
+-- timestamp column. Daily partitions are created ahead of time by
+-- create_daily_partitions(); rows outside any partition land in the
+-- *_default partition and are moved out when their day's partition is created.
+
+-- One row per captured chain: a collection cycle, a streaming flush or a
+-- backfilled day. Every options_data, greeks_data, iv_evolution and
+-- vol_surface_slices row written for the chain references it and carries
+-- captured_at as its created_at (recorded_at).
+CREATE TABLE IF NOT EXISTS chain_snapshots (
+    id BIGSERIAL PRIMARY KEY,
+    symbol VARCHAR(10) NOT NULL,
+    source VARCHAR(8) NOT NULL, -- 'live', 'stream' or 'backfill'
+    captured_at TIMESTAMP WITH TIME ZONE NOT NULL, -- time the quotes were captured
+    underlying_price DECIMAL(10, 2),
+    num_contracts INTEGER,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    UNIQUE (symbol, source, captured_at)
+);
 
 -- Options data table
 CREATE TABLE IF NOT EXISTS options_data (
-    id BIGSERIAL PRIMARY KEY,
+    id BIGSERIAL,
     symbol VARCHAR(10) NOT NULL,
     option_type VARCHAR(4) NOT NULL, -- 'call' or 'put'
     strike_price DECIMAL(10, 2) NOT NULL,
@@ -15,15 +40,19 @@ CREATE TABLE IF NOT EXISTS options_data (
     open_interest INTEGER,
     implied_volatility DECIMAL(8, 6),
     underlying_price DECIMAL(10, 2),
-    time_to_maturity DECIMAL(10, 6), -- in years
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
-);
+    time_to_maturity DECIMAL(10, 6), -- in years, to the 16:00 ET expiry
+    snapshot_id BIGINT, -- chain_snapshots.id
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
 
 -- Greeks data table
+-- option_id points at options_data.id; it is not a foreign key because
+-- partitioned options_data is only unique on (id, created_at)
 CREATE TABLE IF NOT EXISTS greeks_data (
-    id BIGSERIAL PRIMARY KEY,
-    option_id BIGINT REFERENCES options_data(id),
+    id BIGSERIAL,
+    option_id BIGINT,
     symbol VARCHAR(10) NOT NULL,
     strike_price DECIMAL(10, 2) NOT NULL,
     expiration_date DATE NOT NULL,
@@ -33,41 +62,471 @@ CREATE TABLE IF NOT EXISTS greeks_data (
     theta DECIMAL(10, 6),
     vega DECIMAL(10, 6),
     rho DECIMAL(10, 6),
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
-);
+    snapshot_id BIGINT,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
 
 -- IV evolution table
 CREATE TABLE IF NOT EXISTS iv_evolution (
-    id BIGSERIAL PRIMARY KEY,
+    id BIGSERIAL,
     symbol VARCHAR(10) NOT NULL,
     strike_price DECIMAL(10, 2) NOT NULL,
     expiration_date DATE NOT NULL,
     option_type VARCHAR(4) NOT NULL,
     implied_volatility DECIMAL(8, 6),
     time_to_maturity DECIMAL(10, 6),
-    recorded_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+    snapshot_id BIGINT,
+    recorded_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, recorded_at)
+) PARTITION BY RANGE (recorded_at);
+
+CREATE TABLE IF NOT EXISTS options_data_default PARTITION OF options_data DEFAULT;
+CREATE TABLE IF NOT EXISTS greeks_data_default PARTITION OF greeks_data DEFAULT;
+CREATE TABLE IF NOT EXISTS iv_evolution_default PARTITION OF iv_evolution DEFAULT;
+
+-- End-of-day rollups: the last intraday snapshot of each contract per day,
+-- kept after the raw partitions are dropped
+CREATE TABLE IF NOT EXISTS options_data_eod (
+    snapshot_date DATE NOT NULL,
+    symbol VARCHAR(10) NOT NULL,
+    option_type VARCHAR(4) NOT NULL,
+    strike_price DECIMAL(10, 2) NOT NULL,
+    expiration_date DATE NOT NULL,
+    bid_price DECIMAL(10, 4),
+    ask_price DECIMAL(10, 4),
+    last_price DECIMAL(10, 4),
+    volume INTEGER,
+    open_interest INTEGER,
+    implied_volatility DECIMAL(8, 6),
+    underlying_price DECIMAL(10, 2),
+    time_to_maturity DECIMAL(10, 6),
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL, -- time of the day's last snapshot
+    PRIMARY KEY (expiration_date, option_type, strike_price, symbol, snapshot_date)
+);
+
+CREATE TABLE IF NOT EXISTS greeks_data_eod (
+    snapshot_date DATE NOT NULL,
+    symbol VARCHAR(10) NOT NULL,
+    option_type VARCHAR(4) NOT NULL,
+    strike_price DECIMAL(10, 2) NOT NULL,
+    expiration_date DATE NOT NULL,
+    delta DECIMAL(10, 6),
+    gamma DECIMAL(10, 6),
+    theta DECIMAL(10, 6),
+    vega DECIMAL(10, 6),
+    rho DECIMAL(10, 6),
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    PRIMARY KEY (expiration_date, option_type, strike_price, symbol, snapshot_date)
+);
+
+CREATE TABLE IF NOT EXISTS iv_evolution_eod (
+    snapshot_date DATE NOT NULL,
+    symbol VARCHAR(10) NOT NULL,
+    option_type VARCHAR(4) NOT NULL,
+    strike_price DECIMAL(10, 2) NOT NULL,
+    expiration_date DATE NOT NULL,
+    implied_volatility DECIMAL(8, 6),
+    time_to_maturity DECIMAL(10, 6),
+    recorded_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    PRIMARY KEY (expiration_date, option_type, strike_price, symbol, snapshot_date)
+);
+
+-- Fitted SVI smile per expiration and snapshot (backend/vol_surface.py):
+-- total variance w(k) = a + b * (rho * (k - m) + sqrt((k - m)^2 + sigma^2)),
+-- k = ln(strike / forward_price), IV = sqrt(w / time_to_maturity)
+CREATE TABLE IF NOT EXISTS vol_surface_slices (
+    id BIGSERIAL PRIMARY KEY,
+    symbol VARCHAR(10) NOT NULL,
+    expiration_date DATE NOT NULL,
+    model VARCHAR(8) NOT NULL DEFAULT 'svi',
+    time_to_maturity DECIMAL(10, 6) NOT NULL,
+    underlying_price DECIMAL(10, 2),
+    forward_price DECIMAL(10, 4) NOT NULL,
+    a DOUBLE PRECISION NOT NULL,
+    b DOUBLE PRECISION NOT NULL,
+    rho DOUBLE PRECISION NOT NULL,
+    m DOUBLE PRECISION NOT NULL,
+    sigma DOUBLE PRECISION NOT NULL,
+    rmse DOUBLE PRECISION, -- vega-weighted IV fit error
+    num_points INTEGER,
+    snapshot_id BIGINT,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+-- Raw partitions already compacted into the *_eod tables
+CREATE TABLE IF NOT EXISTS partition_rollups (
+    partition_name TEXT PRIMARY KEY,
+    rolled_up_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
 -- Create indexes for better query performance
-CREATE INDEX IF NOT EXISTS idx_options_symbol_exp ON options_data(symbol, expiration_date);
-CREATE INDEX IF NOT EXISTS idx_options_created_at ON options_data(created_at);
+-- Natural key: one row per option per snapshot time, used by the backfill to skip duplicates
+CREATE UNIQUE INDEX IF NOT EXISTS uq_options_snapshot
+    ON options_data(symbol, option_type, strike_price, expiration_date, created_at);
+-- Same natural keys for Greeks and IV, so a retried backfill unit never writes them twice
+CREATE UNIQUE INDEX IF NOT EXISTS uq_greeks_snapshot
+    ON greeks_data(symbol, option_type, strike_price, expiration_date, created_at);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_iv_snapshot
+    ON iv_evolution(symbol, option_type, strike_price, expiration_date, recorded_at);
 CREATE INDEX IF NOT EXISTS idx_greeks_option_id ON greeks_data(option_id);
-CREATE INDEX IF NOT EXISTS idx_greeks_symbol_exp ON greeks_data(symbol, expiration_date);
-CREATE INDEX IF NOT EXISTS idx_iv_evolution_symbol_exp ON iv_evolution(symbol, expiration_date, strike_price);
-CREATE INDEX IF NOT EXISTS idx_iv_evolution_recorded_at ON iv_evolution(recorded_at);
+
+-- Covering indexes for the dashboard (expiration, then latest timestamp),
+-- so the functions below are answered from the index alone
+CREATE INDEX IF NOT EXISTS idx_options_exp_latest
+    ON options_data(expiration_date, created_at DESC)
+    INCLUDE (option_type, strike_price, implied_volatility);
+CREATE INDEX IF NOT EXISTS idx_greeks_exp_latest
+    ON greeks_data(expiration_date, created_at DESC)
+    INCLUDE (option_type, strike_price, delta, gamma, theta, vega, rho);
+-- One snapshot of one expiration, read by get_latest_smile and get_latest_greeks
+CREATE INDEX IF NOT EXISTS idx_options_exp_snapshot
+    ON options_data(expiration_date, snapshot_id)
+    INCLUDE (option_type, strike_price, implied_volatility, created_at);
+CREATE INDEX IF NOT EXISTS idx_greeks_exp_snapshot
+    ON greeks_data(expiration_date, snapshot_id)
+    INCLUDE (option_type, strike_price, delta, gamma, theta, vega, rho, created_at);
+CREATE INDEX IF NOT EXISTS idx_iv_evolution_exp_recorded
+    ON iv_evolution(expiration_date, recorded_at)
+    INCLUDE (strike_price, option_type, implied_volatility, time_to_maturity);
+CREATE INDEX IF NOT EXISTS idx_vol_surface_exp_snapshot
+    ON vol_surface_slices(expiration_date, snapshot_id DESC NULLS LAST);
+CREATE INDEX IF NOT EXISTS idx_vol_surface_snapshot
+    ON vol_surface_slices(snapshot_id);
+CREATE INDEX IF NOT EXISTS idx_chain_snapshots_latest
+    ON chain_snapshots(symbol, captured_at DESC);
 
 -- Enable Row Level Security (optional, adjust policies as needed)
 ALTER TABLE options_data ENABLE ROW LEVEL SECURITY;
 ALTER TABLE greeks_data ENABLE ROW LEVEL SECURITY;
 ALTER TABLE iv_evolution ENABLE ROW LEVEL SECURITY;
+ALTER TABLE options_data_eod ENABLE ROW LEVEL SECURITY;
+ALTER TABLE greeks_data_eod ENABLE ROW LEVEL SECURITY;
+ALTER TABLE iv_evolution_eod ENABLE ROW LEVEL SECURITY;
+ALTER TABLE partition_rollups ENABLE ROW LEVEL SECURITY;
+ALTER TABLE vol_surface_slices ENABLE ROW LEVEL SECURITY;
+ALTER TABLE chain_snapshots ENABLE ROW LEVEL SECURITY;
 
 -- Create policies to allow public read access (adjust as needed for your security requirements)
 CREATE POLICY "Allow public read access" ON options_data FOR SELECT USING (true);
 CREATE POLICY "Allow public read access" ON greeks_data FOR SELECT USING (true);
 CREATE POLICY "Allow public read access" ON iv_evolution FOR SELECT USING (true);
+CREATE POLICY "Allow public read access" ON options_data_eod FOR SELECT USING (true);
+CREATE POLICY "Allow public read access" ON greeks_data_eod FOR SELECT USING (true);
+CREATE POLICY "Allow public read access" ON iv_evolution_eod FOR SELECT USING (true);
+CREATE POLICY "Allow public read access" ON vol_surface_slices FOR SELECT USING (true);
+CREATE POLICY "Allow public read access" ON chain_snapshots FOR SELECT USING (true);
 
 -- Create policies to allow insert (for the data collector)
 CREATE POLICY "Allow public insert" ON options_data FOR INSERT WITH CHECK (true);
 CREATE POLICY "Allow public insert" ON greeks_data FOR INSERT WITH CHECK (true);
 CREATE POLICY "Allow public insert" ON iv_evolution FOR INSERT WITH CHECK (true);
+CREATE POLICY "Allow public insert" ON vol_surface_slices FOR INSERT WITH CHECK (true);
+CREATE POLICY "Allow public insert" ON chain_snapshots FOR INSERT WITH CHECK (true);
+-- Re-registering a snapshot (a retried backfill day) upserts it
+CREATE POLICY "Allow public update" ON chain_snapshots FOR UPDATE USING (true);
+
+-- Partition maintenance
+
+-- Create the daily partitions of all three tables for p_start..p_end (inclusive).
+-- Rows of those days sitting in the default partition are moved into the new
+-- partition. Partition bounds are UTC days. A partition recreated for a day
+-- that was already rolled up (e.g. by a backfill) is rolled up again.
+-- Returns the number of partitions created.
+CREATE OR REPLACE FUNCTION create_daily_partitions(p_start DATE, p_end DATE)
+RETURNS INTEGER
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+DECLARE
+    v_table TEXT;
+    v_column TEXT;
+    v_day DATE;
+    v_partition TEXT;
+    v_from TIMESTAMPTZ;
+    v_to TIMESTAMPTZ;
+    v_created INTEGER := 0;
+BEGIN
+    FOR v_table, v_column IN
+        VALUES ('options_data', 'created_at'), ('greeks_data', 'created_at'), ('iv_evolution', 'recorded_at')
+    LOOP
+        FOR v_day IN SELECT generate_series(p_start, p_end, INTERVAL '1 day')::DATE LOOP
+            v_partition := format('%s_p%s', v_table, to_char(v_day, 'YYYYMMDD'));
+            CONTINUE WHEN to_regclass(v_partition) IS NOT NULL;
+
+            v_from := v_day::TIMESTAMP AT TIME ZONE 'UTC';
+            v_to := (v_day + 1)::TIMESTAMP AT TIME ZONE 'UTC';
+
+            EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', v_partition, v_table);
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM %I WHERE %I >= %L AND %I < %L RETURNING *) INSERT INTO %I SELECT * FROM moved',
+                v_table || '_default', v_column, v_from, v_column, v_to, v_partition
+            );
+            EXECUTE format(
+                'ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                v_table, v_partition, v_from, v_to
+            );
+            DELETE FROM partition_rollups r WHERE r.partition_name = v_partition;
+            v_created := v_created + 1;
+        END LOOP;
+    END LOOP;
+    RETURN v_created;
+END;
+$$;
+
+-- Compact every raw daily partition older than p_rollup_after_days into
+-- end-of-day rows (keeping the later snapshot if a day is rolled up twice),
+-- then drop raw partitions older than p_retention_days, only once they have
+-- been rolled up. Returns one row per action taken.
+CREATE OR REPLACE FUNCTION rollup_and_expire_partitions(
+    p_rollup_after_days INTEGER DEFAULT 2,
+    p_retention_days INTEGER DEFAULT 30
+)
+RETURNS TABLE (partition_name TEXT, action TEXT)
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+DECLARE
+    v_partition TEXT;
+    v_table TEXT;
+    v_day DATE;
+    v_retention_days INTEGER := GREATEST(p_retention_days, p_rollup_after_days);
+BEGIN
+    FOR v_partition, v_table IN
+        SELECT c.relname::TEXT, p.relname::TEXT
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname IN ('options_data', 'greeks_data', 'iv_evolution')
+          AND c.relname ~ '_p[0-9]{8}$'
+        ORDER BY c.relname
+    LOOP
+        v_day := to_date(right(v_partition, 8), 'YYYYMMDD');
+
+        IF v_day < CURRENT_DATE - p_rollup_after_days
+           AND NOT EXISTS (SELECT 1 FROM partition_rollups r WHERE r.partition_name = v_partition) THEN
+            IF v_table = 'options_data' THEN
+                EXECUTE format($sql$
+                    INSERT INTO options_data_eod
+                    SELECT DISTINCT ON (expiration_date, option_type, strike_price, symbol)
+                        %L::DATE, symbol, option_type, strike_price, expiration_date,
+                        bid_price, ask_price, last_price, volume, open_interest,
+                        implied_volatility, underlying_price, time_to_maturity, created_at
+                    FROM %I
+                    ORDER BY expiration_date, option_type, strike_price, symbol, created_at DESC
+                    ON CONFLICT (expiration_date, option_type, strike_price, symbol, snapshot_date) DO UPDATE
+                    SET bid_price = EXCLUDED.bid_price, ask_price = EXCLUDED.ask_price,
+                        last_price = EXCLUDED.last_price, volume = EXCLUDED.volume,
+                        open_interest = EXCLUDED.open_interest,
+                        implied_volatility = EXCLUDED.implied_volatility,
+                        underlying_price = EXCLUDED.underlying_price,
+                        time_to_maturity = EXCLUDED.time_to_maturity,
+                        created_at = EXCLUDED.created_at
+                    WHERE EXCLUDED.created_at > options_data_eod.created_at
+                $sql$, v_day, v_partition);
+            ELSIF v_table = 'greeks_data' THEN
+                EXECUTE format($sql$
+                    INSERT INTO greeks_data_eod
+                    SELECT DISTINCT ON (expiration_date, option_type, strike_price, symbol)
+                        %L::DATE, symbol, option_type, strike_price, expiration_date,
+                        delta, gamma, theta, vega, rho, created_at
+                    FROM %I
+                    ORDER BY expiration_date, option_type, strike_price, symbol, created_at DESC
+                    ON CONFLICT (expiration_date, option_type, strike_price, symbol, snapshot_date) DO UPDATE
+                    SET delta = EXCLUDED.delta, gamma = EXCLUDED.gamma, theta = EXCLUDED.theta,
+                        vega = EXCLUDED.vega, rho = EXCLUDED.rho,
+                        created_at = EXCLUDED.created_at
+                    WHERE EXCLUDED.created_at > greeks_data_eod.created_at
+                $sql$, v_day, v_partition);
+            ELSE
+                EXECUTE format($sql$
+                    INSERT INTO iv_evolution_eod
+                    SELECT DISTINCT ON (expiration_date, option_type, strike_price, symbol)
+                        %L::DATE, symbol, option_type, strike_price, expiration_date,
+                        implied_volatility, time_to_maturity, recorded_at
+                    FROM %I
+                    WHERE implied_volatility IS NOT NULL
+                    ORDER BY expiration_date, option_type, strike_price, symbol, recorded_at DESC
+                    ON CONFLICT (expiration_date, option_type, strike_price, symbol, snapshot_date) DO UPDATE
+                    SET implied_volatility = EXCLUDED.implied_volatility,
+                        time_to_maturity = EXCLUDED.time_to_maturity,
+                        recorded_at = EXCLUDED.recorded_at
+                    WHERE EXCLUDED.recorded_at > iv_evolution_eod.recorded_at
+                $sql$, v_day, v_partition);
+            END IF;
+            INSERT INTO partition_rollups (partition_name) VALUES (v_partition);
+            partition_name := v_partition;
+            action := 'rolled_up';
+            RETURN NEXT;
+        END IF;
+
+        IF v_day < CURRENT_DATE - v_retention_days
+           AND EXISTS (SELECT 1 FROM partition_rollups r WHERE r.partition_name = v_partition) THEN
+            EXECUTE format('DROP TABLE %I', v_partition);
+            partition_name := v_partition;
+            action := 'dropped';
+            RETURN NEXT;
+        END IF;
+    END LOOP;
+END;
+$$;
+
+-- Daily maintenance: create upcoming partitions, roll up and expire old ones.
+-- Called by the collector (see OptionsDataCollector.run_maintenance), or
+-- schedule it with pg_cron:
+--   SELECT cron.schedule('options-maintenance', '15 0 * * *', 'SELECT run_options_maintenance()');
+CREATE OR REPLACE FUNCTION run_options_maintenance(
+    p_rollup_after_days INTEGER DEFAULT 2,
+    p_retention_days INTEGER DEFAULT 30,
+    p_days_ahead INTEGER DEFAULT 7
+)
+RETURNS TABLE (partition_name TEXT, action TEXT)
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public AS $$
+BEGIN
+    PERFORM create_daily_partitions(CURRENT_DATE, CURRENT_DATE + p_days_ahead);
+    RETURN QUERY SELECT * FROM rollup_and_expire_partitions(p_rollup_after_days, p_retention_days);
+END;
+$$;
+
+SELECT create_daily_partitions(CURRENT_DATE, CURRENT_DATE + 7);
+
+-- Dashboard functions (called through supabase.rpc) so the browser receives
+-- one row per strike instead of the full history. Expirations whose raw
+-- partitions have been dropped are served from the end-of-day rollups.
+
+-- Distinct expiration dates, using a skip scan over the expiration index
+CREATE OR REPLACE FUNCTION get_expiration_dates()
+RETURNS TABLE (expiration_date DATE)
+LANGUAGE sql STABLE AS $$
+    WITH RECURSIVE dates AS (
+        (SELECT o.expiration_date FROM options_data o ORDER BY o.expiration_date LIMIT 1)
+        UNION ALL
+        SELECT (
+            SELECT o.expiration_date FROM options_data o
+            WHERE o.expiration_date > d.expiration_date
+            ORDER BY o.expiration_date LIMIT 1
+        )
+        FROM dates d
+        WHERE d.expiration_date IS NOT NULL
+    )
+    SELECT dates.expiration_date FROM dates WHERE dates.expiration_date IS NOT NULL
+    UNION
+    SELECT DISTINCT e.expiration_date FROM options_data_eod e
+    ORDER BY 1;
+$$;
+
+-- Implied volatility per strike and type of the expiration's newest
+-- snapshot. The snapshot is resolved from the newest row of the expiration
+-- (one probe of idx_options_exp_latest), then only that snapshot's rows are
+-- read through idx_options_exp_snapshot. Every snapshot holds the whole
+-- chain, so this is the full smile as captured at one time.
+DROP FUNCTION IF EXISTS get_latest_smile(DATE, INTERVAL);
+CREATE OR REPLACE FUNCTION get_latest_smile(p_expiration_date DATE)
+RETURNS TABLE (strike_price DECIMAL, option_type VARCHAR, implied_volatility DECIMAL, created_at TIMESTAMPTZ)
+LANGUAGE sql STABLE AS $$
+    WITH snapshot AS (
+        SELECT l.snapshot_id FROM options_data l
+        WHERE l.expiration_date = p_expiration_date
+          AND l.snapshot_id IS NOT NULL
+        ORDER BY l.created_at DESC LIMIT 1
+    ),
+    latest AS (
+        SELECT o.strike_price, o.option_type, o.implied_volatility, o.created_at
+        FROM options_data o, snapshot s
+        WHERE o.expiration_date = p_expiration_date
+          AND o.snapshot_id = s.snapshot_id
+          AND o.implied_volatility IS NOT NULL
+    )
+    SELECT * FROM latest
+    UNION ALL
+    SELECT * FROM (
+        SELECT DISTINCT ON (e.option_type, e.strike_price)
+            e.strike_price, e.option_type, e.implied_volatility, e.created_at
+        FROM options_data_eod e
+        WHERE e.expiration_date = p_expiration_date
+          AND e.implied_volatility IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM latest)
+        ORDER BY e.option_type, e.strike_price, e.snapshot_date DESC
+    ) eod
+    ORDER BY option_type, strike_price;
+$$;
+
+-- Greeks per strike and type of the expiration's newest snapshot (see get_latest_smile)
+DROP FUNCTION IF EXISTS get_latest_greeks(DATE, INTERVAL);
+CREATE OR REPLACE FUNCTION get_latest_greeks(p_expiration_date DATE)
+RETURNS TABLE (
+    strike_price DECIMAL, option_type VARCHAR,
+    delta DECIMAL, gamma DECIMAL, theta DECIMAL, vega DECIMAL, rho DECIMAL,
+    created_at TIMESTAMPTZ
+)
+LANGUAGE sql STABLE AS $$
+    WITH snapshot AS (
+        SELECT l.snapshot_id FROM greeks_data l
+        WHERE l.expiration_date = p_expiration_date
+          AND l.snapshot_id IS NOT NULL
+        ORDER BY l.created_at DESC LIMIT 1
+    ),
+    latest AS (
+        SELECT g.strike_price, g.option_type, g.delta, g.gamma, g.theta, g.vega, g.rho, g.created_at
+        FROM greeks_data g, snapshot s
+        WHERE g.expiration_date = p_expiration_date
+          AND g.snapshot_id = s.snapshot_id
+    )
+    SELECT * FROM latest
+    UNION ALL
+    SELECT * FROM (
+        SELECT DISTINCT ON (e.option_type, e.strike_price)
+            e.strike_price, e.option_type, e.delta, e.gamma, e.theta, e.vega, e.rho, e.created_at
+        FROM greeks_data_eod e
+        WHERE e.expiration_date = p_expiration_date
+          AND NOT EXISTS (SELECT 1 FROM latest)
+        ORDER BY e.option_type, e.strike_price, e.snapshot_date DESC
+    ) eod
+    ORDER BY option_type, strike_price;
+$$;
+
+-- IV evolution averaged into time buckets (default: one point per hour per strike and type).
+-- Days older than the retained raw data contribute their end-of-day value.
+CREATE OR REPLACE FUNCTION get_iv_evolution(
+    p_expiration_date DATE,
+    p_strike_price DECIMAL DEFAULT NULL,
+    p_bucket INTERVAL DEFAULT INTERVAL '1 hour'
+)
+RETURNS TABLE (
+    strike_price DECIMAL, option_type VARCHAR,
+    implied_volatility DECIMAL, time_to_maturity DECIMAL, recorded_at TIMESTAMPTZ
+)
+LANGUAGE sql STABLE AS $$
+    WITH first_raw AS (
+        SELECT MIN(iv.recorded_at) AS recorded_at
+        FROM iv_evolution iv
+        WHERE iv.expiration_date = p_expiration_date
+    )
+    SELECT
+        iv.strike_price,
+        iv.option_type,
+        AVG(iv.implied_volatility) AS implied_volatility,
+        AVG(iv.time_to_maturity) AS time_to_maturity,
+        date_bin(p_bucket, iv.recorded_at, TIMESTAMPTZ '2000-01-01') AS recorded_at
+    FROM iv_evolution iv
+    WHERE iv.expiration_date = p_expiration_date
+      AND (p_strike_price IS NULL OR iv.strike_price = p_strike_price)
+      AND iv.implied_volatility IS NOT NULL
+      AND iv.time_to_maturity IS NOT NULL
+    GROUP BY iv.strike_price, iv.option_type, date_bin(p_bucket, iv.recorded_at, TIMESTAMPTZ '2000-01-01')
+    UNION ALL
+    SELECT e.strike_price, e.option_type, e.implied_volatility, e.time_to_maturity, e.recorded_at
+    FROM iv_evolution_eod e, first_raw
+    WHERE e.expiration_date = p_expiration_date
+      AND (p_strike_price IS NULL OR e.strike_price = p_strike_price)
+      AND e.time_to_maturity IS NOT NULL
+      AND (first_raw.recorded_at IS NULL OR e.recorded_at < first_raw.recorded_at)
+    ORDER BY recorded_at;
+$$;
 
+-- Fitted smile of the newest snapshot for one expiration (slices stored
+-- before snapshots existed come last)
+CREATE OR REPLACE FUNCTION get_latest_svi_slice(p_expiration_date DATE)
+RETURNS SETOF vol_surface_slices
+LANGUAGE sql STABLE AS $$
+    SELECT * FROM vol_surface_slices v
+    WHERE v.expiration_date = p_expiration_date
+    ORDER BY v.snapshot_id DESC NULLS LAST, v.created_at DESC
+    LIMIT 1;
+$$;